@@ -1,25 +1,47 @@
 # django imports
 from django.contrib.contenttypes.models import ContentType
 from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models.signals import post_delete
 from django.db.models.signals import post_save
 from django.db.models.signals import pre_save
 from django.db.models.signals import pre_delete
 
 # lfs imports
-from lfs.caching.utils import clear_cache
+from lfs.caching.settings import CART_NAMESPACE
+from lfs.caching.settings import CATEGORIES_NAMESPACE
+from lfs.caching.settings import CATEGORY_NAMESPACE
+from lfs.caching.settings import CATEGORY_PRODUCTS_NAMESPACE
+from lfs.caching.settings import EXPORT_NAMESPACE
+from lfs.caching.settings import PRODUCT_NAMESPACE
+from lfs.caching.settings import SHIPPING_NAMESPACE
+from lfs.caching.settings import SHOP_NAMESPACE
+from lfs.caching.settings import TAX_NAMESPACE
+from lfs.caching.settings import TOPSELLER_NAMESPACE
+from lfs.caching.utils import invalidate_namespaces
 from lfs.cart.models import Cart
+from lfs.catalog.index import update_filter_index
 from lfs.catalog.models import Category
+from lfs.catalog.models import DeliveryTime
 from lfs.catalog.models import Product
+from lfs.catalog.models import ProductPropertyValue
 from lfs.catalog.models import StaticBlock
 from lfs.core.models import Shop
 from lfs.core.signals import cart_changed
 from lfs.core.signals import product_changed
 from lfs.core.signals import category_changed
 from lfs.core.signals import topseller_changed
+from lfs.export.feeds import delete_feed
+from lfs.export.models import CategoryOption
+from lfs.export.models import Export
 from lfs.marketing.models import Topseller
 from lfs.order.models import OrderItem
 from lfs.page.models import Page
+from lfs.payment.models import PaymentMethod
+from lfs.payment.models import PaymentMethodPrice
 from lfs.shipping.models import ShippingMethod
+from lfs.shipping.models import ShippingMethodPrice
+from lfs.tax.models import Tax
 
 # reviews imports
 from reviews.signals import review_added
@@ -46,18 +68,38 @@ def category_changed_listener(sender, **kwargs):
     update_category_cache(sender)
 category_changed.connect(category_changed_listener)
 
+# Export
+def export_changed_listener(sender, instance, **kwargs):
+    """Deletes the rendered rows and the feed file of the changed export, e.g.
+    if another script has been selected.
+    """
+    update_export_cache(instance)
+post_save.connect(export_changed_listener, sender=Export)
+pre_delete.connect(export_changed_listener, sender=Export)
+
+def export_saving_listener(sender, instance, **kwargs):
+    """Deletes the feed file of the stored export, as it is named by the slug,
+    which might be changed.
+    """
+    if instance.id is not None:
+        try:
+            delete_feed(Export.objects.get(pk=instance.id))
+        except Export.DoesNotExist:
+            pass
+pre_save.connect(export_saving_listener, sender=Export)
+
+def category_option_changed_listener(sender, instance, **kwargs):
+    update_export_cache(instance.export)
+post_save.connect(category_option_changed_listener, sender=CategoryOption)
+pre_delete.connect(category_option_changed_listener, sender=CategoryOption)
+
 # OrderItem
 def order_item_listener(sender, instance, **kwargs):
-    """Deletes topseller after an OrderItem has been updated. Topseller are 
-    calculated automatically on base of OrderItems, hence we have to take of
-    that.
+    """Deletes topseller after an OrderItem has been updated. Topseller are
+    calculated automatically on base of the sales of the OrderItems (see
+    lfs.marketing.listeners), hence we have to take of that.
     """
-    cache.delete("topseller")
-    try:
-        for category in instance.product.get_categories(with_parents=True):
-            cache.delete("topseller-%s" % category.id)
-    except: 
-        pass # fail silently        
+    invalidate_namespaces(TOPSELLER_NAMESPACE)
 pre_delete.connect(order_item_listener, sender=OrderItem)
 post_save.connect(order_item_listener, sender=OrderItem)
 
@@ -73,19 +115,48 @@ def product_changed_listener(sender, **kwargs):
 product_changed.connect(product_changed_listener)
 
 def product_saved_listener(sender, instance, **kwargs):
-    # update_product_cache(instance)
-    update_category_cache(instance)
+    update_filter_index(instance)
+    update_product_namespaces(instance)
 post_save.connect(product_saved_listener, sender=Product)
 
+def product_deleted_listener(sender, instance, **kwargs):
+    try:
+        update_filter_index(instance, deleted=True)
+        update_product_namespaces(instance)
+    except ObjectDoesNotExist:
+        # The parent of the variant has been deleted
+        pass
+pre_delete.connect(product_deleted_listener, sender=Product)
+
+# ProductPropertyValue
+def property_value_changed_listener(sender, instance, **kwargs):
+    # The filter index is updated within lfs.catalog.listeners, but the
+    # filtered product listings have to be calculated again.
+    try:
+        update_product_namespaces(instance.product)
+    except ObjectDoesNotExist:
+        pass
+post_save.connect(property_value_changed_listener, sender=ProductPropertyValue)
+post_delete.connect(property_value_changed_listener, sender=ProductPropertyValue)
+
 # Shipping Method
 def shipping_method_saved_listener(sender, instance, **kwargs):
-    cache.delete("shipping-delivery-time")
-    cache.delete("shipping-delivery-time-cart")
+    invalidate_namespaces(SHIPPING_NAMESPACE)
 post_save.connect(shipping_method_saved_listener, sender=ShippingMethod)
+post_delete.connect(shipping_method_saved_listener, sender=ShippingMethod)
+post_save.connect(shipping_method_saved_listener, sender=ShippingMethodPrice)
+post_delete.connect(shipping_method_saved_listener, sender=ShippingMethodPrice)
+post_save.connect(shipping_method_saved_listener, sender=PaymentMethod)
+post_delete.connect(shipping_method_saved_listener, sender=PaymentMethod)
+post_save.connect(shipping_method_saved_listener, sender=PaymentMethodPrice)
+post_delete.connect(shipping_method_saved_listener, sender=PaymentMethodPrice)
+post_save.connect(shipping_method_saved_listener, sender=DeliveryTime)
+post_delete.connect(shipping_method_saved_listener, sender=DeliveryTime)
 
 # Shop
 def shop_saved_listener(sender, instance, **kwargs):
     cache.delete("shop-%s" % instance.id)
+    invalidate_namespaces(SHOP_NAMESPACE)
 post_save.connect(shop_saved_listener, sender=Shop)
 
 # Static blocks
@@ -93,6 +164,13 @@ def static_blocks_saved_listener(sender, instance, **kwargs):
     update_static_block_cache(instance)
 post_save.connect(static_blocks_saved_listener, sender=StaticBlock)
 
+# Tax
+def tax_changed_listener(sender, instance, **kwargs):
+    # The price records of all products contain the tax
+    invalidate_namespaces(TAX_NAMESPACE)
+post_save.connect(tax_changed_listener, sender=Tax)
+post_delete.connect(tax_changed_listener, sender=Tax)
+
 # Topseller
 def topseller_changed_listener(sender, **kwargs):
     update_topseller_cache(sender)
@@ -111,71 +189,69 @@ review_added.connect(review_added_listener)
 
 ##### 
 def update_category_cache(instance):
-    
-    # NOTE: ATM, we clear the whole cache if a category has been changed. 
-    # Otherwise is lasts to long when the a category has a lot of products 
-    # (1000s) and the shop admin changes a category.
-    clear_cache()
-    return
-    cache.delete("category-breadcrumbs-%s" % instance.slug)
-    cache.delete("category-products-%s" % instance.slug)
-    cache.delete("category-all-products-%s" % instance.slug)
-    cache.delete("category-categories-%s" % instance.slug)
-
-    for category in Category.objects.all():
-        cache.delete("categories-portlet-%s" % category.slug)
-
-    cache.delete("category-%s" % instance.id) 
+    """Invalidates all caches which depend on the given category.
+
+    The cached values of a category are stored within namespaces (see
+    lfs.caching.settings), hence this doesn't last longer for categories with
+    a lot of products.
+    """
+    cache.delete("category-%s" % instance.id)
     cache.delete("category-%s" % instance.slug)
 
-    cache.delete("category-all-children-%s" % instance.id)
-    cache.delete("category-children-%s" % instance.id)
-    cache.delete("category-parents-%s" % instance.id)
-    cache.delete("category-products-%s" % instance.id)
-    cache.delete("category-all-products-%s" % instance.id)
-    
-    # Note: As this is called "pre-saved" newly created categories don't have
-    # the many-to-many attribute "products", hence we have to take care of it 
-    # here.
-    try:
-        for product in instance.products.all():
-            update_product_cache(product)
-    except ValueError:
-        pass
-    
+    # The parent categories display the products of their children (if
+    # show_all_products is set). If the parent has been changed we have to
+    # take care of the former parents as well.
+    parents = [instance.parent]
+    if instance.id is not None:
+        try:
+            parents.append(Category.objects.get(pk=instance.id).parent)
+        except Category.DoesNotExist:
+            pass
+
+    namespaces = [CATEGORIES_NAMESPACE, CATEGORY_NAMESPACE % instance.id]
+    for category in parents:
+        while category is not None:
+            namespaces.append(CATEGORY_NAMESPACE % category.id)
+            category = category.parent
+
+    invalidate_namespaces(*namespaces)
+
+def update_product_namespaces(instance):
+    """Invalidates all cached values which depend on the given product, that
+    is the product itself and the product listings of its categories.
+    """
+    cache.delete("product-%s" % instance.id)
+    cache.delete("product-%s" % instance.slug)
+
+    if instance.is_variant():
+        parent = instance.parent
+    else:
+        parent = instance
+
+    namespaces = [PRODUCT_NAMESPACE % parent.id]
+    for category in parent.get_categories(with_parents=True):
+        namespaces.append(CATEGORY_PRODUCTS_NAMESPACE % category.id)
+
+    invalidate_namespaces(*namespaces)
+
 def update_product_cache(instance):
     # If the instance is a product with variant or a variant we have to
-    # delete also the parent and all other variants
+    # delete also the parent and all other variants. The values which are
+    # stored within the namespace of the parent (inline, images, related
+    # products) are invalidated at once.
     if instance.is_variant():
         parent = instance.parent
     else:
         parent = instance
     
-    cache.delete("product-%s" % parent.id)
-    cache.delete("product-%s" % parent.slug)
-    cache.delete("product-inline-%s" % parent.id)
-    cache.delete("product-images-%s" % parent.id)
-    cache.delete("related-products-%s" % parent.id)    
     cache.delete("manage-properties-variants-%s" % parent.id)
-    cache.delete("product-categories-%s-False" % parent.id)
-    cache.delete("product-categories-%s-True" % parent.id)
     cache.delete("product-navigation-%s" % parent.slug)
     
-    try:
-        c = cache.get("shipping-delivery-time")
-        del c["product-%s" % parent.slug]
-        cache.set("shipping-delivery-time", c)
-    except (KeyError, TypeError):
-        pass
-    
+    update_product_namespaces(parent)
+
     for variant in parent.get_variants():
         cache.delete("product-%s" % variant.id)
-        cache.delete("product-%s" % parent.slug)
-        cache.delete("product-inline-%s" % variant.id)
-        cache.delete("product-images-%s" % variant.id)
-        cache.delete("related-products-%s" % variant.id)
-        cache.delete("product-categories-%s-False" % variant.id)
-        cache.delete("product-categories-%s-True" % variant.id)
+        cache.delete("product-%s" % variant.slug)
         cache.delete("product-navigation-%s" % variant.slug)
         cache.delete("product-shipping-%s" % variant.slug)
 
@@ -184,11 +260,14 @@ def update_cart_cache(instance):
     """
     cache.delete("cart-%s" % instance.user)
     cache.delete("cart-%s" % instance.session)
-    cache.delete("cart-items-%s" % instance.id)
-    cache.delete("cart-costs-True-%s" % instance.id)
-    cache.delete("cart-costs-False-%s" % instance.id)
-    cache.delete("shipping-delivery-time-cart")
-    cache.delete("shipping-delivery-time")
+    invalidate_namespaces(CART_NAMESPACE % instance.id)
+
+def update_export_cache(instance):
+    """Deletes the rendered rows and the feed file of the given export (see
+    lfs.export.feeds).
+    """
+    invalidate_namespaces(EXPORT_NAMESPACE % instance.id)
+    delete_feed(instance)
         
 def update_static_block_cache(instance):
     """Deletes all static block relevant caches.
@@ -201,7 +280,4 @@ def update_static_block_cache(instance):
 def update_topseller_cache(topseller):
     """Deletes all topseller relevant caches.
     """
-    cache.delete("topseller")
-    product = topseller.product
-    for category in product.get_categories(with_parents=True):
-        cache.delete("topseller-%s" % category.id)
\ No newline at end of file
+    invalidate_namespaces(TOPSELLER_NAMESPACE)
\ No newline at end of file
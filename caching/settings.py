@@ -0,0 +1,54 @@
+# The namespaces of cached values. Every namespace has a generation which is
+# part of the cache keys of its values, hence all values of a namespace are
+# invalidated at once by incrementing the generation (see
+# lfs.caching.utils.invalidate_namespaces).
+
+# The shop, e.g. the default format of categories.
+SHOP_NAMESPACE = "shop"
+
+# Everything which depends on the category tree, e.g. menus, breadcrumbs and
+# the categories of a product.
+CATEGORIES_NAMESPACE = "categories"
+
+# A single category, its membership and its children.
+CATEGORY_NAMESPACE = "category-%s"
+
+# The products which are displayed within a single category.
+CATEGORY_PRODUCTS_NAMESPACE = "category-products-%s"
+
+# The filter index of a single category. Its generation is the version of the
+# index (see lfs.catalog.index).
+FILTER_INDEX_NAMESPACE = "filter-index-%s"
+
+# A single product and its variants.
+PRODUCT_NAMESPACE = "product-%s"
+
+# A single cart and its items.
+CART_NAMESPACE = "cart-%s"
+
+# The taxes, e.g. the price records of all products (see lfs.catalog.prices).
+TAX_NAMESPACE = "tax"
+
+# The criteria of shipping and payment methods and their prices (see
+# lfs.criteria.rules).
+CRITERIA_NAMESPACE = "criteria"
+
+# The shipping and payment methods, their prices and the delivery times, e.g.
+# the delivery times of products (see
+# lfs.shipping.utils.get_product_delivery_time).
+SHIPPING_NAMESPACE = "shipping"
+
+# The searchable products, e.g. the autocomplete index (see
+# lfs.search.autocomplete).
+SEARCH_NAMESPACE = "search"
+
+# The calculated topseller of the shop and of all categories.
+TOPSELLER_NAMESPACE = "topseller"
+
+# The rendered rows of a single export (see lfs.export.utils.get_rows).
+EXPORT_NAMESPACE = "export-%s"
+
+# The feed file of a single export. This contains no values, its generation
+# is incremented whenever the feed file is deleted (see
+# lfs.export.feeds.generate_feed).
+FEED_NAMESPACE = "export-feed-%s"
@@ -1,3 +1,6 @@
+# python imports
+import time
+
 # django imports
 from django.db import models
 from django.db.models.query import QuerySet
@@ -5,6 +8,9 @@ from django.core.cache import cache
 from django.http import Http404
 from django.shortcuts import _get_queryset
 
+# The amount of cache hits and misses per namespace (see get_cache_statistics)
+STATISTICS = {}
+
 def key_from_instance(instance):
     opts = instance._meta
     return '%s.%s:%s' % (opts.app_label, opts.module_name, instance.pk)    
@@ -71,4 +77,205 @@ def clear_cache():
         cache._expire_info.clear()
     except AttributeError:
         pass
-        
\ No newline at end of file
+
+def get_cache(key, namespaces):
+    """Returns the value of the given key within the given namespaces (see
+    lfs.caching.settings) or None if there is none.
+    """
+    value = cache.get(get_cache_key(key, namespaces))
+    _count(namespaces, value is not None)
+    return value
+
+def set_cache(key, value, namespaces, timeout=None):
+    """Stores the given value under the given key within the given namespaces.
+    The value is out of date as soon as one of the namespaces is passed to
+    invalidate_namespaces or the given timeout (in seconds) has been expired.
+    """
+    cache.set(get_cache_key(key, namespaces), value, timeout)
+
+def delete_cache(key, namespaces):
+    """Deletes the value of the given key within the given namespaces.
+    """
+    cache.delete(get_cache_key(key, namespaces))
+
+def get_many_cache(keys):
+    """Returns the values of the given keys. keys is a list of (key,
+    namespaces) tuples. Returns a dictionary key -> value which contains just
+    the keys which have a value.
+
+    The generations of all namespaces and the values are read with one cache
+    request each.
+    """
+    all_namespaces = {}
+    for key, namespaces in keys:
+        for namespace in namespaces:
+            all_namespaces[namespace] = True
+    generations = get_generations(all_namespaces.keys())
+
+    cache_keys = {}
+    for key, namespaces in keys:
+        cache_keys[get_cache_key(key, namespaces, generations)] = (key, namespaces)
+
+    result = {}
+    values = cache.get_many(cache_keys.keys())
+    for cache_key, (key, namespaces) in cache_keys.items():
+        value = values.get(cache_key)
+        _count(namespaces, value is not None)
+        if value is not None:
+            result[key] = value
+    return result
+
+def set_many_cache(values, timeout=None):
+    """Stores the given values. values is a list of (key, namespaces, value)
+    tuples, see set_cache.
+
+    The generations of all namespaces are read with one cache request and the
+    values are stored with one as well (if the cache backend supports it).
+    """
+    all_namespaces = {}
+    for key, namespaces, value in values:
+        for namespace in namespaces:
+            all_namespaces[namespace] = True
+    generations = get_generations(all_namespaces.keys())
+
+    cache_values = {}
+    for key, namespaces, value in values:
+        cache_values[get_cache_key(key, namespaces, generations)] = value
+
+    try:
+        cache.set_many(cache_values, timeout)
+    except AttributeError:
+        # The cache backend of Django 1.0 has no set_many
+        for cache_key, value in cache_values.items():
+            cache.set(cache_key, value, timeout)
+
+def get_cache_key(key, namespaces, generations=None):
+    """Returns the actual cache key of the given key within the given
+    namespaces. This contains the current generation of every namespace.
+    """
+    if generations is None:
+        generations = get_generations(namespaces)
+    parts = [key]
+    for namespace in namespaces:
+        parts.append("%s:%s" % (namespace, generations[namespace]))
+    return "|".join(parts)
+
+def get_generations(namespaces):
+    """Returns the current generations of the given namespaces as dictionary.
+    Namespaces which have no generation yet get a new one.
+    """
+    keys = ["generation-%s" % namespace for namespace in namespaces]
+    generations = cache.get_many(keys)
+
+    result = {}
+    for namespace, key in zip(namespaces, keys):
+        generation = generations.get(key)
+        if generation is None:
+            # Another process could have created the generation meanwhile,
+            # hence we take what is within the cache after the add.
+            cache.add(key, _get_new_generation())
+            generation = cache.get(key)
+        result[namespace] = generation
+    return result
+
+def invalidate_namespaces(*namespaces):
+    """Invalidates all values within the given namespaces by incrementing the
+    generation of each namespace. The values itself are not touched, they are
+    just not found anymore.
+    """
+    for namespace in namespaces:
+        key = "generation-%s" % namespace
+        try:
+            cache.incr(key)
+        except AttributeError:
+            # The cache backend of Django 1.0 has no incr
+            generation = cache.get(key)
+            if generation is not None:
+                cache.set(key, generation + 1)
+        except ValueError:
+            # There is no generation, hence there are no values within the
+            # namespace which could be found.
+            pass
+
+def increment_generation(namespace):
+    """Invalidates the given namespace like invalidate_namespaces and returns
+    its new generation. The generation is incremented atomically (if the
+    cache backend supports it), hence it belongs to the caller alone, e.g. to
+    store a changed value under it, which has been read with the former
+    generation.
+    """
+    key = "generation-%s" % namespace
+    generation = get_generations([namespace])[namespace]
+    try:
+        return cache.incr(key)
+    except AttributeError:
+        # The cache backend of Django 1.0 has no incr
+        cache.set(key, generation + 1)
+        return generation + 1
+    except ValueError:
+        # The generation has been evicted meanwhile.
+        return get_generations([namespace])[namespace]
+
+def get_request_cache(request, key, function):
+    """Returns the value of the given key for the given request. The value is
+    calculated by calling the given function, at most once per request.
+    """
+    try:
+        values = request._lfs_cache
+    except AttributeError:
+        values = request._lfs_cache = {}
+
+    try:
+        return values[key]
+    except KeyError:
+        value = values[key] = function()
+        return value
+
+def set_request_cache(request, key, value):
+    """Stores the given value under the given key for the given request, e.g.
+    after the value has been created.
+    """
+    try:
+        request._lfs_cache[key] = value
+    except AttributeError:
+        request._lfs_cache = {key : value}
+
+def delete_request_cache(request, *keys):
+    """Deletes the values of the given keys for the given request. They are
+    calculated again on the next access.
+    """
+    values = getattr(request, "_lfs_cache", {})
+    for key in keys:
+        if key in values:
+            del values[key]
+
+def get_cache_statistics():
+    """Returns the amount of cache hits and misses per namespace of the
+    current process, e.g. {"category" : {"hits" : 12, "misses" : 3}}.
+    """
+    return STATISTICS
+
+def reset_cache_statistics():
+    """Resets the amount of cache hits and misses.
+    """
+    STATISTICS.clear()
+
+def _count(namespaces, hit):
+    """Counts a hit or a miss for the given namespaces.
+    """
+    if hit:
+        name = "hits"
+    else:
+        name = "misses"
+
+    for namespace in namespaces:
+        # Strips the id, e.g. "category-products-1" -> "category-products"
+        namespace = namespace.rstrip("0123456789").rstrip("-")
+        entry = STATISTICS.setdefault(namespace, {"hits" : 0, "misses" : 0})
+        entry[name] += 1
+
+def _get_new_generation():
+    """Returns a new generation for a namespace. This must not start by 1 as
+    values could survive an evicted generation.
+    """
+    return int(time.time() * 1000)
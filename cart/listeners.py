@@ -0,0 +1,19 @@
+# django imports
+from django.db.models.signals import pre_delete
+
+# lfs imports
+from lfs.cart.models import Cart
+from lfs.cart.models import CartItem
+from lfs.catalog import stock
+
+def cart_deleted_listener(sender, instance, **kwargs):
+    """Gives back the products which are reserved for the deleted cart.
+    """
+    stock.release(instance)
+pre_delete.connect(cart_deleted_listener, sender=Cart)
+
+def cart_item_deleted_listener(sender, instance, **kwargs):
+    """Gives back the product of the deleted cart item.
+    """
+    stock.release(instance.cart_id, instance.product_id)
+pre_delete.connect(cart_item_deleted_listener, sender=CartItem)
@@ -0,0 +1,66 @@
+from south.db import db
+from django.db import models
+from lfs.cart.models import *
+
+class Migration:
+    
+    def forwards(self, orm):
+        
+        # Adding model 'StockReservation'
+        db.create_table('cart_stockreservation', (
+            ('id', models.AutoField(primary_key=True)),
+            ('cart', models.ForeignKey(orm.Cart, related_name="reservations", verbose_name=_(u"Cart"))),
+            ('product', models.ForeignKey(orm['catalog.Product'], verbose_name=_(u"Product"))),
+            ('amount', models.FloatField(_(u"Amount"), default=0)),
+            ('expiration_date', models.DateTimeField(_(u"Expiration date"), db_index=True)),
+        ))
+        db.send_create_signal('cart', ['StockReservation'])
+        
+        # Creating unique_together for [cart, product] on StockReservation.
+        db.create_unique('cart_stockreservation', ['cart_id', 'product_id'])
+        
+    def backwards(self, orm):
+        
+        # Deleting unique_together for [cart, product] on StockReservation.
+        db.delete_unique('cart_stockreservation', ['cart_id', 'product_id'])
+        
+        # Deleting model 'StockReservation'
+        db.delete_table('cart_stockreservation')
+        
+    models = {
+        'auth.user': {
+            '_stub': True,
+            'id': ('models.AutoField', [], {'primary_key': 'True'})
+        },
+        'catalog.product': {
+            'Meta': {'ordering': '("name",)'},
+            '_stub': True,
+            'id': ('models.AutoField', [], {'primary_key': 'True'})
+        },
+        'cart.cartitem': {
+            'Meta': {'ordering': "['id']"},
+            'amount': ('models.IntegerField', ['_(u"Quantity")'], {'null': 'True', 'blank': 'True'}),
+            'cart': ('models.ForeignKey', ["orm['cart.Cart']"], {}),
+            'creation_date': ('models.DateTimeField', ['_(u"Creation date")'], {'auto_now_add': 'True'}),
+            'id': ('models.AutoField', [], {'primary_key': 'True'}),
+            'modification_date': ('models.DateTimeField', ['_(u"Modification date")'], {'auto_now': 'True', 'auto_now_add': 'True'}),
+            'product': ('models.ForeignKey', ["orm['catalog.Product']"], {})
+        },
+        'cart.stockreservation': {
+            'Meta': {'unique_together': '("cart","product")'},
+            'amount': ('models.FloatField', ['_(u"Amount")'], {'default': '0'}),
+            'cart': ('models.ForeignKey', ["orm['cart.Cart']"], {'related_name': '"reservations"'}),
+            'expiration_date': ('models.DateTimeField', ['_(u"Expiration date")'], {'db_index': 'True'}),
+            'id': ('models.AutoField', [], {'primary_key': 'True'}),
+            'product': ('models.ForeignKey', ["orm['catalog.Product']"], {})
+        },
+        'cart.cart': {
+            'creation_date': ('models.DateTimeField', ['_(u"Creation date")'], {'auto_now_add': 'True'}),
+            'id': ('models.AutoField', [], {'primary_key': 'True'}),
+            'modification_date': ('models.DateTimeField', ['_(u"Modification date")'], {'auto_now': 'True', 'auto_now_add': 'True'}),
+            'session': ('models.CharField', ['_(u"Session")'], {'max_length': '100', 'blank': 'True'}),
+            'user': ('models.ForeignKey', ["orm['auth.User']"], {'null': 'True', 'blank': 'True'})
+        }
+    }
+    
+    complete_apps = ['cart']
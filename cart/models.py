@@ -33,11 +33,16 @@ class Cart(models.Model):
     def items(self):
         """Returns the items of the cart.
         """
+        from lfs.caching.settings import CART_NAMESPACE
+        from lfs.caching.utils import get_cache
+        from lfs.caching.utils import set_cache
+
         cache_key = "cart-items-%s" % self.id
-        items = cache.get(cache_key)
+        namespaces = [CART_NAMESPACE % self.id]
+        items = get_cache(cache_key, namespaces)
         if items is None:
             items = CartItem.objects.filter(cart=self)
-            cache.set(cache_key, items)
+            set_cache(cache_key, items, namespaces)
         return items
 
     @property
@@ -98,4 +103,30 @@ class CartItem(models.Model):
     def get_tax(self):
         """Returns the absolute tax of the product.
         """
-        return self.product.get_tax() * self.amount
\ No newline at end of file
+        return self.product.get_tax() * self.amount
+
+class StockReservation(models.Model):
+    """A stock reservation holds back an amount of a product for a cart until
+    the expiration date. The reserved amount is already subtracted from the
+    stock amount of the product (see lfs.catalog.stock).
+
+    Instance variables:
+
+    - cart
+       The cart for which the product is reserved.
+    - product
+       The reserved product.
+    - amount
+       The reserved amount of the product.
+    - expiration_date
+       The date after which the amount is given back to the stock.
+    """
+    cart = models.ForeignKey(Cart, verbose_name=_(u"Cart"), related_name="reservations")
+    product = models.ForeignKey(Product, verbose_name=_(u"Product"))
+    amount = models.FloatField(_(u"Amount"), default=0)
+    expiration_date = models.DateTimeField(_(u"Expiration date"), db_index=True)
+
+    class Meta:
+        unique_together = ("cart", "product")
+
+from listeners import *
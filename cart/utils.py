@@ -1,30 +1,105 @@
+# python imports
+from datetime import date
+
 # django imports
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.cache import cache
 from django.core.urlresolvers import reverse
 
 # lfs imports
+from lfs.caching.settings import CART_NAMESPACE
+from lfs.caching.settings import CRITERIA_NAMESPACE
+from lfs.caching.settings import PRODUCT_NAMESPACE
+from lfs.caching.settings import SHIPPING_NAMESPACE
+from lfs.caching.settings import TAX_NAMESPACE
+from lfs.caching.utils import delete_request_cache
+from lfs.caching.utils import get_cache
+from lfs.caching.utils import get_request_cache
+from lfs.caching.utils import set_cache
+from lfs.caching.utils import set_request_cache
+from lfs.catalog.prices import get_price_records
 from lfs.cart.models import CartItem
 from lfs.cart.models import Cart
+from lfs.catalog.models import Product
 from lfs.payment import utils as payment_utils
 from lfs.shipping import utils as shipping_utils
 
+class Summary(object):
+    """Base class of the cart summaries. The values are passed as keyword
+    arguments and can't be changed afterwards, as a summary is shared via the
+    cache.
+    """
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("%s can't be changed" % self.__class__.__name__)
+
+class CartItemSummary(Summary):
+    """The prices of a cart item (already multiplied by its amount), the
+    prices of its product and its delivery time.
+
+    Attributes: id, product_id, amount, price_net, price_gross, tax,
+    product_price_net, product_price_gross, product_tax, delivery_time
+    """
+
+class CartSummary(Summary):
+    """The costs and the maximal delivery time of a cart.
+
+    Attributes: cart_id, items (tuple of CartItemSummary), price, tax (of the
+    items), shipping_price, shipping_tax, payment_price, payment_tax,
+    total_price, total_tax, max_delivery_time
+    """
+
+def get_cart_summary(request, cart):
+    """Returns the summary of the given cart (see CartSummary).
+
+    All items, their products and prices are loaded at once and the summary is
+    cached until the cart, any of its products, the selected methods or
+    country, any tax, criterion, shipping or payment method has been changed.
+    """
+    shipping_method = shipping_utils.get_selected_shipping_method(request)
+    payment_method = payment_utils.get_selected_payment_method(request)
+    country = shipping_utils.get_selected_shipping_country(request)
+
+    # The delivery time depends on the current date.
+    cache_key = "cart-summary-%s-%s-%s-%s-%s-%s" % (
+        cart.id, cart.modification_date.strftime("%Y%m%d%H%M%S"),
+        getattr(shipping_method, "id", None), getattr(payment_method, "id", None),
+        getattr(country, "id", None), date.today().strftime("%Y%m%d"))
+    namespaces = [CART_NAMESPACE % cart.id, TAX_NAMESPACE, CRITERIA_NAMESPACE,
+                  SHIPPING_NAMESPACE] + _get_product_namespaces(cart)
+
+    summary = get_cache(cache_key, namespaces)
+    if summary is None:
+        summary = _create_cart_summary(request, cart, shipping_method, payment_method)
+        set_cache(cache_key, summary, namespaces)
+    return summary
+
+def get_cart_products(cart):
+    """Returns the products of all items of the given cart as dictionary:
+    product id -> product. The products are loaded with one query and their
+    parents with another one.
+    """
+    products = Product.objects.in_bulk([item.product_id for item in cart.items()])
+
+    parent_ids = [p.parent_id for p in products.values() if p.parent_id]
+    if parent_ids:
+        parents = Product.objects.in_bulk(parent_ids)
+        cache_name = Product._meta.get_field("parent").get_cache_name()
+        for product in products.values():
+            if product.parent_id in parents:
+                setattr(product, cache_name, parents[product.parent_id])
+
+    return products
+
 def get_cart_max_delivery_time(request, cart):
     """Returns the delivery time object with the maximal delivery time of all
     products within the cart. Takes the selected shipping method into account.
 
     This is used within the cart to display the maximal delivery time.
     """
-    max_delivery_time = None
-    for item in cart.items():
-        # Calculate the delivery time of the product. Takes the selected
-        # shipping method into account.
-        delivery_time = shipping_utils.get_product_delivery_time(
-            request, item.product.slug, for_cart=True)
-        if (max_delivery_time is None) or \
-           (delivery_time.as_hours() > max_delivery_time.as_hours()):
-            max_delivery_time = delivery_time
-    return max_delivery_time
+    return get_cart_summary(request, cart).max_delivery_time
 
 # TODO: Remove cart from signature?
 def get_cart_price(request, cart, total=False):
@@ -33,39 +108,108 @@ def get_cart_price(request, cart, total=False):
     return get_cart_costs(request, cart, total)["price"]
 
 def get_cart_costs(request, cart, total=False):
-    """Returns price and tax of the given cart.
+    """Returns price and tax of the given cart. If total is True the costs of
+    the selected shipping and payment method are included.
     """
     if cart is None:
         return {"price" : 0, "tax" : 0}
 
-    cache_key = "cart-costs-%s-%s" % (total, cart.id)
-    cart_costs = cache.get(cache_key)
+    if total:
+        summary = get_cart_summary(request, cart)
+        return {"price" : summary.total_price, "tax" : summary.total_tax}
+
+    # The costs of the items are needed to evaluate the criteria of the
+    # shipping and payment methods, hence they can't be taken from the summary.
+    cache_key = "cart-costs-%s" % cart.id
+    namespaces = [CART_NAMESPACE % cart.id, TAX_NAMESPACE] + \
+                 _get_product_namespaces(cart)
+    cart_costs = get_cache(cache_key, namespaces)
 
     if cart_costs is None:
-        cart_price = 0
-        cart_tax = 0
-        for item in cart.items():
-            cart_price += item.get_price()
-            cart_tax += item.get_tax()
-
-        if total:
-            # Shipping
-            shipping_method = shipping_utils.get_selected_shipping_method(request)
-            shipping_costs = shipping_utils.get_shipping_costs(request, shipping_method)
-            cart_price += shipping_costs["price"]
-            cart_tax += shipping_costs["tax"]
-
-            # Payment
-            payment_method = payment_utils.get_selected_payment_method(request)
-            payment_costs = payment_utils.get_payment_costs(request, payment_method)
-            cart_price += payment_costs["price"]
-            cart_tax += payment_costs["tax"]
-
-        cart_costs = {"price" : cart_price, "tax" : cart_tax}
-        cache.set(cache_key, cart_costs)
+        items = _get_item_prices(cart, get_cart_products(cart))
+        cart_costs = {
+            "price" : sum([item["price_gross"] for item in items]),
+            "tax" : sum([item["tax"] for item in items]),
+        }
+        set_cache(cache_key, cart_costs, namespaces)
 
     return cart_costs
 
+def _create_cart_summary(request, cart, shipping_method, payment_method):
+    """Creates the summary of the given cart.
+    """
+    products = get_cart_products(cart)
+
+    items = []
+    max_delivery_time = None
+    for item in _get_item_prices(cart, products):
+        # Calculate the delivery time of the product. Takes the selected
+        # shipping method into account.
+        delivery_time = shipping_utils.calculate_product_delivery_time(
+            request, products[item["product_id"]], for_cart=True)
+        if (max_delivery_time is None) or \
+           (delivery_time.as_hours() > max_delivery_time.as_hours()):
+            max_delivery_time = delivery_time
+        items.append(CartItemSummary(delivery_time=delivery_time, **item))
+
+    price = sum([item.price_gross for item in items])
+    tax = sum([item.tax for item in items])
+    shipping_costs = shipping_utils.get_shipping_costs(request, shipping_method)
+    payment_costs = payment_utils.get_payment_costs(request, payment_method)
+
+    return CartSummary(
+        cart_id=cart.id,
+        items=tuple(items),
+        price=price,
+        tax=tax,
+        shipping_price=shipping_costs["price"],
+        shipping_tax=shipping_costs["tax"],
+        payment_price=payment_costs["price"],
+        payment_tax=payment_costs["tax"],
+        total_price=price + shipping_costs["price"] + payment_costs["price"],
+        total_tax=tax + shipping_costs["tax"] + payment_costs["tax"],
+        max_delivery_time=max_delivery_time,
+    )
+
+def _get_product_namespaces(cart):
+    """Returns the cache namespaces of the products of the given cart.
+    Variants share the namespace of their parent. The namespaces are cached
+    together with the cart, hence the products are not loaded.
+    """
+    cache_key = "cart-product-namespaces-%s" % cart.id
+    namespaces = get_cache(cache_key, [CART_NAMESPACE % cart.id])
+    if namespaces is None:
+        product_ids = [item.product_id for item in cart.items()]
+        ids = set([parent_id or id for id, parent_id in
+            Product.objects.filter(pk__in=product_ids).values_list("id", "parent")])
+        namespaces = [PRODUCT_NAMESPACE % id for id in sorted(ids)]
+        set_cache(cache_key, namespaces, [CART_NAMESPACE % cart.id])
+    return namespaces
+
+def _get_item_prices(cart, products):
+    """Returns the prices of the items of the given cart as list of
+    dictionaries. products are the products of the items (see
+    get_cart_products).
+    """
+    # The prices of all products are calculated at once
+    records = get_price_records(products.values())
+
+    result = []
+    for item in cart.items():
+        record = records[item.product_id]
+        result.append({
+            "id" : item.id,
+            "product_id" : item.product_id,
+            "amount" : item.amount,
+            "price_net" : record["price_net"] * item.amount,
+            "price_gross" : record["price_gross"] * item.amount,
+            "tax" : record["tax"] * item.amount,
+            "product_price_net" : record["price_net"],
+            "product_price_gross" : record["price_gross"],
+            "product_tax" : record["tax"],
+        })
+    return result
+
 def get_or_create_cart(request):
     """Returns the cart of the current user. If no cart exists it creates a new
     one first.
@@ -84,10 +228,18 @@ def create_cart(request):
         cart.user = request.user
 
     cart.save()
+    set_request_cache(request, "cart", cart)
     return cart
 
 def get_cart(request):
     """Returns the cart of the current customer or None.
+
+    The cart is loaded once per request.
+    """
+    return get_request_cache(request, "cart", lambda: _get_cart(request))
+
+def _get_cart(request):
+    """Loads the cart of the current customer.
     """
     session_key = request.session.session_key
     user = request.user
@@ -148,4 +300,6 @@ def update_cart_after_login(request):
                     user_cart_item.save()
             session_cart.delete()
     except ObjectDoesNotExist:
-        pass
\ No newline at end of file
+        pass
+
+    delete_request_cache(request, "cart")
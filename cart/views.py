@@ -7,12 +7,14 @@ from django.http import HttpResponseRedirect
 from django.shortcuts import render_to_response
 from django.template.loader import render_to_string
 from django.template import RequestContext
+from django.utils.translation import ugettext_lazy as _
 
 # lfs imports
 import lfs.cart.utils
 from lfs.caching.utils import lfs_get_object_or_404
 from lfs.core.signals import cart_changed
 from lfs.core import utils as core_utils
+from lfs.catalog import stock
 from lfs.catalog.models import Product
 from lfs.catalog.settings import PRODUCT_WITH_VARIANTS
 from lfs.cart import utils as cart_utils
@@ -39,7 +41,7 @@ def cart_inline(request, template_name="lfs/cart/cart_inline.html"):
             "shopping_url" : shopping_url,
         }))
 
-    shop = core_utils.get_default_shop()
+    shop = core_utils.get_default_shop(request)
     countries = shop.countries.all()
     selected_country = shipping_utils.get_selected_shipping_country(request)
 
@@ -47,35 +49,25 @@ def cart_inline(request, template_name="lfs/cart/cart_inline.html"):
     selected_shipping_method = shipping_utils.get_selected_shipping_method(request)
     selected_payment_method = payment_utils.get_selected_payment_method(request)
 
-    shipping_costs = shipping_utils.get_shipping_costs(request,
-        selected_shipping_method)
-
-    payment_costs = payment_utils.get_payment_costs(request,
-        selected_payment_method)
-
-    cart_costs = cart_utils.get_cart_costs(request, cart)
-    cart_price = \
-        cart_costs["price"] + shipping_costs["price"] + payment_costs["price"]
-
-    cart_tax = \
-        cart_costs["tax"] + shipping_costs["tax"] + payment_costs["tax"]
-
-    max_delivery_time = cart_utils.get_cart_max_delivery_time(request, cart)
+    # Prices and delivery time of the whole cart at once
+    summary = cart_utils.get_cart_summary(request, cart)
+    max_delivery_time = summary.max_delivery_time
 
     # Calc delivery date for cart (which is the maximum of all cart items)
-    max_delivery_date = cart_utils.get_cart_max_delivery_time(request, cart)
+    max_delivery_date = summary.max_delivery_time
 
     return render_to_string(template_name, RequestContext(request, {
         "cart" : cart,
+        "cart_summary" : summary,
         "max_delivery_date" : max_delivery_date,
-        "cart_price" : cart_price,
-        "cart_tax" : cart_tax,
+        "cart_price" : summary.total_price,
+        "cart_tax" : summary.total_tax,
         "shipping_methods" : shipping_utils.get_valid_shipping_methods(request),
         "selected_shipping_method" : selected_shipping_method,
-        "shipping_price" : shipping_costs["price"],
+        "shipping_price" : summary.shipping_price,
         "payment_methods" : payment_utils.get_valid_payment_methods(request),
         "selected_payment_method" : selected_payment_method,
-        "payment_price" : payment_costs["price"],
+        "payment_price" : summary.payment_price,
         "countries" : countries,
         "selected_country" : selected_country,
         "max_delivery_time" : max_delivery_time,
@@ -178,10 +170,15 @@ def add_to_cart(request, product_id=None):
         cart_item = CartItem.objects.get(cart = cart, product = product)
     except ObjectDoesNotExist:
         cart_item = CartItem(cart=cart, product=product, amount=quantity)
-        cart_item.save()
     else:
         cart_item.amount += quantity
-        cart_item.save()
+
+    # The product is reserved for the cart (if enabled). If it is not on stock
+    # anymore nothing is added.
+    if not stock.reserve(cart, product, cart_item.amount):
+        return core_utils.set_message_cookie(product.get_absolute_url(),
+            _(u"Sorry, the product is not on stock anymore."))
+    cart_item.save()
 
     cart_items = [cart_item]
 
@@ -205,10 +202,12 @@ def add_to_cart(request, product_id=None):
                 cart_item = CartItem.objects.get(cart = cart, product = accessory)
             except ObjectDoesNotExist:
                 cart_item = CartItem(cart=cart, product = accessory, amount=quantity)
-                cart_item.save()
             else:
                 cart_item.amount += quantity
-                cart_item.save()
+
+            if not stock.reserve(cart, accessory, cart_item.amount):
+                continue
+            cart_item.save()
 
             cart_items.append(cart_item)
 
@@ -265,10 +264,14 @@ def refresh_cart(request):
     for item in cart.items():
         amount = request.POST.get("amount-cart-item_%s" % item.id, 0)
         try:
-            item.amount = int(amount)
+            amount = int(amount)
         except ValueError:
-            item.amount = 1
-        item.save()
+            amount = 1
+
+        # The amount is just changed if the product is on stock.
+        if stock.reserve(cart, item.product, amount):
+            item.amount = amount
+            item.save()
 
     # IMPORTANT: We have to send the signal already here, because the valid
     # shipping methods might be dependent on the price.
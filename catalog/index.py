@@ -0,0 +1,288 @@
+"""Provides the filter index of a category.
+
+The filter index is the base to calculate the product filters (facets) of a
+category without querying the ``catalog_productpropertyvalue`` table on every
+request. It is calculated once per category, stored within the cache and
+updated incrementally when a product or a ``ProductPropertyValue`` of the
+category is changed.
+
+Every index is stored under a version (the generation of
+FILTER_INDEX_NAMESPACE). An update reserves the next version and stores the
+patched index under it, hence concurrent updates can't overwrite each
+other's changes: an update which finds no index of the former version (e.g.
+as another update is still running) leaves the index alone and it is built
+again from the database. For the same reason an index which has been built
+while the products have been changed is stored under an outdated version.
+
+The index is a dictionary with following keys:
+
+    - products
+        The ids of all products which are displayed within the category
+        (standard products and products with variants).
+
+    - parents
+        Maps the id of every indexed product (displayed products and their
+        active variants) to the id of the displayed product. For displayed
+        products this is the id of the product itself.
+
+    - values
+        Maps property id -> value -> set of product ids. This contains the ids
+        of the products which actually own the value (variants as well).
+
+    - parent_values
+        Maps property id -> value -> set of displayed product ids. This is used
+        to count a property/value pair just one time per displayed product.
+
+    - numbers
+        Maps property id -> list of (value_as_float, value, product id) sorted
+        by value_as_float. This is used for number fields (ranges).
+
+    - variants
+        Maps the id of every displayed product to the ids of its active
+        variants.
+
+    - prices
+        Maps the id of every indexed product to its effective price. This is
+        used for price filters.
+
+    - fields
+        Maps the id of every displayed product to a dictionary with the values
+        of SORTABLE_FIELDS. This is used to sort the filtered products without
+        the database.
+"""
+# django imports
+from django.core.cache import cache
+from django.db import connection
+
+# lfs imports
+import lfs.catalog.models
+from lfs.catalog.settings import STANDARD_PRODUCT
+from lfs.catalog.settings import PRODUCT_WITH_VARIANTS
+from lfs.catalog.settings import VARIANT
+
+# The amount of ids which are put into one SQL statement.
+CHUNK_SIZE = 1000
+
+# The fields by which the filtered products can be sorted out of the index.
+SORTABLE_FIELDS = ("name", "price", "effective_price")
+
+def get_filter_index(category):
+    """Returns the filter index of the given category. Creates it if it
+    doesn't exist yet.
+
+    The index is invalidated whenever the category or one of its children
+    is changed (see lfs.caching.listeners.update_category_cache).
+    """
+    from lfs.caching.utils import get_cache_key
+
+    # The key is taken before the index is built, see above.
+    cache_key = get_cache_key("category-filter-index", _get_namespaces(category))
+    index = cache.get(cache_key)
+    if index is None:
+        index = build_filter_index(category)
+        cache.add(cache_key, index)
+    return index
+
+def build_filter_index(category):
+    """Creates the filter index of the given category.
+    """
+    # The products of all children are displayed as well if show_all_products
+    # is set. They are found via the path of the category. A category without
+    # path (e.g. loaded via loaddata) would match all products.
+    if category.show_all_products and category.path:
+        products = lfs.catalog.models.Product.objects.filter(
+            categories__path__startswith=category.path)
+        variants = lfs.catalog.models.Product.objects.filter(
+            parent__categories__path__startswith=category.path)
+    else:
+        products = lfs.catalog.models.Product.objects.filter(
+            categories=category)
+        variants = lfs.catalog.models.Product.objects.filter(
+            parent__categories=category)
+
+    products = products.filter(
+        active=True,
+        sub_type__in=(STANDARD_PRODUCT, PRODUCT_WITH_VARIANTS),
+    ).distinct().values_list("id", *SORTABLE_FIELDS)
+
+    variants = variants.filter(
+        active=True,
+        sub_type=VARIANT,
+    ).distinct().values_list("id", "parent", "effective_price")
+
+    index = _create_empty_index()
+    _add_products(index, products, variants)
+    return index
+
+def update_filter_index(product, deleted=False):
+    """Updates the filter indexes of all categories of the given product. If
+    deleted is True the product is removed from the indexes.
+
+    This just refreshes the entries of the given product (and the entries of
+    its variants or its parent) within every cached index. Indexes which are
+    not within the cache are left alone as they are built on the next request.
+    """
+    from lfs.caching.settings import FILTER_INDEX_NAMESPACE
+    from lfs.caching.utils import get_cache_key
+    from lfs.caching.utils import get_generations
+    from lfs.caching.utils import increment_generation
+
+    if product.is_variant():
+        parent = product.parent
+    else:
+        parent = product
+
+    direct_ids = [c.id for c in parent.get_categories()]
+    listed = parent.active and \
+        parent.sub_type in (STANDARD_PRODUCT, PRODUCT_WITH_VARIANTS) and \
+        not (deleted and parent.id == product.id)
+
+    products = variants = None
+    seen = {}
+    for category in parent.get_categories(with_parents=True):
+        if category.id in seen:
+            continue
+        seen[category.id] = True
+
+        namespaces = _get_namespaces(category)
+        generations = get_generations(namespaces)
+        version = increment_generation(FILTER_INDEX_NAMESPACE % category.id)
+
+        generations[FILTER_INDEX_NAMESPACE % category.id] = version - 1
+        index = cache.get(get_cache_key("category-filter-index", namespaces, generations))
+        if index is None:
+            continue
+
+        _remove_product(index, parent.id)
+
+        if listed and (category.id in direct_ids or category.show_all_products):
+            if products is None:
+                products = list(lfs.catalog.models.Product.objects.filter(
+                    pk=parent.id).values_list("id", *SORTABLE_FIELDS))
+                variants = lfs.catalog.models.Product.objects.filter(
+                    active=True, parent=parent)
+                if deleted:
+                    variants = variants.exclude(pk=product.id)
+                variants = list(variants.values_list("id", "parent", "effective_price"))
+
+            _add_products(index, products, variants)
+
+        generations[FILTER_INDEX_NAMESPACE % category.id] = version
+        cache.add(get_cache_key("category-filter-index", namespaces, generations), index)
+
+def _get_namespaces(category):
+    """Returns the cache namespaces of the filter index of the given category.
+    """
+    from lfs.caching.settings import CATEGORY_NAMESPACE
+    from lfs.caching.settings import FILTER_INDEX_NAMESPACE
+    return [CATEGORY_NAMESPACE % category.id, FILTER_INDEX_NAMESPACE % category.id]
+
+def _create_empty_index():
+    """Returns an empty filter index.
+    """
+    return {
+        "products" : [],
+        "parents" : {},
+        "values" : {},
+        "parent_values" : {},
+        "numbers" : {},
+        "variants" : {},
+        "prices" : {},
+        "fields" : {},
+    }
+
+def _add_products(index, products, variants):
+    """Adds the given products and variants to the given index.
+
+    products is a sequence of (id, SORTABLE_FIELDS...) rows and variants a
+    sequence of (id, parent id, effective price) rows.
+    """
+    parents = index["parents"]
+    for row in products:
+        product_id = row[0]
+        index["products"].append(product_id)
+        index["variants"][product_id] = []
+        index["fields"][product_id] = dict(zip(SORTABLE_FIELDS, row[1:]))
+        index["prices"][product_id] = index["fields"][product_id]["effective_price"]
+        parents[product_id] = product_id
+
+    for variant_id, parent_id, effective_price in variants:
+        # Variants of inactive products are not displayed at all.
+        if parent_id not in index["variants"]:
+            continue
+        index["variants"][parent_id].append(variant_id)
+        index["prices"][variant_id] = effective_price
+        parents[variant_id] = parent_id
+
+    product_ids = [row[0] for row in products]
+    for row in products:
+        product_ids.extend(index["variants"].get(row[0], []))
+
+    _add_property_values(index, product_ids)
+
+def _add_property_values(index, product_ids):
+    """Adds the property values of the products with given ids to the given
+    index.
+    """
+    parents = index["parents"]
+    values = index["values"]
+    parent_values = index["parent_values"]
+    numbers = index["numbers"]
+
+    changed_numbers = {}
+    cursor = connection.cursor()
+    for i in range(0, len(product_ids), CHUNK_SIZE):
+        ids = ", ".join([str(id) for id in product_ids[i:i+CHUNK_SIZE]])
+        cursor.execute("""SELECT product_id, property_id, value, value_as_float
+                          FROM catalog_productpropertyvalue
+                          WHERE product_id IN (%s)""" % ids)
+
+        for product_id, property_id, value, value_as_float in cursor.fetchall():
+            parent_id = parents[product_id]
+
+            values.setdefault(property_id, {}).setdefault(value, set()).add(product_id)
+            parent_values.setdefault(property_id, {}).setdefault(value, set()).add(parent_id)
+
+            if value_as_float is not None:
+                numbers.setdefault(property_id, []).append(
+                    (value_as_float, value, product_id))
+                changed_numbers[property_id] = True
+
+    for property_id in changed_numbers.keys():
+        numbers[property_id].sort()
+
+def _remove_product(index, parent_id):
+    """Removes the given displayed product and its variants from the given
+    index.
+    """
+    parents = index["parents"]
+    product_ids = set([id for id, p_id in parents.items() if p_id == parent_id])
+    if not product_ids:
+        return
+
+    for id in product_ids:
+        del parents[id]
+        index["prices"].pop(id, None)
+
+    try:
+        index["products"].remove(parent_id)
+    except ValueError:
+        pass
+
+    index["variants"].pop(parent_id, None)
+    index["fields"].pop(parent_id, None)
+
+    for property_values in index["values"].values():
+        for value, ids in property_values.items():
+            ids.difference_update(product_ids)
+            if not ids:
+                del property_values[value]
+
+    for property_values in index["parent_values"].values():
+        for value, ids in property_values.items():
+            ids.discard(parent_id)
+            if not ids:
+                del property_values[value]
+
+    for property_id, entries in index["numbers"].items():
+        index["numbers"][property_id] = [e for e in entries if e[2] not in product_ids]
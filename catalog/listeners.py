@@ -1,11 +1,18 @@
 # django imports
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
 from django.db.models.signals import pre_delete
 
 # lfs imports
+from lfs.catalog.index import update_filter_index
+from lfs.catalog.prices import update_effective_prices
+from lfs.catalog.models import Product
 from lfs.catalog.models import PropertyGroup
 from lfs.catalog.models import ProductPropertyValue
 from lfs.catalog.models import PropertyOption
 from lfs.catalog.models import GroupsPropertiesRelation
+from lfs.core.signals import product_changed
 from lfs.core.signals import property_type_changed
 from lfs.core.signals import product_removed_property_group
 
@@ -86,3 +93,28 @@ def product_removed_from_property_group_listener(sender, **kwargs):
         else:
             ppv.delete()
 product_removed_property_group.connect(product_removed_from_property_group_listener)
+
+def property_value_changed_listener(sender, instance, **kwargs):
+    """Updates the filter indexes of the categories of the product the changed
+    ProductPropertyValue (instance) belongs to.
+    """
+    try:
+        product = instance.product
+    except ObjectDoesNotExist:
+        return
+    update_filter_index(product)
+post_save.connect(property_value_changed_listener, sender=ProductPropertyValue)
+post_delete.connect(property_value_changed_listener, sender=ProductPropertyValue)
+
+def variant_deleted_listener(sender, instance, **kwargs):
+    """Updates the effective price of the parent of a deleted variant (its
+    default variant could have been changed).
+    """
+    if instance.is_variant() and update_effective_prices(instance):
+        try:
+            parent = instance.parent
+        except ObjectDoesNotExist:
+            return
+        update_filter_index(parent)
+        product_changed.send(parent)
+post_delete.connect(variant_deleted_listener, sender=Product)
@@ -0,0 +1,15 @@
+# django imports
+from django.core.management.base import NoArgsCommand
+
+# lfs imports
+from lfs.catalog import variants
+
+class Command(NoArgsCommand):
+    """Creates the variants which have been requested in the background (see
+    lfs.catalog.variants). This is meant to be called regularly, e.g. by cron.
+    """
+    help = "Creates the requested variants of products."
+
+    def handle_noargs(self, **options):
+        amount = variants.process_variants_jobs()
+        print "%s variants" % amount
@@ -0,0 +1,16 @@
+# django imports
+from django.core.management.base import NoArgsCommand
+
+# lfs imports
+from lfs.catalog import stock
+
+class Command(NoArgsCommand):
+    """Gives back the reserved amounts of all expired stock reservations (see
+    lfs.catalog.stock). Reservations are released on the next reservation
+    anyway, this just returns the amounts in time if nobody reserves a
+    product. This is meant to be called regularly, e.g. by cron.
+    """
+    help = "Releases expired stock reservations."
+
+    def handle_noargs(self, **options):
+        stock.release_expired()
@@ -7,9 +7,12 @@ from django.db import models
 from django.utils.translation import ugettext_lazy as _
 
 # lfs imports
+import lfs.catalog.index
+import lfs.catalog.prices
 import lfs.catalog.utils
 from lfs.core.fields.thumbs import ImageWithThumbsField
 from lfs.core.managers import ActiveManager
+from lfs.core.signals import product_changed
 from lfs.catalog.settings import ACTIVE_FOR_SALE_CHOICES
 from lfs.catalog.settings import ACTIVE_FOR_SALE_STANDARD
 from lfs.catalog.settings import ACTIVE_FOR_SALE_YES
@@ -101,6 +104,11 @@ class Category(models.Model):
         - level
            The level of the category within the category hierachie, e.g. if it
            is a top level category the level is 1.
+
+        - path
+           The ids of the category and all its parents starting with the top
+           level category, e.g. "/1/5/12/". This is calculated on save and is
+           used to get all parents or all children with a single query.
     """
     name = models.CharField(_(u"Name"), max_length=50)
     slug = models.SlugField(_(u"Slug"),unique=True)
@@ -129,6 +137,7 @@ class Category(models.Model):
     meta_description = models.TextField(_(u"Meta description"), blank=True)
 
     level = models.PositiveSmallIntegerField(default=1)
+    path = models.CharField(max_length=255, blank=True, db_index=True)
     uid = models.CharField(max_length=50)
 
     class Meta:
@@ -150,38 +159,93 @@ class Category(models.Model):
         """
         return u"category"
 
+    def save(self, force_insert=False, force_update=False):
+        """Overwritten to keep the path and the level of the category and all
+        its children current.
+        """
+        old_path = self.path
+        super(Category, self).save(force_insert, force_update)
+
+        if self.parent_id is None:
+            path = "/%s/" % self.id
+        else:
+            # Takes the path from the database as the parent instance could
+            # be out of date.
+            parent_path = Category.objects.filter(
+                pk=self.parent_id).values_list("path", flat=True)[0]
+            path = "%s%s/" % (parent_path, self.id)
+
+        if path == old_path:
+            return
+
+        self.path = path
+        self.level = _get_level(path)
+        Category.objects.filter(pk=self.id).update(path=self.path, level=self.level)
+
+        if old_path:
+            children = Category.objects.filter(
+                path__startswith=old_path).exclude(pk=self.id)
+            for id, child_path in children.values_list("id", "path"):
+                child_path = path + child_path[len(old_path):]
+                Category.objects.filter(pk=id).update(
+                    path=child_path, level=_get_level(child_path))
+
+        # The category tree snapshot (see lfs.catalog.tree) could have been
+        # created in the meanwhile out of the former paths.
+        from lfs.caching.settings import CATEGORIES_NAMESPACE
+        from lfs.caching.utils import invalidate_namespaces
+        invalidate_namespaces(CATEGORIES_NAMESPACE)
+
     def get_all_children(self):
         """Returns all child categories of the category.
+
+        The children are loaded with one query and ordered depth first, every
+        level by position.
         """
-        def _get_all_children(category, children):
-            for category in Category.objects.filter(parent=category.id):
+        def _get_all_children(category_id, children):
+            for category in categories.get(category_id, []):
                 children.append(category)
-                _get_all_children(category, children)
+                _get_all_children(category.id, children)
+
+        from lfs.caching.settings import CATEGORIES_NAMESPACE
+        from lfs.caching.utils import get_cache
+        from lfs.caching.utils import set_cache
 
         cache_key = "category-all-children-%s" % self.id
-        children = cache.get(cache_key)
+        children = get_cache(cache_key, [CATEGORIES_NAMESPACE])
         if children is not None:
             return children
 
+        # A category without path has not been saved yet.
+        if not self.path:
+            return []
+
+        categories = {}
+        for category in Category.objects.filter(
+            path__startswith=self.path).exclude(pk=self.id):
+            categories.setdefault(category.parent_id, []).append(category)
+
         children = []
-        for category in Category.objects.filter(parent=self.id):
-            children.append(category)
-            _get_all_children(category, children)
+        _get_all_children(self.id, children)
 
-        cache.set(cache_key, children)
+        set_cache(cache_key, children, [CATEGORIES_NAMESPACE])
         return children
 
     def get_children(self):
         """Returns the first level child categories.
         """
+        from lfs.caching.settings import CATEGORIES_NAMESPACE
+        from lfs.caching.utils import get_cache
+        from lfs.caching.utils import set_cache
+
         cache_key = "category-children-%s" % self.id
 
-        categories = cache.get(cache_key)
+        categories = get_cache(cache_key, [CATEGORIES_NAMESPACE])
         if categories is not None:
             return categories
 
         categories = Category.objects.filter(parent=self.id)
-        cache.set(cache_key, categories)
+        set_cache(cache_key, categories, [CATEGORIES_NAMESPACE])
 
         return categories
 
@@ -246,49 +310,67 @@ class Category(models.Model):
     def get_parents(self):
         """Returns all parent categories.
         """
+        from lfs.caching.settings import CATEGORIES_NAMESPACE
+        from lfs.caching.utils import get_cache
+        from lfs.caching.utils import set_cache
+
         cache_key = "category-parents-%s" % self.id
-        parents = cache.get(cache_key)
+        parents = get_cache(cache_key, [CATEGORIES_NAMESPACE])
         if parents is not None:
             return parents
 
-        parents = []
-        category = self.parent
-        while category is not None:
-            parents.append(category)
-            category = category.parent
+        # The path contains the ids from the top level category to the
+        # category itself.
+        ids = [int(id) for id in self.path.split("/") if id][:-1]
+        parents = Category.objects.in_bulk(ids)
+        parents = [parents[id] for id in reversed(ids) if id in parents]
 
-        cache.set(cache_key, parents)
+        set_cache(cache_key, parents, [CATEGORIES_NAMESPACE])
         return parents
 
     def get_products(self):
         """Returns the direct products of the category.
         """
+        from lfs.caching.settings import CATEGORY_NAMESPACE
+        from lfs.caching.settings import CATEGORY_PRODUCTS_NAMESPACE
+        from lfs.caching.utils import get_cache
+        from lfs.caching.utils import set_cache
+
         cache_key = "category-products-%s" % self.id
-        products = cache.get(cache_key)
+        namespaces = [CATEGORY_NAMESPACE % self.id, CATEGORY_PRODUCTS_NAMESPACE % self.id]
+        products = get_cache(cache_key, namespaces)
         if products is not None:
             return products
 
         products = self.products.filter(active=True).exclude(sub_type=VARIANT)
-        cache.set(cache_key, products)
+        set_cache(cache_key, products, namespaces)
 
         return products
 
     def get_all_products(self):
         """Returns the direct products and all products of the sub categories
         """
+        from lfs.caching.settings import CATEGORY_NAMESPACE
+        from lfs.caching.settings import CATEGORY_PRODUCTS_NAMESPACE
+        from lfs.caching.utils import get_cache
+        from lfs.caching.utils import set_cache
+
         cache_key = "category-all-products-%s" % self.id
-        products = cache.get(cache_key)
+        namespaces = [CATEGORY_NAMESPACE % self.id, CATEGORY_PRODUCTS_NAMESPACE % self.id]
+        products = get_cache(cache_key, namespaces)
         if products is not None:
             return products
 
-        categories = [self]
-        categories.extend(self.get_all_children())
-
-        products = lfs.catalog.models.Product.objects.distinct().filter(
-            active=True,
-            categories__in = categories).exclude(sub_type=VARIANT)
+        # A category without path (e.g. loaded via loaddata) would match all
+        # products, hence just its direct products are taken.
+        if self.path:
+            products = lfs.catalog.models.Product.objects.distinct().filter(
+                active=True,
+                categories__path__startswith = self.path).exclude(sub_type=VARIANT)
+        else:
+            products = self.products.filter(active=True).exclude(sub_type=VARIANT)
 
-        cache.set(cache_key, products)
+        set_cache(cache_key, products, namespaces)
         return products
 
     def get_filtered_products(self, filters, sorting):
@@ -296,7 +378,7 @@ class Category(models.Model):
         by passed sorted
         """
         return lfs.catalog.utils.get_filtered_products_for_category(
-            self, filters, sorting)
+            self, filters, None, sorting)
 
     def get_static_block(self):
         """Returns the static block of the category.
@@ -319,6 +401,11 @@ class Category(models.Model):
         import lfs.core.utils
         return self.parent or lfs.core.utils.get_default_shop()
 
+def _get_level(path):
+    """Returns the level of a category with the given path.
+    """
+    return path.count("/") - 1
+
 class Product(models.Model):
     """A product is sold within a shop.
 
@@ -336,7 +423,8 @@ class Product(models.Model):
               The gross price of the product
 
         - effective_price:
-            Only for internal usage (price filtering).
+            Only for internal usage (price filtering and sorting). This is the
+            real gross price of the product (see get_price_gross).
 
         - short_description
             The short description of the product. This is used within overviews.
@@ -430,7 +518,7 @@ class Product(models.Model):
     slug = models.SlugField(_(u"Slug"), unique=True, max_length=80)
     sku = models.CharField(_(u"SKU"), blank=True, max_length=30)
     price = models.FloatField(_(u"Price"), default=0.0)
-    effective_price = models.FloatField(_(u"Price"), blank=True)
+    effective_price = models.FloatField(_(u"Price"), blank=True, db_index=True)
     short_description = models.TextField(_(u"Short description"), blank=True)
     description = models.TextField(_(u"Description"), blank=True)
     images = generic.GenericRelation("Image", verbose_name=_(u"Images"),
@@ -500,19 +588,48 @@ class Product(models.Model):
     class Meta:
         ordering = ("name", )
 
+    def __init__(self, *args, **kwargs):
+        super(Product, self).__init__(*args, **kwargs)
+        # The stock amount the product has been loaded with (see save)
+        self._stock_amount = self.stock_amount
+
     def __unicode__(self):
         return "%s (%s)" % (self.name, self.slug)
 
     def save(self, force_insert=False, force_update=False):
-        """Overwritten to save effective_price
-        use.
-        """
-        if self.for_sale:
-            self.effective_price = self.for_sale_price
+        """Overwritten to save effective_price. This takes care of sale prices,
+        default variants and prices which are inherited from the parent.
+
+        The stock amount is changed concurrently within the database (see
+        lfs.catalog.stock), hence just the change of this instance is added
+        to the current stock amount. A product which has been loaded before
+        doesn't put back its stock amount.
+        """
+        if self.id is not None:
+            from lfs.catalog import stock
+            stock_amount = stock.lock_stock_amount(self.id)
+            if stock_amount is not None:
+                self.stock_amount = stock_amount + self.stock_amount - \
+                    getattr(self, "_stock_amount", self.stock_amount)
+
+        if self.id is None and not self.is_variant():
+            # A new product has no variants yet
+            if self.for_sale:
+                self.effective_price = self.for_sale_price
+            else:
+                self.effective_price = self.price
         else:
-            self.effective_price = self.price
+            self.effective_price = self.get_price_gross()
 
         super(Product, self).save()
+        self._stock_amount = self.stock_amount
+
+        # The effective prices of the parent resp. the variants could depend
+        # on this product. The filter indexes of the product itself are
+        # updated by the post_save listener (see lfs.caching.listeners).
+        if lfs.catalog.prices.update_effective_prices(self):
+            lfs.catalog.index.update_filter_index(self)
+            product_changed.send(self)
 
     def get_absolute_url(self):
         """Returns the absolute url of the product.
@@ -528,11 +645,17 @@ class Product(models.Model):
 
     def decrease_stock_amount(self, amount):
         """If the stock amount is managed by LFS, it decreases stock amount by
-        given amount.
+        given amount. This takes place within the database, hence concurrent
+        changes are not lost (see lfs.catalog.stock). The transaction is left
+        to the caller.
         """
         if self.manage_stock_amount:
-            self.stock_amount -= amount
-        self.save()
+            from lfs.catalog import stock
+            stock.decrease_stock_amounts({self.id : amount})
+            stock.update_stock_cache([self.id])
+            self.stock_amount = Product.objects.filter(pk=self.id).values_list(
+                "stock_amount", flat=True)[0]
+            self._stock_amount = self.stock_amount
 
     def get_accessories(self):
         """Returns the ProductAccessories relationship objects - not the
@@ -560,8 +683,12 @@ class Product(models.Model):
     def get_categories(self, with_parents=False):
         """Returns the categories of the product.
         """
+        from lfs.caching.settings import CATEGORIES_NAMESPACE
+        from lfs.caching.utils import get_cache
+        from lfs.caching.utils import set_cache
+
         cache_key = "product-categories-%s-%s" % (self.id, with_parents)
-        categories = cache.get(cache_key)
+        categories = get_cache(cache_key, [CATEGORIES_NAMESPACE])
 
         if categories is not None:
             return categories
@@ -581,7 +708,7 @@ class Product(models.Model):
         else:
             categories = object.categories.all()
 
-        cache.set(cache_key, categories)
+        set_cache(cache_key, categories, [CATEGORIES_NAMESPACE])
         return categories
 
     def get_category(self):
@@ -647,8 +774,13 @@ class Product(models.Model):
     def get_images(self):
         """Returns all images of the product, including the main image.
         """
+        from lfs.caching.settings import PRODUCT_NAMESPACE
+        from lfs.caching.utils import get_cache
+        from lfs.caching.utils import set_cache
+
         cache_key = "product-images-%s" % self.id
-        images = cache.get(cache_key)
+        namespaces = [PRODUCT_NAMESPACE % (self.parent_id or self.id)]
+        images = get_cache(cache_key, namespaces)
 
         if images is None:
             images = []
@@ -658,7 +790,7 @@ class Product(models.Model):
                 object = self
 
             images = object.images.all()
-            cache.set(cache_key, images)
+            set_cache(cache_key, images, namespaces)
 
         return images
 
@@ -801,8 +933,8 @@ class Product(models.Model):
         """
         object = self
 
-        if object.is_product_with_variants() and object.get_default_variant():
-            object = object.get_default_variant()
+        if object.is_product_with_variants():
+            object = object.get_default_variant() or object
 
         if object.get_for_sale():
             if object.is_variant() and not object.active_for_sale_price:
@@ -880,8 +1012,13 @@ class Product(models.Model):
     def get_related_products(self):
         """Returns the related products of the product.
         """
+        from lfs.caching.settings import PRODUCT_NAMESPACE
+        from lfs.caching.utils import get_cache
+        from lfs.caching.utils import set_cache
+
         cache_key = "related-products-%s" % self.id
-        related_products = cache.get(cache_key)
+        namespaces = [PRODUCT_NAMESPACE % (self.parent_id or self.id)]
+        related_products = get_cache(cache_key, namespaces)
 
         if related_products is None:
 
@@ -892,7 +1029,7 @@ class Product(models.Model):
                 related_products = self.related_products.exclude(
                     sub_type=PRODUCT_WITH_VARIANTS)
 
-            cache.set(cache_key, related_products)
+            set_cache(cache_key, related_products, namespaces)
 
         return related_products
 
@@ -935,16 +1072,51 @@ class Product(models.Model):
         """
         options.sort()
         options = "".join(options)
-        for variant in self.variants.filter(active=True):
-            temp = variant.property_values.all()
-            temp = ["%s|%s" % (x.property.id, x.value) for x in temp]
-            temp.sort()
-            temp = "".join(temp)
 
-            if temp == options:
-                return variant
+        variant_id = self.get_variant_lookup().get(options)
+        if variant_id is None:
+            return None
 
-        return None
+        try:
+            return Product.objects.get(pk=variant_id)
+        except Product.DoesNotExist:
+            return None
+
+    def get_variant_lookup(self):
+        """Returns the ids of the active variants by their options as
+        dictionary: option string -> variant id. The option string consists
+        of the sorted "property.id|option.id" pairs of the variant (see
+        get_variant).
+
+        This is calculated with two queries and invalidated together with the
+        product, its variants and their property values.
+        """
+        from lfs.caching.settings import PRODUCT_NAMESPACE
+        from lfs.caching.utils import get_cache
+        from lfs.caching.utils import set_cache
+
+        cache_key = "variant-lookup-%s" % self.id
+        namespaces = [PRODUCT_NAMESPACE % self.id]
+        lookup = get_cache(cache_key, namespaces)
+        if lookup is not None:
+            return lookup
+
+        variant_ids = self.variants.filter(active=True).values_list("id", flat=True)
+
+        options = {}
+        for product_id, property_id, value in ProductPropertyValue.objects.filter(
+            product__parent=self, product__active=True).values_list("product", "property", "value"):
+            options.setdefault(product_id, []).append("%s|%s" % (property_id, value))
+
+        lookup = {}
+        for variant_id in variant_ids:
+            temp = options.get(variant_id, [])
+            temp.sort()
+            # The first variant wins if several have the same options
+            lookup.setdefault("".join(temp), variant_id)
+
+        set_cache(cache_key, lookup, namespaces)
+        return lookup
 
     def has_variant(self, options):
         """Returns true if a variant with given options already exists.
@@ -1319,6 +1491,29 @@ class ProductPropertyValue(models.Model):
 
         super(ProductPropertyValue, self).save(force_insert, force_update)
 
+class VariantsJob(models.Model):
+    """A request to create variants, which is processed in the background (see
+    lfs.catalog.variants).
+
+    Attributes:
+        - product
+          The product for which the variants are created.
+        - properties
+          The requested property options as JSON (see
+          lfs.catalog.variants.create_variants).
+        - price
+          The price of the variants.
+        - creation_date
+          The date the job has been added.
+    """
+    product = models.ForeignKey(Product, verbose_name=_(u"Product"), related_name="variants_jobs")
+    properties = models.TextField(_(u"Properties"))
+    price = models.FloatField(_(u"Price"), default=0.0)
+    creation_date = models.DateTimeField(_(u"Creation date"), auto_now_add=True)
+
+    class Meta:
+        ordering = ("creation_date", "id")
+
 class Image(models.Model):
     """An image with a title and several sizes. Can be part of a product or
     category.
@@ -0,0 +1,197 @@
+"""Provides the price records of products.
+
+A price record contains all prices of a product as they are returned by the
+price methods of the product (get_price_gross, get_price_net, get_tax, ...),
+but it is calculated for a whole list of products at once: the parents,
+default variants and taxes of all products are loaded with one query each.
+
+The records are cached per product and are invalidated together with the
+product (and its parent resp. variants) or if any tax has been changed.
+
+A price record is a dictionary with following keys:
+
+    - price_gross
+    - price_net
+    - tax
+    - tax_rate
+    - for_sale
+    - for_sale_price
+    - standard_price
+
+The gross price is also stored as effective price of every product, hence
+products can be sorted and filtered by their real price within the database.
+"""
+# lfs imports
+import lfs.catalog.models
+import lfs.catalog.utils
+from lfs.catalog.settings import ACTIVE_FOR_SALE_STANDARD
+from lfs.catalog.settings import ACTIVE_FOR_SALE_YES
+from lfs.tax.models import Tax
+
+# The amount of products which are loaded at once by set_effective_prices.
+CHUNK_SIZE = 500
+
+def get_price_record(product):
+    """Returns the price record of the given product.
+    """
+    return get_price_records([product])[product.id]
+
+def get_price_records(products):
+    """Returns the price records of the given products as dictionary: product
+    id -> price record.
+    """
+    from lfs.caching.settings import PRODUCT_NAMESPACE
+    from lfs.caching.settings import TAX_NAMESPACE
+    from lfs.caching.utils import get_many_cache
+    from lfs.caching.utils import set_many_cache
+
+    keys = {}
+    for product in products:
+        namespaces = [PRODUCT_NAMESPACE % (product.parent_id or product.id), TAX_NAMESPACE]
+        keys[product.id] = ("price-record-%s" % product.id, namespaces)
+
+    cached = get_many_cache(keys.values())
+
+    records = {}
+    missing = []
+    for product in products:
+        record = cached.get(keys[product.id][0])
+        if record is None:
+            missing.append(product)
+        else:
+            records[product.id] = record
+
+    if missing:
+        values = []
+        for product_id, record in _calculate_price_records(missing).items():
+            key, namespaces = keys[product_id]
+            values.append((key, namespaces, record))
+            records[product_id] = record
+        set_many_cache(values)
+
+    return records
+
+def update_effective_prices(product):
+    """Updates the effective prices of the products which depend on the given
+    (saved or deleted) product: the parent of a variant (its price is the
+    price of its default variant) resp. a product with variants and its
+    variants (they could inherit prices from it).
+
+    Returns True if an effective price has been changed.
+    """
+    if product.is_variant():
+        try:
+            products = [product.parent]
+        except lfs.catalog.models.Product.DoesNotExist:
+            return False
+    elif product.is_product_with_variants():
+        products = [product]
+        products.extend(product.variants.all())
+    else:
+        return False
+
+    return _set_effective_prices(products)
+
+def set_effective_prices():
+    """Calculates the effective prices of all products. This is just needed
+    if prices have been changed without Product.save, which keeps them current.
+    """
+    ids = lfs.catalog.models.Product.objects.values_list("id", flat=True)
+    ids = list(ids)
+    for i in range(0, len(ids), CHUNK_SIZE):
+        products = lfs.catalog.models.Product.objects.in_bulk(ids[i:i+CHUNK_SIZE])
+        _set_effective_prices(products.values())
+
+def _set_effective_prices(products):
+    """Saves the current gross prices of the given products as their effective
+    prices. Returns True if one of them has been changed.
+    """
+    changed = False
+    records = _calculate_price_records(products)
+    for product in products:
+        price = records[product.id]["price_gross"]
+        if product.effective_price != price:
+            # Saving the product would call this again.
+            lfs.catalog.models.Product.objects.filter(pk=product.id).update(
+                effective_price=price)
+            product.effective_price = price
+            changed = True
+    return changed
+
+def _calculate_price_records(products):
+    """Calculates the price records of the given products.
+    """
+    loaded = {}
+    for product in products:
+        loaded[product.id] = product
+
+    # Parents of variants
+    parent_ids = [p.parent_id for p in products
+                  if p.is_variant() and p.parent_id not in loaded]
+    if parent_ids:
+        loaded.update(lfs.catalog.models.Product.objects.in_bulk(parent_ids))
+
+    # Default variants of the products with variants and of the parents of
+    # variants (the parent's sale price is taken from its default variant).
+    with_variants = [p for p in loaded.values() if p.is_product_with_variants()]
+    default_variants = lfs.catalog.utils.load_default_variants(with_variants)
+
+    # Taxes
+    tax_ids = [p.tax_id for p in loaded.values() if p.tax_id]
+    taxes = Tax.objects.in_bulk(tax_ids)
+
+    def _get_parent(product):
+        return loaded.get(product.parent_id) or product.parent
+
+    def _get_for_sale(product):
+        if product.is_variant():
+            if product.active_for_sale == ACTIVE_FOR_SALE_STANDARD:
+                return _get_parent(product).for_sale
+            return product.active_for_sale == ACTIVE_FOR_SALE_YES
+        return product.for_sale
+
+    def _get_for_sale_price(product):
+        product = default_variants.get(product.id, product)
+        if product.is_variant() and not product.active_for_sale_price:
+            product = _get_parent(product)
+        return product.for_sale_price
+
+    def _get_tax_rate(product):
+        if product.is_variant():
+            product = _get_parent(product)
+        tax = taxes.get(product.tax_id)
+        if tax is None:
+            return 0.0
+        return tax.rate
+
+    records = {}
+    for product in products:
+        object = default_variants.get(product.id, product)
+
+        if object.is_variant() and not object.active_price:
+            standard_price = _get_parent(object).price
+        else:
+            standard_price = object.price
+
+        if _get_for_sale(object):
+            if object.is_variant() and not object.active_for_sale_price:
+                price_gross = _get_for_sale_price(_get_parent(object))
+            else:
+                price_gross = _get_for_sale_price(object)
+        else:
+            price_gross = standard_price
+
+        tax_rate = _get_tax_rate(product)
+        tax = (tax_rate/(tax_rate+100)) * price_gross
+
+        records[product.id] = {
+            "price_gross" : price_gross,
+            "price_net" : price_gross - tax,
+            "tax" : tax,
+            "tax_rate" : tax_rate,
+            "for_sale" : _get_for_sale(product),
+            "for_sale_price" : _get_for_sale_price(product),
+            "standard_price" : standard_price,
+        }
+
+    return records
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 
 ACTIVE_FOR_SALE_STANDARD = 0
@@ -83,4 +84,22 @@ PROPERTY_STEP_TYPE_CHOICES = (
     (PROPERTY_STEP_TYPE_AUTOMATIC,    _(u"Automatic")),
     (PROPERTY_STEP_TYPE_FIXED_STEP,   _(u"Fixed step")),
     (PROPERTY_STEP_TYPE_MANUAL_STEPS, _(u"Manual steps")),
-)
\ No newline at end of file
+)
+
+# The maximal amount of cached product pages (start/sorting/filter
+# combinations) per category. The oldest ones are deleted.
+CATEGORY_PRODUCTS_CACHE_ENTRIES = getattr(settings, "LFS_CATEGORY_PRODUCTS_CACHE_ENTRIES", 100)
+
+# If True products with managed stock amount can't be sold beyond their stock
+# amount (see lfs.catalog.stock).
+CHECK_STOCK_AMOUNT = getattr(settings, "LFS_CHECK_STOCK_AMOUNT", False)
+
+# The minutes a product is reserved for a cart after it has been added. 0
+# means the products are not reserved. This takes just effect if the stock
+# amount is checked.
+STOCK_RESERVATION_TIME = getattr(settings, "LFS_STOCK_RESERVATION_TIME", 0)
+
+# Variants are created in the background (see the management command
+# create_variants) if more than this amount of combinations is requested
+# at once. None means they are always created within the request.
+VARIANTS_BACKGROUND_THRESHOLD = getattr(settings, "LFS_VARIANTS_BACKGROUND_THRESHOLD", 1000)
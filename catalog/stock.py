@@ -0,0 +1,218 @@
+"""Provides the stock amounts of products.
+
+The stock amount is only changed with conditional UPDATE statements within
+the database, hence concurrent requests (of any process) can't overwrite each
+other's changes:
+
+    UPDATE catalog_product SET stock_amount = stock_amount - n
+    WHERE id = x AND stock_amount - n >= 0
+
+Saving a product doesn't write back the stock amount it has been loaded with:
+just the change of the instance is added to the current stock amount, which
+is locked for this (see lock_stock_amount and Product.save).
+
+If the stock amount is checked (see lfs.catalog.settings.CHECK_STOCK_AMOUNT)
+products with managed stock amount can't be sold beyond their stock amount.
+If additionally a reservation time is set (STOCK_RESERVATION_TIME), products
+are reserved as soon as they are added to a cart: the reserved amount is
+subtracted from the stock amount at once and given back if the product is
+removed from the cart, the cart is deleted or the reservation has been
+expired (see release_expired). An order consumes the reservations of its
+cart.
+"""
+# python imports
+import datetime
+
+# django imports
+from django.db import connection
+from django.db import transaction
+
+# lfs imports
+from lfs.cart.models import StockReservation
+from lfs.catalog.models import Product
+from lfs.catalog.settings import CHECK_STOCK_AMOUNT
+from lfs.catalog.settings import STOCK_RESERVATION_TIME
+
+class OutOfStock(Exception):
+    """Raised if products are not on stock anymore.
+    """
+    def __init__(self, product_ids):
+        Exception.__init__(self, "Products are not on stock: %s" % product_ids)
+        self.product_ids = product_ids
+
+def reserve(cart, product, amount):
+    """Reserves the given amount of the given product for the given cart. The
+    amount is the whole amount of the product within the cart, hence an
+    existing reservation is adjusted.
+
+    Returns False if the product is not on stock. In this case nothing is
+    changed.
+    """
+    if not CHECK_STOCK_AMOUNT or not STOCK_RESERVATION_TIME or \
+       not product.manage_stock_amount:
+        return True
+
+    release_expired()
+    changed, reserved = _reserve(cart, product, amount)
+    if changed:
+        update_stock_cache([product.id])
+    return reserved
+
+def release(cart, product=None):
+    """Gives back the reserved amounts of the given cart, optionally just of
+    the given product. Both can also be passed as ids.
+    """
+    if not CHECK_STOCK_AMOUNT or not STOCK_RESERVATION_TIME:
+        return
+
+    reservations = StockReservation.objects.filter(cart=cart)
+    if product is not None:
+        reservations = reservations.filter(product=product)
+    update_stock_cache(_release(reservations))
+
+def release_expired():
+    """Gives back the reserved amounts of all expired reservations.
+    """
+    reservations = StockReservation.objects.filter(
+        expiration_date__lt=datetime.datetime.now())
+    update_stock_cache(_release(reservations))
+
+def decrease_stock_amounts(amounts, cart=None):
+    """Decreases the stock amounts of products. amounts is a dictionary:
+    product id -> amount. The reservations of the given cart are consumed.
+
+    Raises OutOfStock if the stock amount is checked and a product is not on
+    stock anymore. This must be called within a transaction, which is rolled
+    back in this case. The cached values of the products are not invalidated
+    (see update_stock_cache).
+    """
+    reserved = {}
+    if cart is not None:
+        reservations = StockReservation.objects.filter(
+            cart=cart, product__in=amounts.keys())
+        for id, product_id, amount in reservations.values_list("id", "product", "amount"):
+            if _delete_reservation(id):
+                reserved[product_id] = amount
+
+    changes = {}
+    for product_id, amount in amounts.items():
+        amount -= reserved.get(product_id, 0)
+        if amount:
+            changes[product_id] = -amount
+
+    if changes:
+        changed = _change_stock_amounts(changes, CHECK_STOCK_AMOUNT)
+        if CHECK_STOCK_AMOUNT and changed < len(changes):
+            raise OutOfStock(_get_missing(changes))
+
+def lock_stock_amount(product_id):
+    """Locks the stock amount of the product with given id until the end of
+    the current transaction and returns it. Returns None if there is no such
+    product.
+    """
+    table = Product._meta.db_table
+    cursor = connection.cursor()
+    cursor.execute("UPDATE %s SET stock_amount = stock_amount WHERE id = %%s" % table, [product_id])
+    cursor.execute("SELECT stock_amount FROM %s WHERE id = %%s" % table, [product_id])
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return row[0]
+
+def update_stock_cache(product_ids):
+    """Invalidates the cached values of the products with given ids after
+    their stock amounts have been changed.
+    """
+    from lfs.caching.listeners import update_product_namespaces
+    if product_ids:
+        for product in Product.objects.filter(pk__in=product_ids):
+            update_product_namespaces(product)
+
+def _reserve(cart, product, amount):
+    """Adjusts the reservation of the given product for the given cart.
+    Returns a tuple: (stock amount changed, reserved).
+    """
+    try:
+        reservation = StockReservation.objects.get(cart=cart, product=product)
+    except StockReservation.DoesNotExist:
+        reservation = StockReservation(cart=cart, product=product, amount=0)
+
+    difference = amount - reservation.amount
+    if difference > 0:
+        if not _change_stock_amount(product.id, -difference, True):
+            return False, False
+    elif difference < 0:
+        _change_stock_amount(product.id, -difference)
+
+    if amount > 0:
+        reservation.amount = amount
+        reservation.expiration_date = datetime.datetime.now() + \
+            datetime.timedelta(minutes=STOCK_RESERVATION_TIME)
+        reservation.save()
+    elif reservation.id is not None:
+        reservation.delete()
+
+    return difference != 0, True
+_reserve = transaction.commit_on_success(_reserve)
+
+def _release(reservations):
+    """Gives back the amounts of the given reservations. Returns the ids of
+    the changed products.
+    """
+    product_ids = []
+    for id, product_id, amount in reservations.values_list("id", "product", "amount"):
+        # Just the process which deletes the reservation gives it back.
+        if _delete_reservation(id):
+            _change_stock_amount(product_id, amount)
+            product_ids.append(product_id)
+    return product_ids
+_release = transaction.commit_on_success(_release)
+
+def _delete_reservation(id):
+    """Deletes the reservation with given id. Returns False if it has been
+    deleted already.
+    """
+    cursor = connection.cursor()
+    cursor.execute("DELETE FROM %s WHERE id = %%s" % StockReservation._meta.db_table, [id])
+    return cursor.rowcount > 0
+
+def _change_stock_amount(product_id, amount, check=False):
+    """Adds the given (negative) amount to the stock amount of the product
+    with given id. If check is True the stock amount doesn't become negative.
+    Returns False if the stock amount has not been changed.
+    """
+    return _change_stock_amounts({product_id : amount}, check) > 0
+
+def _change_stock_amounts(amounts, check=False):
+    """Adds the given (negative) amounts to the stock amounts of the products
+    with one statement. amounts is a dictionary: product id -> amount. If
+    check is True stock amounts aren't decreased below zero, these products
+    are left unchanged. Returns the number of changed products.
+    """
+    cases = []
+    case_params = []
+    for product_id, amount in amounts.items():
+        cases.append("WHEN %s THEN %s")
+        case_params.extend([product_id, amount])
+    case = "CASE id %s END" % " ".join(cases)
+
+    sql = "UPDATE %s SET stock_amount = stock_amount + %s WHERE id IN (%s)" % (
+        Product._meta.db_table, case, ", ".join(["%s"] * len(amounts)))
+    params = case_params + amounts.keys()
+    if check:
+        sql += " AND (stock_amount + %s >= 0 OR %s >= 0)" % (case, case)
+        params += case_params * 2
+
+    cursor = connection.cursor()
+    cursor.execute(sql, params)
+    return cursor.rowcount
+
+def _get_missing(amounts):
+    """Returns the ids of the products whose stock amounts don't cover the
+    given (negative) amounts (see _change_stock_amounts). As the products
+    which could be decreased have been changed already this is for
+    information only.
+    """
+    products = Product.objects.filter(pk__in=amounts.keys())
+    return [id for id, stock_amount in products.values_list("id", "stock_amount")
+            if amounts[id] < 0 and stock_amount + amounts[id] < 0]
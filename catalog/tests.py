@@ -1,10 +1,22 @@
 # django imports
 from django.contrib.sessions.backends.file import SessionStore
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.test import TestCase
 
 # lfs imports
+import lfs.catalog.index
+import lfs.catalog.prices
+import lfs.catalog.tree
 import lfs.catalog.utils
+import lfs.catalog.variants
+import lfs.catalog.views
+from lfs.caching.settings import CATEGORY_NAMESPACE
+from lfs.caching.settings import CATEGORY_PRODUCTS_NAMESPACE
+from lfs.caching.utils import get_cache
+from lfs.caching.utils import get_cache_statistics
+from lfs.caching.utils import reset_cache_statistics
+from lfs.caching.utils import set_cache
 from lfs.core.signals import property_type_changed
 from lfs.catalog.settings import ACTIVE_FOR_SALE_YES
 from lfs.catalog.settings import ACTIVE_FOR_SALE_STANDARD
@@ -84,6 +96,42 @@ class PriceFilterTestCase(TestCase):
         self.assertEqual(result["items"][2]["max"], 300)
         self.assertEqual(result["items"][2]["quantity"], 1)
 
+    def test_get_filtered_product_ids(self):
+        """Tests the filtering and sorting of products out of the filter index.
+        """
+        ids = lfs.catalog.utils.get_filtered_product_ids_for_category(self.c1, [], None, "-price")
+        self.assertEqual(ids, [self.p1.id, self.p2.id, self.p3.id])
+
+        price_filter = {"min" : "2", "max" : "5"}
+        ids = lfs.catalog.utils.get_filtered_product_ids_for_category(self.c1, [], price_filter, "price")
+        self.assertEqual(ids, [self.p2.id, self.p1.id])
+
+    def test_get_products_page(self):
+        """Tests the calculation of a page of products.
+        """
+        products, amount = lfs.catalog.utils.get_products_page_for_category(self.c1, [], None, "-price", 0, 2)
+        self.assertEqual(products, [self.p1, self.p2])
+        self.assertEqual(amount, 3)
+
+        products, amount = lfs.catalog.utils.get_products_page_for_category(self.c1, [], None, "-price", 2, 2)
+        self.assertEqual(products, [self.p3])
+        self.assertEqual(amount, 3)
+
+        # Products with variants are replaced by their default variant
+        self.p2.sub_type = PRODUCT_WITH_VARIANTS
+        self.p2.save()
+        v1 = Product.objects.create(name="Variant 1", slug="variant-1", sub_type=VARIANT, parent=self.p2, active=True)
+        v2 = Product.objects.create(name="Variant 2", slug="variant-2", sub_type=VARIANT, parent=self.p2, active=True)
+
+        products, amount = lfs.catalog.utils.get_products_page_for_category(self.c1, [], None, "-price", 0, 2)
+        self.assertEqual(products, [self.p1, v1])
+
+        self.p2.default_variant = v2
+        self.p2.save()
+
+        products, amount = lfs.catalog.utils.get_products_page_for_category(self.c1, [], None, "-price", 0, 2)
+        self.assertEqual(products, [self.p1, v2])
+
 class PropertiesTestCase(TestCase):
     """
     """
@@ -557,6 +605,67 @@ class PropertiesTestCase(TestCase):
         self.assertEqual(len(products), 1)
         self.assertEqual(products[0].id, self.p3.id)
 
+    def test_get_product_filters(self):
+        """Tests the calculation of the product filters out of the filter index.
+        """
+        f = lfs.catalog.utils.get_product_filters(self.c1, [], None, None)
+        filters = dict([(pf["id"], pf) for pf in f])
+        self.assertEqual(len(filters), 3)
+
+        items = [(i["value"], i["quantity"]) for i in filters[self.pp1.id]["items"]]
+        self.assertEqual(items, [("M", 1), ("S", 2)])
+
+        items = [(i["value"], i["name"], i["quantity"]) for i in filters[self.pp2.id]["items"]]
+        self.assertEqual(items, [("1", "Red", 1), ("2", "Blue", 1)])
+
+        items = [(i["min"], i["max"], i["quantity"]) for i in filters[self.pp3.id]["items"]]
+        self.assertEqual(items, [(1, 10, 1), (11, 20, 1)])
+
+    def test_filter_index(self):
+        """Tests the update of the filter index.
+        """
+        index = lfs.catalog.index.get_filter_index(self.c1)
+        self.assertEqual(set(index["products"]), set([self.p1.id, self.p2.id, self.p3.id]))
+        self.assertEqual(index["parent_values"][self.pp2.id]["2"], set([self.p2.id]))
+
+        ppv = ProductPropertyValue.objects.create(product=self.p3, property=self.pp2, value="2")
+        index = lfs.catalog.index.get_filter_index(self.c1)
+        self.assertEqual(index["parent_values"][self.pp2.id]["2"], set([self.p2.id, self.p3.id]))
+
+        ppv.delete()
+        index = lfs.catalog.index.get_filter_index(self.c1)
+        self.assertEqual(index["parent_values"][self.pp2.id]["2"], set([self.p2.id]))
+
+        self.p3.active = False
+        self.p3.save()
+        index = lfs.catalog.index.get_filter_index(self.c1)
+        self.assertEqual(set(index["products"]), set([self.p1.id, self.p2.id]))
+
+        self.p2.delete()
+        index = lfs.catalog.index.get_filter_index(self.c1)
+        self.assertEqual(set(index["products"]), set([self.p1.id]))
+        self.failIf("2" in index["parent_values"][self.pp2.id])
+
+    def test_filter_index_version(self):
+        """Tests that an index which has been built before a change of its
+        products is not used.
+        """
+        from lfs.caching.utils import get_cache_key
+
+        # A process takes the key and builds the index ...
+        cache_key = get_cache_key("category-filter-index",
+            lfs.catalog.index._get_namespaces(self.c1))
+        index = lfs.catalog.index.build_filter_index(self.c1)
+        self.assertEqual(len(index["products"]), 3)
+
+        # ... while another one changes a product.
+        self.p3.active = False
+        self.p3.save()
+        cache.add(cache_key, index)
+
+        index = lfs.catalog.index.get_filter_index(self.c1)
+        self.assertEqual(set(index["products"]), set([self.p1.id, self.p2.id]))
+
 class PropertiesTestCaseWithoutProperties(TestCase):
     """Test the filter methods without added properties.
     """
@@ -603,6 +712,44 @@ class CategoryTestCase(TestCase):
         self.c12.products = [self.p2, self.p3]
         self.c12.save()
 
+    def test_namespaces(self):
+        """Tests that saving a category invalidates just the cached values
+        which depend on it.
+        """
+        set_cache("test-c1", 1, [CATEGORY_NAMESPACE % self.c1.id])
+        set_cache("test-c111", 111, [CATEGORY_NAMESPACE % self.c111.id])
+        set_cache("test-c12", 12, [CATEGORY_NAMESPACE % self.c12.id])
+
+        self.c111.name = "Category 111 changed"
+        self.c111.save()
+
+        # The category itself and its parents are invalidated ...
+        self.assertEqual(get_cache("test-c111", [CATEGORY_NAMESPACE % self.c111.id]), None)
+        self.assertEqual(get_cache("test-c1", [CATEGORY_NAMESPACE % self.c1.id]), None)
+
+        # ... but not the other ones
+        self.assertEqual(get_cache("test-c12", [CATEGORY_NAMESPACE % self.c12.id]), 12)
+
+        # Saving a product invalidates the product listings of its categories
+        set_cache("test-products-c12", 12, [CATEGORY_PRODUCTS_NAMESPACE % self.c12.id])
+        set_cache("test-products-c111", 111, [CATEGORY_PRODUCTS_NAMESPACE % self.c111.id])
+
+        self.p3.save()
+        self.assertEqual(get_cache("test-products-c12", [CATEGORY_PRODUCTS_NAMESPACE % self.c12.id]), None)
+        self.assertEqual(get_cache("test-products-c111", [CATEGORY_PRODUCTS_NAMESPACE % self.c111.id]), 111)
+
+    def test_cache_statistics(self):
+        """Tests the hits and misses per namespace.
+        """
+        reset_cache_statistics()
+
+        self.assertEqual(get_cache("test-c1", [CATEGORY_NAMESPACE % self.c1.id]), None)
+        set_cache("test-c1", 1, [CATEGORY_NAMESPACE % self.c1.id])
+        self.assertEqual(get_cache("test-c1", [CATEGORY_NAMESPACE % self.c1.id]), 1)
+
+        statistics = get_cache_statistics()
+        self.assertEqual(statistics["category"], {"hits" : 1, "misses" : 1})
+
     def test_meta_keywords(self):
         """
         """
@@ -708,6 +855,59 @@ class CategoryTestCase(TestCase):
         self.assertEqual(len(product_ids), 2)
         self.assertEqual(product_ids, [2, 3])
 
+    def test_get_all_products_without_path(self):
+        """Tests that a category without path (e.g. loaded via loaddata)
+        doesn't display all products of the shop.
+        """
+        Category.objects.filter(pk=self.c12.id).update(path="", show_all_products=True)
+        c12 = Category.objects.get(pk=self.c12.id)
+
+        product_ids = [p.id for p in c12.get_all_products()]
+        self.assertEqual(product_ids, [2, 3])
+
+        index = lfs.catalog.index.build_filter_index(c12)
+        self.assertEqual(set(index["products"]), set([2, 3]))
+
+    def test_path(self):
+        """Tests the materialized path of the categories.
+        """
+        self.assertEqual(self.c1.path, "/%s/" % self.c1.id)
+        self.assertEqual(self.c111.path, "/%s/%s/%s/" % (self.c1.id, self.c11.id, self.c111.id))
+        self.assertEqual(self.c111.level, 3)
+
+        self.assertEqual(self.c111.get_parents(), [self.c11, self.c1])
+        self.assertEqual(self.c1.get_all_children(), [self.c11, self.c111, self.c12])
+
+        # Move category 11 (and with it category 111) below category 12
+        self.c11.parent = self.c12
+        self.c11.save()
+
+        c111 = Category.objects.get(pk=self.c111.id)
+        self.assertEqual(c111.path, "/%s/%s/%s/%s/" % (self.c1.id, self.c12.id, self.c11.id, self.c111.id))
+        self.assertEqual(c111.level, 4)
+        self.assertEqual(c111.get_parents(), [self.c11, self.c12, self.c1])
+
+    def test_tree_snapshot(self):
+        """Tests the process-local category tree snapshot.
+        """
+        snapshot = lfs.catalog.tree.get_category_tree_snapshot()
+        self.assertEqual([c.id for c in snapshot.get_children()], [self.c1.id])
+        self.assertEqual([c.id for c in snapshot.get_children(self.c1.id)], [self.c11.id, self.c12.id])
+        self.assertEqual(snapshot.get_node(self.c111.id).level, 3)
+
+        # The nodes just provide the attributes of the snapshot
+        node = snapshot.get_node(self.c111.id)
+        self.assertRaises(AttributeError, getattr, node, "show_all_products")
+
+        # The snapshot is shared as long as no category has been changed
+        self.failUnless(snapshot is lfs.catalog.tree.get_category_tree_snapshot())
+
+        self.c12.name = "Category 12 changed"
+        self.c12.save()
+
+        snapshot = lfs.catalog.tree.get_category_tree_snapshot()
+        self.assertEqual(snapshot.get_node(self.c12.id).name, "Category 12 changed")
+
 class ViewsTestCase(TestCase):
     """Tests the views of the lfs.catalog.
     """
@@ -728,6 +928,26 @@ class ViewsTestCase(TestCase):
         self.v1 = Product.objects.create(name="Variant 1", slug="variant-1", sub_type=VARIANT, parent=self.p1, active=True)
         ProductPropertyValue.objects.create(product=self.v1, property=color, value=str(red.id))
 
+    def test_category_products_entries(self):
+        """Tests that just the most recently rendered product pages are cached.
+        """
+        namespaces = [CATEGORY_PRODUCTS_NAMESPACE % self.c1.id]
+        for key in ("page-1", "page-2"):
+            set_cache(key, key, namespaces)
+            lfs.catalog.views._add_category_products_entry(self.c1, key, namespaces)
+
+        old_entries = lfs.catalog.views.CATEGORY_PRODUCTS_CACHE_ENTRIES
+        lfs.catalog.views.CATEGORY_PRODUCTS_CACHE_ENTRIES = 2
+        try:
+            set_cache("page-3", "page-3", namespaces)
+            lfs.catalog.views._add_category_products_entry(self.c1, "page-3", namespaces)
+        finally:
+            lfs.catalog.views.CATEGORY_PRODUCTS_CACHE_ENTRIES = old_entries
+
+        self.assertEqual(get_cache("page-1", namespaces), None)
+        self.assertEqual(get_cache("page-2", namespaces), "page-2")
+        self.assertEqual(get_cache("page-3", namespaces), "page-3")
+
     def test_set_sorting(self):
         """Tests setting and deleting of the sorting session.
         """
@@ -1275,6 +1495,87 @@ class ProductTestCase(TestCase):
         # still 1 in the stock.
         self.assertEqual(self.p1.stock_amount, 1)
 
+    def test_save_stock_amount(self):
+        """Tests that saving a product doesn't put back the stock amount it
+        has been loaded with.
+        """
+        product = Product.objects.get(pk=self.p1.id)
+
+        # The stock amount is decreased concurrently
+        self.p1.decrease_stock_amount(1)
+
+        product.name = "Product 1 changed"
+        product.save()
+        self.assertEqual(Product.objects.get(pk=self.p1.id).stock_amount, 1)
+
+        # Just the change of the stock amount is added
+        product.stock_amount += 5
+        product.save()
+        self.assertEqual(product.stock_amount, 6)
+        self.assertEqual(Product.objects.get(pk=self.p1.id).stock_amount, 6)
+
+    def test_decrease_stock_amounts(self):
+        """Tests the decreasing of the stock amounts of several products.
+        """
+        import lfs.catalog.stock
+
+        p2 = Product.objects.get(pk=self.p2.id)
+        p2.stock_amount = 1
+        p2.save()
+
+        lfs.catalog.stock.decrease_stock_amounts({self.p1.id : 1, p2.id : 1})
+        self.assertEqual(Product.objects.get(pk=self.p1.id).stock_amount, 1)
+        self.assertEqual(Product.objects.get(pk=p2.id).stock_amount, 0)
+
+        lfs.catalog.stock.CHECK_STOCK_AMOUNT = True
+        try:
+            try:
+                lfs.catalog.stock.decrease_stock_amounts({self.p1.id : 1, p2.id : 1})
+            except lfs.catalog.stock.OutOfStock, e:
+                self.failUnless(p2.id in e.product_ids)
+            else:
+                self.fail("OutOfStock has not been raised")
+        finally:
+            lfs.catalog.stock.CHECK_STOCK_AMOUNT = False
+
+    def test_stock_reservation(self):
+        """Tests the reservation of products for carts.
+        """
+        from lfs.cart.models import Cart
+        import lfs.catalog.stock
+
+        lfs.catalog.stock.CHECK_STOCK_AMOUNT = True
+        lfs.catalog.stock.STOCK_RESERVATION_TIME = 10
+        try:
+            cart_1 = Cart.objects.create(session="1")
+            cart_2 = Cart.objects.create(session="2")
+
+            # There are 2 on stock (see above). The reserved amount is
+            # subtracted at once.
+            self.assertEqual(lfs.catalog.stock.reserve(cart_1, self.p1, 1), True)
+            self.assertEqual(Product.objects.get(pk=self.p1.id).stock_amount, 1)
+
+            # There is just 1 left
+            self.assertEqual(lfs.catalog.stock.reserve(cart_2, self.p1, 2), False)
+            self.assertEqual(Product.objects.get(pk=self.p1.id).stock_amount, 1)
+
+            # The reservation of the first cart is given back
+            cart_1.delete()
+            self.assertEqual(Product.objects.get(pk=self.p1.id).stock_amount, 2)
+            self.assertEqual(lfs.catalog.stock.reserve(cart_2, self.p1, 2), True)
+            self.assertEqual(Product.objects.get(pk=self.p1.id).stock_amount, 0)
+
+            # The order consumes the reservation
+            lfs.catalog.stock.decrease_stock_amounts({self.p1.id : 2}, cart_2)
+            self.assertEqual(Product.objects.get(pk=self.p1.id).stock_amount, 0)
+
+            # Nothing is left
+            self.assertRaises(lfs.catalog.stock.OutOfStock,
+                lfs.catalog.stock.decrease_stock_amounts, {self.p1.id : 1})
+        finally:
+            lfs.catalog.stock.CHECK_STOCK_AMOUNT = False
+            lfs.catalog.stock.STOCK_RESERVATION_TIME = 0
+
     def test_get_accessories(self):
         """Tests the get_accessories method. Takes into account the retrieving
         of accessories in the correct order. Tests also the inheritance of
@@ -1695,6 +1996,95 @@ class ProductTestCase(TestCase):
         # Now we get the price net of the parent product
         self.assertEqual("%.2f" % self.v1.get_price_net(), "1.68")
 
+    def test_get_price_records(self):
+        """Tests that the price records are the same as the prices of the
+        product methods.
+        """
+        self.v1.active_price = True
+        self.v1.save()
+
+        self.t1.rate = 7.0
+        self.t1.save()
+
+        products = [self.p1, self.p2, self.v1, self.v2]
+        records = lfs.catalog.prices.get_price_records(products)
+
+        for product in Product.objects.filter(pk__in=[p.id for p in products]):
+            record = records[product.id]
+            self.assertEqual(record["price_gross"], product.get_price_gross())
+            self.assertEqual("%.2f" % record["price_net"], "%.2f" % product.get_price_net())
+            self.assertEqual("%.2f" % record["tax"], "%.2f" % product.get_tax())
+            self.assertEqual(record["tax_rate"], product.get_tax_rate())
+            self.assertEqual(record["for_sale"], product.get_for_sale())
+            self.assertEqual(record["standard_price"], product.get_standard_price())
+
+        # All calculated records have been stored within the cache
+        reset_cache_statistics()
+        self.assertEqual(lfs.catalog.prices.get_price_records(products), records)
+        self.assertEqual(get_cache_statistics()["tax"], {"hits" : 4, "misses" : 0})
+
+        # The records are invalidated together with the product
+        self.v1.price = 3.0
+        self.v1.save()
+        self.assertEqual(lfs.catalog.prices.get_price_record(self.v1)["price_gross"], 3.0)
+
+    def test_get_price_records_for_sale(self):
+        """Tests that the price records are the same as the prices of the
+        product methods for all sale states of products, parents and variants.
+        """
+        self.p2.for_sale_price = 0.5
+        self.p2.price = 1.0
+        for for_sale in (True, False):
+            for active_for_sale in (ACTIVE_FOR_SALE_STANDARD, ACTIVE_FOR_SALE_YES, ACTIVE_FOR_SALE_NO):
+                self.p1.for_sale = for_sale
+                self.p1.save()
+                self.p2.for_sale = for_sale
+                self.p2.save()
+                self.v1.active_for_sale = active_for_sale
+                self.v1.save()
+
+                products = Product.objects.filter(pk__in=[self.p1.id, self.p2.id, self.v1.id, self.v2.id])
+                records = lfs.catalog.prices.get_price_records(products)
+                for product in products:
+                    record = records[product.id]
+                    self.assertEqual(record["for_sale"], product.get_for_sale())
+                    self.assertEqual(record["for_sale_price"], product.get_for_sale_price())
+                    self.assertEqual(record["price_gross"], product.get_price_gross())
+                    self.assertEqual(record["standard_price"], product.get_standard_price())
+
+    def test_effective_price(self):
+        """Tests that the effective price is the real gross price of the
+        product, also if a variant resp. the parent has been changed.
+        """
+        # The default variant inherits the price of the parent
+        self.assertEqual(Product.objects.get(pk=self.p1.id).effective_price, 1.0)
+        self.assertEqual(Product.objects.get(pk=self.v1.id).effective_price, 1.0)
+
+        # Changing the default variant changes the effective price of the parent
+        self.v1.active_price = True
+        self.v1.save()
+        self.assertEqual(Product.objects.get(pk=self.p1.id).effective_price, 2.0)
+
+        # Changing the parent changes the effective price of the inheriting
+        # variants
+        self.p1.for_sale = True
+        self.p1.save()
+        self.assertEqual(Product.objects.get(pk=self.v2.id).effective_price, 0.5)
+        self.assertEqual(Product.objects.get(pk=self.p1.id).effective_price, 0.5)
+
+        # Deleting the default variant
+        self.v1.delete()
+        self.v2.active_for_sale = ACTIVE_FOR_SALE_NO
+        self.v2.save()
+        self.assertEqual(Product.objects.get(pk=self.p1.id).effective_price, 1.0)
+
+    def test_get_order_by(self):
+        """Prices are sorted by the effective price.
+        """
+        self.assertEqual(lfs.catalog.utils.get_order_by("price"), "effective_price")
+        self.assertEqual(lfs.catalog.utils.get_order_by("-price"), "-effective_price")
+        self.assertEqual(lfs.catalog.utils.get_order_by("name"), "name")
+
     def test_get_standard_price_1(self):
         """Test the price vs. standard price for a product.
         """
@@ -2007,6 +2397,91 @@ class ProductTestCase(TestCase):
         variant = self.p1.get_variant(options)
         self.failIf(variant is not None)
 
+    def test_get_variant_lookup(self):
+        """Tests that the variant lookup is updated if the variants resp. their
+        property values are changed.
+        """
+        options = [
+            "%s|%s" % (self.color.id, self.red.id),
+            "%s|%s" % (self.size.id, self.m.id),
+        ]
+        options.sort()
+        lookup = self.p1.get_variant_lookup()
+        self.assertEqual(len(lookup), 2)
+        self.assertEqual(lookup["".join(options)], self.v1.id)
+
+        # Change the size of v1 to l
+        self.ppv_size_m.value = self.l.id
+        self.ppv_size_m.save()
+        self.assertEqual(self.p1.get_variant(options), None)
+
+        # Inactive variants are not within the lookup
+        self.v2.active = False
+        self.v2.save()
+        self.assertEqual(self.p1.get_variant_lookup().values(), [self.v1.id])
+
+        # Deleted variants neither
+        self.v1.delete()
+        self.assertEqual(self.p1.get_variant_lookup(), {})
+
+    def test_create_variants(self):
+        """Tests the bulk creation of variants. Existing variants are skipped.
+        """
+        properties = [
+            ["%s|%s" % (self.color.id, self.red.id), "%s|%s" % (self.color.id, self.green.id)],
+            ["%s|%s" % (self.size.id, self.l.id), "%s|%s" % (self.size.id, self.m.id)],
+        ]
+
+        amount = lfs.catalog.variants.create_variants(self.p1, properties, 3.0)
+        self.assertEqual(amount, 2)
+        self.assertEqual(len(self.p1.variants.all()), 4)
+
+        # New variants are not active
+        variant = Product.objects.get(slug="product-1-red-l")
+        self.assertEqual(variant.active, False)
+        self.assertEqual(variant.parent, self.p1)
+        self.assertEqual(variant.price, 3.0)
+        self.assertEqual(variant.effective_price, 1.0)
+        self.assertEqual(variant.property_values.get(property=self.size).value_as_float, float(self.l.id))
+
+        self.assertEqual(lfs.catalog.variants.get_progress(self.p1), {"done" : 2, "total" : 2})
+
+        # All variants exist now
+        amount = lfs.catalog.variants.create_variants(self.p1, properties, 3.0)
+        self.assertEqual(amount, 0)
+
+    def test_create_variants_in_background(self):
+        """Tests the creation of variants by a job.
+        """
+        from lfs.catalog.models import VariantsJob
+
+        properties = [
+            ["%s|%s" % (self.color.id, self.red.id), "%s|%s" % (self.color.id, self.green.id)],
+            ["%s|%s" % (self.size.id, self.l.id), "%s|%s" % (self.size.id, self.m.id)],
+        ]
+
+        old_threshold = lfs.catalog.variants.VARIANTS_BACKGROUND_THRESHOLD
+        lfs.catalog.variants.VARIANTS_BACKGROUND_THRESHOLD = 3
+        try:
+            self.assertEqual(lfs.catalog.variants.is_background_job(properties), True)
+            self.assertEqual(lfs.catalog.variants.is_background_job(properties[:1]), False)
+        finally:
+            lfs.catalog.variants.VARIANTS_BACKGROUND_THRESHOLD = old_threshold
+
+        lfs.catalog.variants.add_variants_job(self.p1, properties, 3.0)
+        self.assertEqual(len(self.p1.variants.all()), 2)
+        self.assertEqual(lfs.catalog.variants.get_progress(self.p1), {"done" : 0, "total" : 4})
+
+        amount = lfs.catalog.variants.process_variants_jobs()
+        self.assertEqual(amount, 2)
+        self.assertEqual(len(self.p1.variants.all()), 4)
+        self.assertEqual(Product.objects.get(slug="product-1-red-l").price, 3.0)
+        self.assertEqual(lfs.catalog.variants.get_progress(self.p1), {"done" : 2, "total" : 2})
+
+        # The job has been processed
+        self.assertEqual(VariantsJob.objects.count(), 0)
+        self.assertEqual(lfs.catalog.variants.process_variants_jobs(), 0)
+
     def test_get_default_variant(self):
         """Tests the default default_variant (which is the first one) and
         explicitly assigned variants
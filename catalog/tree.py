@@ -0,0 +1,98 @@
+"""Provides a process-local snapshot of the category tree.
+
+The snapshot contains just what is needed to render navigations (ids, parent
+ids, levels, slugs, names, positions and exclude_from_navigation). The
+nodes provide nothing else; code which needs other attributes has to load the
+Category itself. The snapshot is loaded once per process and shared by all requests. It must not be changed,
+instead a new snapshot is created as soon as the version of the categories
+namespace (see lfs.caching.settings) changes, i.e. after any category has
+been changed.
+"""
+# django imports
+from django.core.urlresolvers import reverse
+
+# lfs imports
+import lfs.catalog.models
+
+# The current snapshot of this process. This is replaced as a whole, hence no
+# lock is needed to read it.
+_snapshot = None
+
+class CategoryNode(object):
+    """A category within the snapshot.
+    """
+    def __init__(self, id, parent_id, level, slug, name, position, exclude_from_navigation):
+        self.id = id
+        self.parent_id = parent_id
+        self.level = level
+        self.slug = slug
+        self.name = name
+        self.position = position
+        self.exclude_from_navigation = exclude_from_navigation
+
+    def __unicode__(self):
+        return "%s (%s)" % (self.name, self.slug)
+
+    def get_absolute_url(self):
+        """Returns the absolute url of the category.
+        """
+        return reverse("lfs.catalog.views.category_view", kwargs={"slug" : self.slug})
+
+class CategoryTreeSnapshot(object):
+    """An immutable snapshot of all categories.
+    """
+    def __init__(self, version, rows):
+        """rows is a sequence of (id, parent_id, level, slug, name, position,
+        exclude_from_navigation) ordered by position.
+        """
+        self.version = version
+        self.nodes = {}
+
+        children = {}
+        for row in rows:
+            node = CategoryNode(*row)
+            self.nodes[node.id] = node
+            children.setdefault(node.parent_id, []).append(node)
+
+        self.children = {}
+        for parent_id, nodes in children.items():
+            self.children[parent_id] = tuple(nodes)
+
+    def get_node(self, id):
+        """Returns the category with given id or None.
+        """
+        return self.nodes.get(id)
+
+    def get_children(self, id=None):
+        """Returns the direct children of the category with given id. If id is
+        None the top level categories are returned.
+        """
+        return self.children.get(id, ())
+
+    def get_nodes_by_level(self, level):
+        """Returns all categories with given level ordered by position.
+        """
+        nodes = [node for node in self.nodes.values() if node.level == level]
+        nodes.sort(key=lambda node: (node.position, node.id))
+        return nodes
+
+def get_category_tree_snapshot():
+    """Returns the current category tree snapshot. Creates a new one if the
+    categories have been changed since the last one has been created.
+    """
+    from lfs.caching.settings import CATEGORIES_NAMESPACE
+    from lfs.caching.utils import get_generations
+
+    global _snapshot
+
+    version = get_generations([CATEGORIES_NAMESPACE])[CATEGORIES_NAMESPACE]
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+
+    rows = lfs.catalog.models.Category.objects.values_list("id", "parent",
+        "level", "slug", "name", "position", "exclude_from_navigation")
+
+    snapshot = CategoryTreeSnapshot(version, rows)
+    _snapshot = snapshot
+    return snapshot
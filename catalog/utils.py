@@ -1,13 +1,17 @@
 """Provides several utilities for catalog related stuff.
 """
 
+# python imports
+import bisect
+
 # django imports
-from django.core.cache import cache
-from django.db import connection
+from django.db.models import Q
+from django.utils.encoding import smart_str
+from django.utils.hashcompat import md5_constructor
 
 # import lfs
+import lfs.catalog.index
 import lfs.catalog.models
-from lfs.catalog.settings import PROPERTY_NUMBER_FIELD
 from lfs.catalog.settings import STANDARD_PRODUCT
 from lfs.catalog.settings import PRODUCT_WITH_VARIANTS
 
@@ -100,8 +104,13 @@ def get_current_product_category(request, product):
 def get_property_groups(category):
     """Returns all property groups for given category
     """
+    from lfs.caching.settings import CATEGORY_NAMESPACE
+    from lfs.caching.settings import CATEGORY_PRODUCTS_NAMESPACE
+    from lfs.caching.utils import get_cache
+    from lfs.caching.utils import set_cache
     cache_key = "category-property-groups-%s" % category.id
-    pgs = cache.get(cache_key)
+    namespaces = [CATEGORY_NAMESPACE % category.id, CATEGORY_PRODUCTS_NAMESPACE % category.id]
+    pgs = get_cache(cache_key, namespaces)
     if pgs is not None:
         return pgs
 
@@ -109,7 +118,7 @@ def get_property_groups(category):
     pgs = lfs.catalog.models.PropertyGroup.objects.filter(
         products__in=products).distinct()
 
-    cache.set(cache_key, pgs)
+    set_cache(cache_key, pgs, namespaces)
     return pgs
 
 def get_price_filters(category, product_filter, price_filter):
@@ -117,25 +126,14 @@ def get_price_filters(category, product_filter, price_filter):
     categorie's products.
     """
     # Base are the filtered products
-    products = get_filtered_products_for_category(category, product_filter, price_filter, None)
-    if not products:
+    product_ids = get_filtered_product_ids_for_category(category, product_filter, price_filter, None)
+    if not product_ids:
         return []
 
-    # And their variants
-    all_products = []
-    for product in products:
-        all_products.append(product)
-        all_products.extend(product.variants.filter(active=True))
-
-    product_ids = [p.id for p in all_products]
-
     # If a price filter is set we return just this.
     if price_filter:
         min = price_filter["min"]
         max = price_filter["max"]
-        products = lfs.catalog.models.Product.objects.filter(
-            effective_price__range=(min, max), pk__in=product_ids)
-        quantity = len(products)
 
         return {
             "show_reset" : True,
@@ -143,13 +141,17 @@ def get_price_filters(category, product_filter, price_filter):
             "items" : [{"min" : float(min), "max" : float(max)}],
             }
 
-    product_ids_str = ", ".join([str(p.id) for p in all_products])
-    cursor = connection.cursor()
-    cursor.execute("""SELECT min(effective_price), max(effective_price)
-                      FROM catalog_product
-                      WHERE id IN (%s)""" % product_ids_str)
-
-    pmin, pmax = cursor.fetchall()[0]
+    # The prices of the filtered products and their variants
+    index = lfs.catalog.index.get_filter_index(category)
+    prices = []
+    for product_id in product_ids:
+        prices.append(index["prices"][product_id])
+        for variant_id in index["variants"][product_id]:
+            prices.append(index["prices"][variant_id])
+
+    prices.sort()
+    pmin = prices[0]
+    pmax = prices[-1]
     if pmax == pmin:
         step = pmax
     else:
@@ -181,11 +183,10 @@ def get_price_filters(category, product_filter, price_filter):
             break
         min = i+1
         max = i+step
-        products = lfs.catalog.models.Product.objects.filter(effective_price__range=(min, max), pk__in=product_ids)
         result.append({
             "min" : min,
             "max" : max,
-            "quantity" : len(products),
+            "quantity" : len([p for p in prices if p >= min and p <= max]),
         })
 
     # return result
@@ -209,7 +210,15 @@ def get_price_filters(category, product_filter, price_filter):
 def get_product_filters(category, product_filter, price_filter, sorting):
     """Returns the next product filters based on products which are in the given
     category and within the result set of the current filters.
+
+    The filters are calculated from the filter index of the category (see
+    lfs.catalog.index), hence no SQL on the property values is needed here.
     """
+    from lfs.caching.settings import CATEGORY_NAMESPACE
+    from lfs.caching.settings import CATEGORY_PRODUCTS_NAMESPACE
+    from lfs.caching.utils import get_cache
+    from lfs.caching.utils import set_cache
+
     if price_filter:
         ck_price_filter = "%s|%s" % (price_filter["min"], price_filter["max"])
     else:
@@ -226,7 +235,9 @@ def get_product_filters(category, product_filter, price_filter, sorting):
     cache_key = "productfilters-%s-%s-%s-%s" % (
         category.slug, ck_product_filter, ck_price_filter, sorting)
 
-    result = cache.get(cache_key)
+    namespaces = [CATEGORY_NAMESPACE % category.id, CATEGORY_PRODUCTS_NAMESPACE % category.id]
+
+    result = get_cache(cache_key, namespaces)
     if result is not None:
         return result
 
@@ -234,49 +245,24 @@ def get_product_filters(category, product_filter, price_filter, sorting):
     options_mapping = get_option_mapping()
 
     # The base for the calulation of the next filters are the filtered products
-    products = get_filtered_products_for_category(
-        category, product_filter, price_filter, sorting)
-    if not products:
-        return []
+    product_ids = set(get_filtered_product_ids_for_category(
+        category, product_filter, price_filter, sorting))
 
-    # ... and their variants
-    all_products = []
-    for product in products:
-        all_products.append(product)
-        all_products.extend(product.variants.filter(active=True))
-
-    # Get the ids for use within the customer SQL
-    product_ids = ", ".join([str(p.id) for p in all_products])
+    # if there are either no products or no property values there can also be
+    # no product filters.
+    index = lfs.catalog.index.get_filter_index(category)
+    if not product_ids or not index["parent_values"]:
+        return []
 
     # Create dict out of already set filters
     set_filters = dict(product_filter)
 
-
-    cursor = connection.cursor()
-    cursor.execute("""SELECT DISTINCT property_id
-                      FROM catalog_productpropertyvalue""")
-
-    property_ids = ", ".join([str(p[0]) for p in cursor.fetchall()])
-
-    # if there either no products or no property ids there can also be no
-    # product filters.
-    if not product_ids or not property_ids:
-        return []
-
     result = []
     ########## Number Fields ###################################################
-
-    cursor = connection.cursor()
-    cursor.execute("""SELECT property_id, min(value_as_float), max(value_as_float)
-                      FROM catalog_productpropertyvalue
-                      WHERE product_id IN (%s)
-                      AND property_id IN (%s)
-                      GROUP BY property_id""" % (product_ids, property_ids))
-
-
-    for row in cursor.fetchall():
-
-        property = properties_mapping[row[0]]
+    for property_id, entries in index["numbers"].items():
+        property = properties_mapping.get(property_id)
+        if property is None:
+            continue
 
         if property.is_number_field == False:
             continue
@@ -284,12 +270,17 @@ def get_product_filters(category, product_filter, price_filter, sorting):
         if property.filterable == False:
             continue
 
+        # Just the entries of the filtered products (and their variants)
+        entries = [e for e in entries if index["parents"][e[2]] in product_ids]
+        if not entries:
+            continue
+
         # If the filter for a property is already set, we display only the
         # set filter.
-        if str(row[0]) in set_filters.keys():
-            values = set_filters[str(row[0])]
+        if str(property_id) in set_filters.keys():
+            values = set_filters[str(property_id)]
             result.append({
-                "id" : row[0],
+                "id" : property_id,
                 "position" : property.position,
                 "object" : property,
                 "name" : property.name,
@@ -300,11 +291,12 @@ def get_product_filters(category, product_filter, price_filter, sorting):
             })
             continue
 
-        # Otherwise we display all steps.
-        items = calculate_steps(product_ids, property, row[1], row[2])
+        # Otherwise we display all steps. As the entries are sorted the first
+        # and the last one are the min and max.
+        items = calculate_steps(index, entries, property, entries[0][0], entries[-1][0])
 
         result.append({
-            "id" : row[0],
+            "id" : property_id,
             "position" : property.position,
             "object" : property,
             "name" : property.name,
@@ -314,51 +306,22 @@ def get_product_filters(category, product_filter, price_filter, sorting):
             "items" : items,
         })
 
-
     ########## Select Fields ###################################################
-    # Count entries for current filter
-    cursor = connection.cursor()
-    cursor.execute("""SELECT property_id, value, parent_id
-                      FROM catalog_productpropertyvalue
-                      WHERE product_id IN (%s)
-                      AND property_id IN (%s)""" % (product_ids, property_ids))
-
-    already_count = {}
-    amount = {}
-    for row in cursor.fetchall():
-        # We count a property/value pair just one time per *product*. For
-        # "products with variants" this could be stored several times within the
-        # catalog_productpropertyvalue. Imagine a variant with two properties
-        # color and size:
-        #   v1 = color:red / size: s
-        #   v2 = color:red / size: l
-        # But we want to count color:red just one time. As the product with
-        # variants is displayed at not the variants.
-
-        if already_count.has_key("%s%s%s" % (row[2], row[0], row[1])):
-            continue
-        already_count["%s%s%s" % (row[2], row[0], row[1])] = 1
-
-        if not amount.has_key(row[0]):
-            amount[row[0]] = {}
-
-        if not amount[row[0]].has_key(row[1]):
-            amount[row[0]][row[1]] = 0
-
-        amount[row[0]][row[1]] += 1
-
-    cursor.execute("""SELECT property_id, value
-                      FROM catalog_productpropertyvalue
-                      WHERE product_id IN (%s)
-                      AND property_id IN (%s)
-                      GROUP BY property_id, value""" % (product_ids, property_ids))
-
-    # Group properties and values (for displaying)
-    set_filters = dict(product_filter)
+    # Group properties and values (for displaying). We count a property/value
+    # pair just one time per *product*. For "products with variants" this could
+    # be stored several times within the catalog_productpropertyvalue. Imagine a
+    # variant with two properties color and size:
+    #   v1 = color:red / size: s
+    #   v2 = color:red / size: l
+    # But we want to count color:red just one time. As the product with
+    # variants is displayed and not the variants. That's why the displayed
+    # products (parent_values) are taken here.
     properties = {}
-    for row in cursor.fetchall():
+    for property_id, property_values in index["parent_values"].items():
 
-        property = properties_mapping[row[0]]
+        property = properties_mapping.get(property_id)
+        if property is None:
+            continue
 
         if property.is_number_field:
             continue
@@ -366,45 +329,44 @@ def get_product_filters(category, product_filter, price_filter, sorting):
         if property.filterable == False:
             continue
 
-        if properties.has_key(row[0]) == False:
-            properties[row[0]] = []
-
-        # If the property is a select field we want to display the name of the
-        # option instead of the id.
-        if properties_mapping[row[0]].is_select_field:
-            try:
-                name = options_mapping[row[1]].name
-            except KeyError:
-                name = row[1]
-        else:
-            name = row[1]
+        for value, parent_ids in property_values.items():
+            quantity = len(parent_ids & product_ids)
+            if quantity == 0:
+                continue
 
-        # Transform to float for later sorting, see below
-        property = properties_mapping[row[0]]
-        if property.type == PROPERTY_NUMBER_FIELD:
-            value = float(row[1])
-        else:
-            value = row[1]
+            if properties.has_key(property_id) == False:
+                properties[property_id] = []
 
-        # if the property within the set filters we just show the selected value
-        if str(row[0]) in set_filters.keys():
-            if str(row[1]) in set_filters.values():
-                properties[row[0]] = [{
-                    "id"       : row[0],
+            # If the property is a select field we want to display the name of
+            # the option instead of the id.
+            if property.is_select_field:
+                try:
+                    name = options_mapping[value].name
+                except KeyError:
+                    name = value
+            else:
+                name = value
+
+            # if the property within the set filters we just show the selected
+            # value
+            if str(property_id) in set_filters.keys():
+                if str(value) in set_filters.values():
+                    properties[property_id] = [{
+                        "id"       : property_id,
+                        "value"    : value,
+                        "name"     : name,
+                        "quantity" : quantity,
+                        "show_quantity" : False,
+                    }]
+                continue
+            else:
+                properties[property_id].append({
+                    "id"       : property_id,
                     "value"    : value,
                     "name"     : name,
-                    "quantity" : amount[row[0]][row[1]],
-                    "show_quantity" : False,
-                }]
-            continue
-        else:
-            properties[row[0]].append({
-                "id"       : row[0],
-                "value"    : value,
-                "name"     : name,
-                "quantity" : amount[row[0]][row[1]],
-                "show_quantity" : True,
-            })
+                    "quantity" : quantity,
+                    "show_quantity" : True,
+                })
 
     # Transform the group properties into a list of dicts
     set_filter_keys = set_filters.keys()
@@ -428,7 +390,7 @@ def get_product_filters(category, product_filter, price_filter, sorting):
         })
 
     result.sort(lambda a, b: cmp(a["position"], b["position"]))
-    cache.set(cache_key, result)
+    set_cache(cache_key, result, namespaces)
 
     return result
 
@@ -436,119 +398,222 @@ def get_filtered_products_for_category(category, filters, price_filter, sorting)
     """Returns products for given categories and current filters sorted by
     current sorting.
     """
-    if filters:
-        if category.show_all_products:
-            products = category.get_all_products()
+    if filters or price_filter:
+        product_ids = get_filtered_product_ids_for_category(
+            category, filters, price_filter, sorting)
+        products = lfs.catalog.models.Product.objects.filter(pk__in=product_ids)
+    else:
+        if category.show_all_products and category.path:
+            products = lfs.catalog.models.Product.objects.filter(
+                categories__path__startswith=category.path)
         else:
-            products = category.get_products()
+            products = lfs.catalog.models.Product.objects.filter(
+                categories=category)
+        products = products.filter(
+            active=True,
+            sub_type__in=[STANDARD_PRODUCT, PRODUCT_WITH_VARIANTS]).distinct()
 
-        # Generate ids for collected products
-        product_ids = [str(p.id) for p in products]
-        product_ids = ", ".join(product_ids)
+    if sorting:
+        products = products.order_by(get_order_by(sorting))
 
-        # Generate filter
-        temp = []
-        for f in filters:
-            if len(f[1]) == 1:
-                temp.append("property_id='%s' AND value='%s'" % (f[0], f[1]))
-            else:
-                temp.append("property_id='%s' AND value_as_float BETWEEN '%s' AND '%s'" % (f[0], f[1][0], f[1][1]))
-
-        fstr = " OR ".join(temp)
-
-        # TODO: Will this work with every DB?
-
-        # Get all product ids with matching filters. The idea behind this SQL
-        # query is: If for every filter (property=value) for a product id exists
-        # a "product property value" the product matches.
-        cursor = connection.cursor()
-        cursor.execute("""
-            SELECT product_id, count(*)
-            FROM catalog_productpropertyvalue
-            WHERE product_id IN (%s) and %s
-            GROUP BY product_id
-            HAVING count(*)=%s""" % (product_ids, fstr, len(filters)))
-
-        matched_product_ids = [row[0] for row in cursor.fetchall()]
-
-        # All variants of category products
-        all_variants = lfs.catalog.models.Product.objects.filter(parent__in=products)
-
-        if all_variants:
-            all_variant_ids = [str(p.id) for p in all_variants]
-            all_variant_ids = ", ".join(all_variant_ids)
-
-            # Variants with matching filters
-            cursor.execute("""
-                SELECT product_id, count(*)
-                FROM catalog_productpropertyvalue
-                WHERE product_id IN (%s) and %s
-                GROUP BY product_id
-                HAVING count(*)=%s""" % (all_variant_ids, fstr, len(filters)))
-
-            # Get the parent ids of the variants as the "product with variants"
-            # should be displayed and not the variants.
-            variant_ids = [str(row[0]) for row in cursor.fetchall()]
-            if variant_ids:
-                variant_ids = ", ".join(variant_ids)
-
-                cursor.execute("""
-                    SELECT parent_id
-                    FROM catalog_product
-                    WHERE id IN (%s)""" % variant_ids)
-
-                parent_ids = [str(row[0]) for row in cursor.fetchall()]
-                matched_product_ids.extend(parent_ids)
-
-        # As we factored out the ids of all matching products now, we get the
-        # product instances in the correct order
-        products = lfs.catalog.models.Product.objects.filter(pk__in=matched_product_ids)
-    else:
-        categories = [category]
-        if category.show_all_products:
-            categories.extend(category.get_all_children())
-        products = lfs.catalog.models.Product.objects.filter(
-            active=True,
-            categories__in=categories, 
-            sub_type__in=[STANDARD_PRODUCT, PRODUCT_WITH_VARIANTS])
+    return products
 
-    if price_filter:
-        matched_product_ids = []
+def get_products_page_for_category(category, filters, price_filter, sorting, start, amount):
+    """Returns the products of the page which starts with given start for
+    given category, current filters and current sorting plus the total amount
+    of products as tuple: (products, amount_of_products).
 
-        # Get all variants of the products
-        variants = lfs.catalog.models.Product.objects.filter(parent__in=products)
+    The page is sliced out of the sorted product ids (see
+    get_filtered_product_ids_for_category), hence the database has not to
+    count and skip the products before the page. Products with variants are
+    replaced by their default variants.
+    """
+    from lfs.caching.settings import CATEGORY_NAMESPACE
+    from lfs.caching.settings import CATEGORY_PRODUCTS_NAMESPACE
+    from lfs.caching.utils import get_cache
+    from lfs.caching.utils import set_cache
+
+    # The sorted ids (and therefore the total amount) are cached per filters
+    # and sorting. They are invalidated together with the filter index.
+    cache_key = "category-product-ids-%s-%s" % (category.id, md5_constructor(
+        smart_str("%s-%s-%s" % (filters, price_filter, sorting))).hexdigest())
+    namespaces = [CATEGORY_NAMESPACE % category.id, CATEGORY_PRODUCTS_NAMESPACE % category.id]
+
+    product_ids = get_cache(cache_key, namespaces)
+    if product_ids is None:
+        product_ids = get_filtered_product_ids_for_category(
+            category, filters, price_filter, sorting)
+        set_cache(cache_key, product_ids, namespaces)
+
+    page_ids = product_ids[start:start+amount]
+    products = lfs.catalog.models.Product.objects.in_bulk(page_ids)
+    products = [products[id] for id in page_ids if id in products]
+
+    index = lfs.catalog.index.get_filter_index(category)
+    return get_default_variants(index, products), len(product_ids)
+
+def get_default_variants(index, products):
+    """Replaces every product with variants of the given products by its
+    default variant. The default variants of all products are loaded with
+    one query.
+    """
+    # Products without active variants are displayed themselves.
+    parents = [p for p in products
+               if p.is_product_with_variants() and index["variants"].get(p.id)]
+    if not parents:
+        return products
 
-        # Filter the variants by price
-        variants = variants.filter(effective_price__range=[price_filter["min"], price_filter["max"]])
+    default_variants = load_default_variants(parents)
 
-        # Get the parent ids of the variants as the "product with variants"
-        # should be displayed and not the variants.
-        if variants:
-            variant_ids = [str(r.id) for r in variants]
-            variant_ids = ", ".join(variant_ids)
+    result = []
+    for product in products:
+        result.append(default_variants.get(product.id, product))
+    return result
 
-            cursor = connection.cursor()
-            cursor.execute("""
-                SELECT parent_id
-                FROM catalog_product
-                WHERE id IN (%s)""" % variant_ids)
+def load_default_variants(products):
+    """Returns the default variants of the given products with variants as
+    dictionary: product id -> default variant. This is the same as
+    Product.get_default_variant but needs one query for all products.
+    Products without a default variant are not within the dictionary.
+    """
+    default_ids = [p.default_variant_id for p in products if p.default_variant_id]
+    parent_ids = [p.id for p in products if not p.default_variant_id]
+    if not default_ids and not parent_ids:
+        return {}
+
+    variants = lfs.catalog.models.Product.objects.filter(
+        Q(pk__in=default_ids) | Q(parent__in=parent_ids, active=True))
+
+    # The variants are ordered by name, hence the first variant of a parent
+    # is the default variant if none is selected.
+    selected_variants = {}
+    first_variants = {}
+    for variant in variants:
+        selected_variants[variant.id] = variant
+        if variant.active:
+            first_variants.setdefault(variant.parent_id, variant)
+
+    result = {}
+    for product in products:
+        if product.default_variant_id:
+            variant = selected_variants.get(product.default_variant_id)
+        else:
+            variant = first_variants.get(product.id)
+        if variant is not None:
+            result[product.id] = variant
+    return result
 
-            parent_ids = [str(row[0]) for row in cursor.fetchall()]
-            matched_product_ids.extend(parent_ids)
+def get_filtered_product_ids_for_category(category, filters, price_filter, sorting):
+    """Returns the ids of the products for given category and current filters
+    sorted by current sorting.
 
-        # Filter the products
-        products = products.filter(effective_price__range=[price_filter["min"], price_filter["max"]])
+    The ids are calculated out of the filter index of the category (see
+    lfs.catalog.index): Every filter is a set of product ids, hence the
+    filters are combined via set intersections. Matching variants are mapped
+    to their parents as the "product with variants" is displayed and not the
+    variant. Hence the costs depend on the size of the result and not on the
+    amount of products within the category.
+    """
+    index = lfs.catalog.index.get_filter_index(category)
 
-        # Merge the results
-        matched_product_ids.extend([p.id for p in products])
+    if filters:
+        # Get all product ids with matching filters. A product matches if it
+        # (not its parent or one of its variants) matches every filter.
+        matched_product_ids = None
+        for property_id, value in filters:
+            product_ids = _get_product_ids_for_filter(index, property_id, value)
+            if matched_product_ids is None:
+                matched_product_ids = product_ids
+            else:
+                matched_product_ids = matched_product_ids & product_ids
 
-        # And get a new query set of all products
-        products = lfs.catalog.models.Product.objects.filter(pk__in=matched_product_ids)
+            if not matched_product_ids:
+                return []
 
+        parents = index["parents"]
+        product_ids = set([parents[id] for id in matched_product_ids])
+    else:
+        product_ids = index["products"]
+
+    if price_filter:
+        try:
+            min = float(price_filter["min"])
+            max = float(price_filter["max"])
+        except (TypeError, ValueError):
+            return []
+
+        # A product matches if either the product itself or one of its
+        # variants is within the price range.
+        prices = index["prices"]
+        matched_product_ids = []
+        for product_id in product_ids:
+            ids = [product_id] + index["variants"][product_id]
+            for id in ids:
+                if prices[id] >= min and prices[id] <= max:
+                    matched_product_ids.append(product_id)
+                    break
+        product_ids = matched_product_ids
+
+    return _sort_product_ids(index, product_ids, sorting)
+
+def _get_product_ids_for_filter(index, property_id, value):
+    """Returns the ids of all products (incl. variants) of the given index
+    which match the given filter.
+
+    The value is either a single value or a (min, max) pair for number fields.
+    """
+    try:
+        property_id = int(property_id)
+    except (TypeError, ValueError):
+        return set()
+
+    if isinstance(value, (list, tuple)):
+        try:
+            min = float(value[0])
+            max = float(value[1])
+        except (IndexError, TypeError, ValueError):
+            return set()
+
+        # The number entries are sorted by the float value
+        entries = index["numbers"].get(property_id, [])
+        result = set()
+        for i in range(bisect.bisect_left(entries, (min, )), len(entries)):
+            if entries[i][0] > max:
+                break
+            result.add(entries[i][2])
+        return result
+    else:
+        return index["values"].get(property_id, {}).get(value, set())
+
+def get_order_by(sorting):
+    """Returns the field by which products are ordered for given sorting.
+    Prices are sorted by the effective price, which takes sale prices and
+    default variants into account.
+    """
+    if sorting in ("price", "-price"):
+        return sorting.replace("price", "effective_price")
+    return sorting
+
+def _sort_product_ids(index, product_ids, sorting):
+    """Sorts the given product ids of the given index by given sorting.
+    """
+    sorting = get_order_by(sorting)
     if sorting:
-        products = products.order_by(sorting)
+        field = sorting.lstrip("-")
+        reverse = sorting.startswith("-")
+    else:
+        # Default ordering of the Product
+        field = "name"
+        reverse = False
 
-    return products
+    if field not in lfs.catalog.index.SORTABLE_FIELDS:
+        return list(lfs.catalog.models.Product.objects.filter(
+            pk__in=product_ids).order_by(sorting).values_list("id", flat=True))
+
+    fields = index["fields"]
+    product_ids = list(product_ids)
+    product_ids.sort(key=lambda id: fields[id][field], reverse=reverse)
+    return product_ids
 
 def get_option_mapping():
     """Returns a dictionary with property id to property name.
@@ -567,8 +632,10 @@ def get_property_mapping():
 
     return properties
 
-def calculate_steps(product_ids, property, min, max):
-    """
+def calculate_steps(index, entries, property, min, max):
+    """Calculates the filter steps of given number property. The passed entries
+    are the (value_as_float, value, product id) entries of the filter index for
+    the currently filtered products.
     """
     try:
         min = float(min)
@@ -589,7 +656,7 @@ def calculate_steps(product_ids, property, min, max):
             result.append({
                 "min" : min,
                 "max" : max,
-                "quantity" : calculate_quantity(product_ids, property.id, min, max)
+                "quantity" : calculate_quantity(index, entries, min, max)
             })
     else:
         if property.is_automatic_step_type:
@@ -629,7 +696,7 @@ def calculate_steps(product_ids, property, min, max):
             result.append({
                 "min" : min,
                 "max" : max,
-                "quantity" : calculate_quantity(product_ids, property.id, min, max)
+                "quantity" : calculate_quantity(index, entries, min, max)
             })
 
     if property.display_no_results:
@@ -648,33 +715,15 @@ def calculate_steps(product_ids, property, min, max):
 
         return new_result
 
-def calculate_quantity(product_ids, property_id, min, max):
+def calculate_quantity(index, entries, min, max):
     """Calculate the amount of products for given parameters.
     """
-    # Count entries for current filter
-    cursor = connection.cursor()
-    cursor.execute("""SELECT property_id, value, parent_id
-                      FROM catalog_productpropertyvalue
-                      WHERE product_id IN (%s)
-                      AND property_id = %s
-                      AND value_as_float BETWEEN %s AND %s""" % (product_ids, property_id, min, max))
-
+    # We count a property/value pair just one time per *product*. See
+    # get_product_filters for more.
     already_count = {}
-    amount = 0
-    for row in cursor.fetchall():
-        # We count a property/value pair just one time per *product*. For
-        # "products with variants" this could be stored several times within the
-        # catalog_productpropertyvalue. Imagine a variant with two properties
-        # color and size:
-        #   v1 = color:red / size: s
-        #   v2 = color:red / size: l
-        # But we want to count color:red just one time. As the product with
-        # variants is displayed at not the variants.
-
-        if already_count.has_key("%s%s%s" % (row[2], row[0], row[1])):
+    for value_as_float, value, product_id in entries:
+        if value_as_float < min or value_as_float > max:
             continue
-        already_count["%s%s%s" % (row[2], row[0], row[1])] = 1
-
-        amount += 1
+        already_count[(index["parents"][product_id], value)] = 1
 
-    return amount
\ No newline at end of file
+    return len(already_count)
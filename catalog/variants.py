@@ -0,0 +1,189 @@
+"""Provides the bulk creation of variants.
+
+Variants are created for every combination of the requested property
+options. As this could be thousands of variants, they are inserted in chunks
+with a few statements each, without saving every single product. Hence the
+listeners of the products are not called and the caches are invalidated just
+one time at the end. All variants are created within one transaction.
+
+Large amounts of combinations are not created within the request. Instead a
+VariantsJob is added (see add_variants_job), which is processed by the
+management command create_variants (e.g. called by cron). The progress is
+stored within the cache (see get_progress), so it can be displayed while the
+variants are created by another process.
+"""
+# django imports
+from django.core.cache import cache
+from django.db import connection
+from django.db import transaction
+from django.template.defaultfilters import slugify
+from django.utils import simplejson
+
+# lfs imports
+import lfs.catalog.index
+import lfs.catalog.prices
+from lfs.catalog.models import Product
+from lfs.catalog.models import ProductPropertyValue
+from lfs.catalog.models import PropertyOption
+from lfs.catalog.models import VariantsJob
+from lfs.catalog.settings import VARIANT
+from lfs.catalog.settings import VARIANTS_BACKGROUND_THRESHOLD
+from lfs.core.signals import product_changed
+from lfs.core.utils import insert_rows
+from lfs.manage.utils import cartesian_product
+
+# The amount of variants which are inserted with one statement.
+CHUNK_SIZE = 100
+
+def create_variants(product, properties, price):
+    """Creates a variant of the given product for every combination of the
+    given properties, unless a variant with the same options already exists.
+
+    properties is a list of lists of "property.id|option.id" strings, one list
+    per property. Returns the amount of created variants.
+    """
+    combinations = list(cartesian_product(*properties))
+
+    # All options with one query
+    option_ids = set()
+    for options in properties:
+        for option in options:
+            option_ids.add(option.split("|")[1])
+    option_names = dict([(str(id), option.name) for id, option in
+        PropertyOption.objects.in_bulk(list(option_ids)).items()])
+
+    existing = _get_existing_options(product)
+
+    variants = []
+    for i, options in enumerate(combinations):
+        temp = list(options)
+        temp.sort()
+        if "".join(temp) in existing:
+            continue
+
+        slug = ""
+        for option in options:
+            property_id, option_id = option.split("|")
+            slug += "-" + slugify(option_names.get(option_id, ""))
+
+        variant = Product(
+            slug="%s%s" % (product.slug, slug),
+            sku="%s-%s" % (product.sku, i+1),
+            parent=product,
+            price=price,
+            variant_position=i+1,
+            sub_type=VARIANT)
+        variant.effective_price = variant.get_price_gross()
+        variants.append((variant, options))
+
+    _set_progress(product, 0, len(variants))
+    for i in range(0, len(variants), CHUNK_SIZE):
+        _insert_variants(product, variants[i:i+CHUNK_SIZE])
+        _set_progress(product, min(i+CHUNK_SIZE, len(variants)), len(variants))
+
+    if variants:
+        lfs.catalog.prices.update_effective_prices(product)
+        lfs.catalog.index.update_filter_index(product)
+        product_changed.send(product)
+
+    return len(variants)
+create_variants = transaction.commit_on_success(create_variants)
+
+def is_background_job(properties):
+    """Returns True if the variants for the given properties (see
+    create_variants) are too many to be created within the request.
+    """
+    if VARIANTS_BACKGROUND_THRESHOLD is None:
+        return False
+    return _get_amount(properties) > VARIANTS_BACKGROUND_THRESHOLD
+
+def add_variants_job(product, properties, price):
+    """Adds a job which creates the variants of the given product in the
+    background (see process_variants_jobs). The arguments are the same as for
+    create_variants.
+    """
+    VariantsJob.objects.create(product=product,
+        properties=simplejson.dumps(properties), price=price)
+    _set_progress(product, 0, _get_amount(properties))
+
+def process_variants_jobs():
+    """Creates the variants of all added jobs in the order they have been
+    added. Returns the amount of created variants.
+    """
+    amount = 0
+    for job in VariantsJob.objects.all():
+        amount += _process_variants_job(job)
+    return amount
+
+def get_progress(product):
+    """Returns the progress of the current creation of variants of the given
+    product as dictionary with the keys "done" and "total" or None.
+    """
+    return cache.get("create-variants-progress-%s" % product.id)
+
+def _get_existing_options(product):
+    """Returns the option strings (see Product.get_variant) of all variants of
+    the given product, including the inactive ones (new variants are not
+    active).
+    """
+    options = {}
+    for product_id, property_id, value in ProductPropertyValue.objects.filter(
+        product__parent=product).values_list("product", "property", "value"):
+        options.setdefault(product_id, []).append("%s|%s" % (property_id, value))
+
+    result = set()
+    for temp in options.values():
+        temp.sort()
+        result.add("".join(temp))
+    return result
+
+def _process_variants_job(job):
+    """Deletes the given job and creates its variants within one transaction.
+    Returns the amount of created variants, 0 if another process has taken
+    the job meanwhile.
+    """
+    cursor = connection.cursor()
+    cursor.execute("DELETE FROM %s WHERE id = %%s" % VariantsJob._meta.db_table, [job.id])
+    if cursor.rowcount == 0:
+        return 0
+    return create_variants(job.product, simplejson.loads(job.properties), job.price)
+_process_variants_job = transaction.commit_on_success(_process_variants_job)
+
+def _get_amount(properties):
+    """Returns the amount of combinations of the given properties (see
+    create_variants).
+    """
+    amount = 1
+    for options in properties:
+        amount *= len(options)
+    return amount
+
+def _set_progress(product, done, total):
+    """Stores the progress of the creation of variants of the given product.
+    """
+    cache.set("create-variants-progress-%s" % product.id, {"done" : done, "total" : total})
+
+def _insert_variants(product, variants):
+    """Inserts the given variants, a list of (variant, options) tuples, and
+    their property values.
+    """
+    insert_rows(Product, [variant for variant, options in variants])
+
+    # The ids of the new variants
+    slugs = [variant.slug for variant, options in variants]
+    ids = dict(Product.objects.filter(parent=product, slug__in=slugs).values_list("slug", "id"))
+
+    values = []
+    for variant, options in variants:
+        for option in options:
+            property_id, option_id = option.split("|")
+            value = ProductPropertyValue(
+                product_id=ids[variant.slug], parent_id=product.id,
+                property_id=property_id, value=option_id)
+            try:
+                value.value_as_float = float(option_id)
+            except ValueError:
+                pass
+            values.append(value)
+
+    insert_rows(ProductPropertyValue, values)
@@ -1,6 +1,5 @@
 # django imports
 from django.conf import settings
-from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.http import Http404
 from django.http import HttpResponse
@@ -9,19 +8,32 @@ from django.shortcuts import render_to_response
 from django.template import RequestContext
 from django.template.loader import render_to_string
 from django.utils import simplejson
+from django.utils.encoding import smart_str
+from django.utils.hashcompat import md5_constructor
 from django.utils.translation import ugettext_lazy as _
 
 # lfs imports
+import lfs.catalog.tree
 import lfs.catalog.utils
 import lfs.core.utils
+from lfs.caching.utils import delete_cache
+from lfs.caching.utils import get_cache
 from lfs.caching.utils import lfs_get_object_or_404
+from lfs.caching.utils import set_cache
+from lfs.caching.settings import CATEGORIES_NAMESPACE
+from lfs.caching.settings import CATEGORY_NAMESPACE
+from lfs.caching.settings import CATEGORY_PRODUCTS_NAMESPACE
+from lfs.caching.settings import PRODUCT_NAMESPACE
+from lfs.caching.settings import SHOP_NAMESPACE
 from lfs.cart.views import add_to_cart
 from lfs.catalog.models import Category
 from lfs.catalog.models import Product
 from lfs.catalog.settings import PRODUCT_WITH_VARIANTS, VARIANT
 from lfs.catalog.settings import SELECT
 from lfs.catalog.settings import CONTENT_PRODUCTS
+from lfs.catalog.settings import CATEGORY_PRODUCTS_CACHE_ENTRIES
 from lfs.core.utils import LazyEncoder
+from lfs.marketing.utils import add_product_view
 from lfs.utils import misc as lfs_utils
 
 def select_variant(request):
@@ -176,14 +188,15 @@ def category_categories(request, slug, template_name="lfs/catalog/category_categ
 
     This is displayed if the category's content attribute is set to categories".
     """
+    category = lfs_get_object_or_404(Category, slug=slug)
+
     cache_key = "category-categories-%s" % slug
+    namespaces = [SHOP_NAMESPACE, CATEGORIES_NAMESPACE, CATEGORY_NAMESPACE % category.id]
 
-    result = cache.get(cache_key)
+    result = get_cache(cache_key, namespaces)
     if result is not None:
         return result
 
-    category = lfs_get_object_or_404(Category, slug=slug)
-
     format_info = category.get_format_info()
     amount_of_cols = format_info["category_cols"]
 
@@ -203,7 +216,7 @@ def category_categories(request, slug, template_name="lfs/catalog/category_categ
         "categories" : categories,
     }))
 
-    cache.set(cache_key, result)
+    set_cache(cache_key, result, namespaces)
     return result
 
 def category_products(request, slug, start=0, template_name="lfs/catalog/category_products.html"):
@@ -224,7 +237,6 @@ def category_products(request, slug, start=0, template_name="lfs/catalog/categor
     product_filter = request.session.get("product-filter", {})
     product_filter = product_filter.items()
 
-    cache_key = "category-products-%s" % slug
     sub_cache_key = "start-%s-sorting-%s" % (start, sorting)
 
     filter_key = ["%s-%s" % (i[0], i[1]) for i in product_filter]
@@ -235,16 +247,18 @@ def category_products(request, slug, start=0, template_name="lfs/catalog/categor
     if price_filter:
         sub_cache_key += "-%s-%s" % (price_filter["min"], price_filter["max"])
 
-    temp = cache.get(cache_key)
-    if temp is not None:
-        try:
-            return temp[sub_cache_key]
-        except KeyError:
-            pass
-    else:
-        temp = dict()
+    # Every page is cached separately. The filters could contain arbitrary
+    # characters, hence the hash.
+    cache_key = "category-products-%s-%s" % (
+        slug, md5_constructor(smart_str(sub_cache_key)).hexdigest())
 
     category = lfs_get_object_or_404(Category, slug=slug)
+    namespaces = [SHOP_NAMESPACE, CATEGORY_NAMESPACE % category.id,
+        CATEGORY_PRODUCTS_NAMESPACE % category.id]
+
+    result = get_cache(cache_key, namespaces)
+    if result is not None:
+        return result
 
     # Calculates parameters for display.
     try:
@@ -257,16 +271,13 @@ def category_products(request, slug, start=0, template_name="lfs/catalog/categor
     amount_of_cols = format_info["product_cols"]
     amount = amount_of_rows * amount_of_cols
 
-    all_products = lfs.catalog.utils.get_filtered_products_for_category(
-        category, product_filter, price_filter, sorting)
+    page, amount_of_products = lfs.catalog.utils.get_products_page_for_category(
+        category, product_filter, price_filter, sorting, start, amount)
 
     # Calculate products
     row = []
     products = []
-    for i, product in enumerate(all_products[start:start+amount]):
-        # Switch to default variant if product is a "product with variants".
-        if product.is_product_with_variants() and product.has_variants():
-            product = product.get_default_variant()
+    for i, product in enumerate(page):
         row.append(product)
         if (i+1) % amount_of_cols == 0:
             products.append(row)
@@ -275,8 +286,6 @@ def category_products(request, slug, start=0, template_name="lfs/catalog/categor
     if len(row) > 0:
         products.append(row)
 
-    amount_of_products = all_products.count()
-
     # Calculate urls
     pages = []
     for i in range(0, amount_of_products/amount+1):
@@ -307,10 +316,30 @@ def category_products(request, slug, start=0, template_name="lfs/catalog/categor
         "show_pages" : amount_of_products > amount,
     }))
 
-    temp[sub_cache_key] = result
-    cache.set(cache_key, temp)
+    set_cache(cache_key, result, namespaces)
+    _add_category_products_entry(category, cache_key, namespaces)
     return result
 
+def _add_category_products_entry(category, cache_key, namespaces):
+    """Registers the newly cached product page with given cache key of the
+    given category. Deletes the oldest pages if there are more than
+    CATEGORY_PRODUCTS_CACHE_ENTRIES.
+
+    This is only called if a page has been rendered, hence cached pages are
+    delivered without any further cache request.
+    """
+    entries_key = "category-products-entries-%s" % category.id
+    entries = get_cache(entries_key, namespaces) or []
+
+    if cache_key in entries:
+        entries.remove(cache_key)
+    entries.append(cache_key)
+
+    while len(entries) > CATEGORY_PRODUCTS_CACHE_ENTRIES:
+        delete_cache(entries.pop(0), namespaces)
+
+    set_cache(entries_key, entries, namespaces)
+
 def product_view(request, slug, template_name="lfs/catalog/product_base.html"):
     """Main view to display a product.
     """
@@ -328,6 +357,9 @@ def product_view(request, slug, template_name="lfs/catalog/product_base.html"):
         recent = recent[:settings.LFS_RECENT_PRODUCTS_LIMIT+1]
     request.session["RECENT_PRODUCTS"] = recent
 
+    # Count the view for the popularity of the product
+    add_product_view(product)
+
     # TODO: Factor top_category out to a inclusion tag, so that people can
     # omit if they don't need it.
 
@@ -343,14 +375,20 @@ def product_inline(request, id, template_name="lfs/catalog/product_inline.html")
     This is factored out to be able to better cached and in might in future used
     used to be updated via ajax requests.
     """
+    # Get product in question
+    product = lfs_get_object_or_404(Product, pk=id)
+
+    # The inline depends on the parent product and all its variants
+    if product.is_variant():
+        namespaces = [PRODUCT_NAMESPACE % product.parent_id]
+    else:
+        namespaces = [PRODUCT_NAMESPACE % product.id]
+
     cache_key = "product-inline-%s-%s" % (request.user.is_superuser, id)
-    result = cache.get(cache_key)
+    result = get_cache(cache_key, namespaces)
     if result is not None:
         return result
 
-    # Get product in question
-    product = lfs_get_object_or_404(Product, pk=id)
-
     if product.sub_type == PRODUCT_WITH_VARIANTS:
         variant = product.get_default_variant()
         if variant is None:
@@ -397,7 +435,7 @@ def product_inline(request, id, template_name="lfs/catalog/product_inline.html")
         "properties" : properties
     }))
 
-    cache.set(cache_key, result)
+    set_cache(cache_key, result, namespaces)
     return result
 
 def product_form_dispatcher(request):
@@ -432,9 +470,11 @@ def product_form_dispatcher(request):
 def get_category_nodes(request):
     """Returns the category tree as JSON for extJS.
     """
+    snapshot = lfs.catalog.tree.get_category_tree_snapshot()
+
     categories = []
-    for category in Category.objects.filter(parent = None):
-        temp = _get_children_nodes(category)
+    for category in snapshot.get_children():
+        temp = _get_children_nodes(snapshot, category)
         categories.append({
             "id" : category.slug,
             "text" : category.name,
@@ -444,12 +484,12 @@ def get_category_nodes(request):
 
     return HttpResponse(simplejson.dumps(categories))
 
-def _get_children_nodes(category):
+def _get_children_nodes(snapshot, category):
     """
     """
     children = []
-    for category in category.category_set.all():
-        temp = _get_children_nodes(category)
+    for category in snapshot.get_children(category.id):
+        temp = _get_children_nodes(snapshot, category)
         children.append({
             "id" : category.slug,
             "text" : category.name,
@@ -40,7 +40,7 @@ def login(request, template_name="lfs/checkout/login.html"):
     if request.user.is_authenticated():
         return HttpResponseRedirect(reverse("lfs_checkout"))
 
-    shop = lfs.core.utils.get_default_shop()
+    shop = lfs.core.utils.get_default_shop(request)
 
     # If only anonymous checkout allowed we don't want to show this view at all.
     if shop.checkout_type == CHECKOUT_TYPE_ANON:
@@ -92,7 +92,7 @@ def login(request, template_name="lfs/checkout/login.html"):
 def checkout_dispatcher(request):
     """Dispatcher to display the correct checkout form
     """
-    shop = lfs.core.utils.get_default_shop()
+    shop = lfs.core.utils.get_default_shop(request)
     cart = cart_utils.get_cart(request)
 
     if cart is None or not cart.items():
@@ -142,7 +142,7 @@ def one_page_checkout(request, checkout_form = OnePageCheckoutForm,
     """
     # If the user is not authenticated and the if only authenticate checkout
     # allowed we rediret to authentication page.
-    shop = lfs.core.utils.get_default_shop()
+    shop = lfs.core.utils.get_default_shop(request)
     if request.user.is_anonymous() and \
        shop.checkout_type == CHECKOUT_TYPE_AUTH:
         return HttpResponseRedirect(reverse("lfs_checkout_login"))
@@ -233,6 +233,11 @@ def one_page_checkout(request, checkout_form = OnePageCheckoutForm,
             if result.get("success") == True:
                 order = lfs.order.utils.add_order(request)
 
+                # A product has been sold out meanwhile.
+                if order is None:
+                    return lfs.core.utils.set_message_cookie(reverse("lfs_cart"),
+                        _(u"Sorry, some products are not on stock anymore."))
+
                 # TODO: Get rid of these payment specific payment stuff. This
                 # should be within payment utils.
                 if payment_method.id == PAYPAL and settings.LFS_PAYPAL_REDIRECT:
@@ -4,15 +4,30 @@
 # python imports
 from PIL import Image
 import cStringIO
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import new as md5
 
 # django imports
+from django.conf import settings
+from django.core.cache import cache
 from django.core.files.base import ContentFile
 from django.db.models import ImageField
 from django.db.models.fields.files import ImageFieldFile
+from django.utils.encoding import smart_str
 
 # lfs imports
 from lfs.utils.images import scale_to_max_size
 
+# If True the thumbnails are generated on first access of their URL instead of
+# on upload. All thumbnails can be generated in advance with the management
+# command generate_thumbnails.
+THUMBNAILS_LAZY = getattr(settings, "LFS_THUMBNAILS_LAZY", True)
+
+# The time in seconds the existence of a thumbnail is cached.
+THUMBNAIL_CACHE_TIMEOUT = getattr(settings, "LFS_THUMBNAIL_CACHE_TIMEOUT", 24 * 60 * 60)
+
 def generate_thumb(img, thumb_size, format):
     """
     Generates a thumbnail image and returns a ContentFile object with the thumbnail
@@ -29,6 +44,11 @@ def generate_thumb(img, thumb_size, format):
     img.seek(0) # see http://code.djangoproject.com/ticket/8222 for details
     image = Image.open(img)
 
+    # JPEGs are decoded in a reduced size (at least the thumbnail size), which
+    # is much faster than decoding the full image and scaling it down.
+    if image.format == "JPEG":
+        image.draft(image.mode, thumb_size)
+
     # Convert to RGB if necessary
     if image.mode not in ('L', 'RGB'):
         image = image.convert('RGB')
@@ -44,6 +64,71 @@ def generate_thumb(img, thumb_size, format):
     new_image.save(io, format)
     return ContentFile(io.getvalue())
 
+def get_thumb_name(name, size):
+    """Returns the name of the thumbnail with given size of the image with
+    given name.
+    """
+    split = name.rsplit('.',1)
+    return '%s.%sx%s.%s' % (split[0], size[0], size[1], split[1])
+
+def generate_thumbs(storage, name, sizes, force=False):
+    """Generates the thumbnails with given sizes of the image with given name
+    within given storage. Existing thumbnails are only generated again if
+    force is True.
+
+    The image is read once for all missing thumbnails.
+    """
+    missing = []
+    for size in sizes:
+        thumb_name = get_thumb_name(name, size)
+        if force or not storage.exists(thumb_name):
+            missing.append((size, thumb_name))
+        else:
+            cache.set(_get_thumb_key(thumb_name), True, THUMBNAIL_CACHE_TIMEOUT)
+
+    if not missing:
+        return
+
+    img = storage.open(name, "rb")
+    try:
+        content = cStringIO.StringIO(img.read())
+    finally:
+        img.close()
+
+    for size, thumb_name in missing:
+        thumb_content = generate_thumb(content, size, name.rsplit('.',1)[1])
+
+        # The thumbnail is either generated again (force is True) or has been
+        # saved by another process meanwhile.
+        if storage.exists(thumb_name):
+            storage.delete(thumb_name)
+
+        thumb_name_ = storage.save(thumb_name, thumb_content)
+
+        # Another process has saved the thumbnail meanwhile.
+        if not thumb_name == thumb_name_:
+            storage.delete(thumb_name_)
+
+        cache.set(_get_thumb_key(thumb_name), True, THUMBNAIL_CACHE_TIMEOUT)
+
+def delete_thumbs(storage, name, sizes):
+    """Deletes the thumbnails with given sizes of the image with given name
+    within given storage, if they exist.
+    """
+    for size in sizes:
+        thumb_name = get_thumb_name(name, size)
+        cache.delete(_get_thumb_key(thumb_name))
+        try:
+            storage.delete(thumb_name)
+        except:
+            pass
+
+def _get_thumb_key(thumb_name):
+    """Returns the cache key which states that the thumbnail with given name
+    exists. The key is deleted together with the thumbnail (see delete_thumbs).
+    """
+    return "thumbnail-%s" % md5(smart_str(thumb_name)).hexdigest()
+
 class ImageWithThumbsFieldFile(ImageFieldFile):
     """
     See ImageWithThumbsField for usage example
@@ -52,47 +137,43 @@ class ImageWithThumbsFieldFile(ImageFieldFile):
         super(ImageWithThumbsFieldFile, self).__init__(*args, **kwargs)
         self.sizes = self.field.sizes
 
-        if self.sizes:
-            def get_size(self, size):
-                if not self:
-                    return ''
-                else:
-                    split = self.url.rsplit('.',1)
-                    thumb_url = '%s.%sx%s.%s' % (split[0],w,h,split[1])
-                    return thumb_url
-
+    def __getattr__(self, name):
+        """Returns the URL of the thumbnail for url_[width]x[height]. The
+        thumbnail is generated on first access.
+        """
+        if name.startswith('url_') and self.sizes:
             for size in self.sizes:
-                (w,h) = size
-                setattr(self, 'url_%sx%s' % (w,h), get_size(self, size))
+                if name == 'url_%sx%s' % size:
+                    return self.get_thumb_url(size)
+        raise AttributeError(name)
 
-    def save(self, name, content, save=True):
-        super(ImageWithThumbsFieldFile, self).save(name, content, save)
-        if self.sizes:
-            for size in self.sizes:
-                (w,h) = size
-                split = self.name.rsplit('.',1)
-                thumb_name = '%s.%sx%s.%s' % (split[0],w,h,split[1])
+    def get_thumb_url(self, size):
+        """Returns the URL of the thumbnail with given size. Generates the
+        thumbnail if it doesn't exist yet.
+        """
+        if not self:
+            return ''
 
-                # you can use another thumbnailing function if you like
-                thumb_content = generate_thumb(self.file, size, split[1])
+        thumb_name = get_thumb_name(self.name, size)
+        if not cache.get(_get_thumb_key(thumb_name)):
+            generate_thumbs(self.storage, self.name, [size])
 
-                thumb_name_ = self.storage.save(thumb_name, thumb_content)
+        return self.storage.url(thumb_name)
 
-                if not thumb_name == thumb_name_:
-                    raise ValueError('There is already a file named %s' % thumb_name)
+    def save(self, name, content, save=True):
+        super(ImageWithThumbsFieldFile, self).save(name, content, save)
+        if self.sizes:
+            # Thumbnails of a former image with the same name are outdated.
+            if THUMBNAILS_LAZY:
+                delete_thumbs(self.storage, self.name, self.sizes)
+            else:
+                generate_thumbs(self.storage, self.name, self.sizes, force=True)
 
     def delete(self, save=True):
         name=self.name
         super(ImageWithThumbsFieldFile, self).delete(save)
         if self.sizes:
-            for size in self.sizes:
-                (w,h) = size
-                split = name.rsplit('.',1)
-                thumb_name = '%s.%sx%s.%s' % (split[0],w,h,split[1])
-                try:
-                    self.storage.delete(thumb_name)
-                except:
-                    pass
+            delete_thumbs(self.storage, name, self.sizes)
 
 class ImageWithThumbsField(ImageField):
     attr_class = ImageWithThumbsFieldFile
@@ -113,12 +194,14 @@ class ImageWithThumbsField(ImageField):
     How it works:
     =============
     For each size in the 'sizes' atribute of the field it generates a
-    thumbnail with that size and stores it following this format:
+    thumbnail with that size (on first access of its URL, unless
+    LFS_THUMBNAILS_LAZY is False) and stores it following this format:
 
     available_filename.[width]x[height].extension
 
     Where 'available_filename' is the available filename returned by the storage
-    backend for saving the original file.
+    backend for saving the original file. Thumbnails with these names which
+    exist already on upload are deleted resp. generated again.
 
     Following the usage example above: For storing a file called "photo.jpg" it saves:
     photo.jpg          (original file)
@@ -133,9 +216,8 @@ class ImageWithThumbsField(ImageField):
     Note: django-thumbs assumes that if filename "any_filename.jpg" is available
     filenames with this format "any_filename.[widht]x[height].jpg" will be available, too.
 
-    To do:
-    ======
-    Add method to regenerate thubmnails
+    All thumbnails can be regenerated with the management command
+    generate_thumbnails.
 
     """
     def __init__(self, verbose_name=None, name=None, width_field=None, height_field=None, sizes=None, **kwargs):
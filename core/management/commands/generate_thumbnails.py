@@ -0,0 +1,68 @@
+# python imports
+from optparse import make_option
+
+# django imports
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import get_models
+
+# lfs imports
+from lfs.core.fields.thumbs import ImageWithThumbsField
+from lfs.core.fields.thumbs import generate_thumbs
+
+class Command(BaseCommand):
+    """Generates the thumbnails of all images of all models (see
+    lfs.core.fields.thumbs). The images are distributed to the given amount of
+    processes.
+    """
+    option_list = BaseCommand.option_list + (
+        make_option("--processes", type="int", dest="processes", default=1,
+            help="The amount of processes which generate thumbnails."),
+        make_option("--force", action="store_true", dest="force", default=False,
+            help="Generates existing thumbnails again."),
+    )
+    help = "Generates the thumbnails of all images."
+
+    def handle(self, **options):
+        images = []
+        for model in get_models():
+            for field in model._meta.fields:
+                if isinstance(field, ImageWithThumbsField) and field.sizes:
+                    names = model._default_manager.exclude(
+                        **{field.name : ""}).exclude(
+                        **{"%s__isnull" % field.name : True}).values_list(field.name, flat=True)
+                    images.extend([(field.storage, name, field.sizes) for name in names])
+
+        processes = options.get("processes") or 1
+        force = options.get("force")
+
+        # The processes just work on the storage, hence the database
+        # connection isn't shared with them.
+        connection.close()
+
+        if processes > 1:
+            try:
+                import multiprocessing
+            except ImportError:
+                processes = 1
+
+        if processes > 1:
+            pool = multiprocessing.Pool(processes)
+            pool.map(_generate_thumbs, [(image, force) for image in images])
+            pool.close()
+            pool.join()
+        else:
+            for image in images:
+                _generate_thumbs((image, force))
+
+        print "%s images" % len(images)
+
+def _generate_thumbs(args):
+    """Generates the thumbnails of the given image. This is called within the
+    processes, hence errors are printed instead of aborting all processes.
+    """
+    (storage, name, sizes), force = args
+    try:
+        generate_thumbs(storage, name, sizes, force)
+    except Exception, e:
+        print "%s: %s" % (name, e)
@@ -11,9 +11,14 @@ from django.template.loader import render_to_string
 from django.utils.translation import ugettext_lazy as _
 
 # lfs imports
+import lfs.catalog.tree
 import lfs.catalog.utils
+import lfs.core.utils
 import lfs.utils.misc
+from lfs.caching.settings import CATEGORIES_NAMESPACE
+from lfs.caching.utils import get_cache
 from lfs.caching.utils import lfs_get_object_or_404
+from lfs.caching.utils import set_cache
 from lfs.cart import utils as cart_utils
 from lfs.catalog.models import Category
 from lfs.catalog.settings import PRODUCT_WITH_VARIANTS
@@ -98,7 +103,7 @@ def breadcrumbs(context, obj):
     """
     if isinstance(obj, Category):
         cache_key = "category-breadcrumbs-%s" % obj.slug
-        objects = cache.get(cache_key)
+        objects = get_cache(cache_key, [CATEGORIES_NAMESPACE])
         if objects is not None:
             return objects
 
@@ -114,7 +119,7 @@ def breadcrumbs(context, obj):
             "objects" : objects,
             "MEDIA_URL" : context.get("MEDIA_URL"),
         }
-        cache.set(cache_key, result)
+        set_cache(cache_key, result, [CATEGORIES_NAMESPACE])
 
     elif isinstance(obj, Product):
         try:
@@ -234,13 +239,13 @@ def product_navigation(context, product):
             products = Product.objects.filter(
                 categories__in = categories,
                 sub_type__in = (STANDARD_PRODUCT, PRODUCT_WITH_VARIANTS),
-            ).order_by(sorting)
+            ).order_by(lfs.catalog.utils.get_order_by(sorting))
         else:
             products = Product.objects.filter(
                 categories__in = categories,
                 sub_type__in = (STANDARD_PRODUCT, PRODUCT_WITH_VARIANTS),
                 active = True,
-            ).order_by(sorting)
+            ).order_by(lfs.catalog.utils.get_order_by(sorting))
 
         product_slugs = [p.slug for p in products]
         product_index = product_slugs.index(slug)
@@ -311,7 +316,8 @@ def top_level_categories(context):
     categories = []
     top_category = lfs.catalog.utils.get_current_top_category(request, obj)
 
-    for category in Category.objects.filter(parent=None)[:4]:
+    snapshot = lfs.catalog.tree.get_category_tree_snapshot()
+    for category in snapshot.get_children()[:4]:
 
         if top_category:
             current = top_category.id == category.id
@@ -333,15 +339,17 @@ def menu(context):
     """
     """
     request = context.get("request")
-    current_categories = get_current_categories(request)
+    obj = context.get("category") or context.get("product")
+    current_ids = [c.id for c in lfs.core.utils.get_current_categories(request, obj)]
 
     categories = []
-    for category in Category.objects.filter(parent = None):
+    snapshot = lfs.catalog.tree.get_category_tree_snapshot()
+    for category in snapshot.get_children():
         categories.append({
             "id" : category.id,
             "slug" : category.slug,
             "name" : category.name,
-            "selected" : category in current_categories
+            "selected" : category.id in current_ids
         })
 
     return {
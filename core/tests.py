@@ -6,9 +6,17 @@ from lfs.page.tests import *
 from lfs.search.tests import *
 from lfs.shipping.tests import *
 
+# python imports
+import cStringIO
+import shutil
+import tempfile
+
 # django imports
 from django.contrib.auth.models import User
 from django.contrib.sessions.backends.file import SessionStore
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
 from django.core.urlresolvers import reverse
 from django.template.loader import get_template_from_string
 from django.template import Context
@@ -16,6 +24,9 @@ from django.test import TestCase
 from django.test.client import Client
 
 # lfs imports
+import PIL.Image
+import lfs.core.fields.thumbs
+from lfs.catalog.models import Image
 from lfs.core.models import Shop
 from lfs.core.models import Country
 from lfs.order.models import Order
@@ -50,6 +61,17 @@ class ShopTestCase(TestCase):
         shop.from_email = "john@doe.com"
         self.assertEqual(shop.from_email, "john@doe.com")
         
+    def test_get_default_shop(self):
+        """Tests that the shop is loaded once per request.
+        """
+        request = RequestFactory().get("/")
+
+        shop = lfs.core.utils.get_default_shop(request)
+        self.failUnless(shop is lfs.core.utils.get_default_shop(request))
+
+        request = RequestFactory().get("/")
+        self.failIf(shop is lfs.core.utils.get_default_shop(request))
+
     def test_get_notification_emails(self):
         """
         """
@@ -159,4 +181,108 @@ class TagsTestCase(TestCase):
         
         # Now it works and "pageTracker" is found
         content = template.render(Context({"request" : request}))
-        self.failIf(content.find("pageTracker") == -1)
\ No newline at end of file
+        self.failIf(content.find("pageTracker") == -1)
+
+class ThumbsTestCase(TestCase):
+    """Tests the thumbnails of images (see lfs.core.fields.thumbs).
+    """
+    def setUp(self):
+        """
+        """
+        self.field = Image._meta.get_field("image")
+        self.old_storage = self.field.storage
+        self.storage = FileSystemStorage(location=tempfile.mkdtemp(), base_url="/media/")
+        self.field.storage = self.storage
+
+    def tearDown(self):
+        """
+        """
+        shutil.rmtree(self.storage.location)
+        self.field.storage = self.old_storage
+
+    def _create_image(self, name, color="red"):
+        """Creates an image with an uploaded file of given name.
+        """
+        io = cStringIO.StringIO()
+        PIL.Image.new("RGB", (500, 300), color).save(io, "PNG")
+
+        image = Image.objects.create(title=name)
+        image.image.save(name, ContentFile(io.getvalue()))
+        return image
+
+    def _get_thumb_size(self, thumb_name):
+        """Returns the size of the stored thumbnail with given name.
+        """
+        return PIL.Image.open(self.storage.path(thumb_name)).size
+
+    def test_lazy_generation(self):
+        """Tests that a thumbnail is generated on first access of its URL.
+        """
+        image = self._create_image("test.png")
+        self.assertEqual(image.image.name, "images/test.png")
+        self.failIf(self.storage.exists("images/test.60x60.png"))
+
+        self.assertEqual(image.image.url_60x60, "/media/images/test.60x60.png")
+        self.assertEqual(self._get_thumb_size("images/test.60x60.png"), (60, 36))
+        self.failIf(self.storage.exists("images/test.100x100.png"))
+
+        # The existence of the thumbnail is cached, hence the storage isn't
+        # asked again.
+        self.storage.delete("images/test.60x60.png")
+        self.assertEqual(image.image.url_60x60, "/media/images/test.60x60.png")
+        self.failIf(self.storage.exists("images/test.60x60.png"))
+
+        # All thumbnails are deleted with the image
+        image.image.url_100x100
+        image.image.delete()
+        self.failIf(self.storage.exists("images/test.png"))
+        self.failIf(self.storage.exists("images/test.100x100.png"))
+
+    def test_outdated_thumbnails(self):
+        """Tests that thumbnails of a former image with the same name are
+        not served.
+        """
+        image = self._create_image("test.png")
+        image.image.url_60x60
+        self.storage.delete("images/test.png")
+
+        image = self._create_image("test.png", "blue")
+        self.assertEqual(image.image.name, "images/test.png")
+        self.failIf(self.storage.exists("images/test.60x60.png"))
+
+        image.image.url_60x60
+        thumb = PIL.Image.open(self.storage.path("images/test.60x60.png"))
+        self.assertEqual(thumb.convert("RGB").getpixel((0, 0)), (0, 0, 255))
+
+    def test_collisions(self):
+        """Tests images with the same name.
+        """
+        image_1 = self._create_image("test.png")
+        image_2 = self._create_image("test.png")
+        self.assertNotEqual(image_1.image.name, image_2.image.name)
+
+        self.assertNotEqual(image_1.image.url_60x60, image_2.image.url_60x60)
+        self.failUnless(self.storage.exists(
+            lfs.core.fields.thumbs.get_thumb_name(image_2.image.name, (60, 60))))
+
+        # An existing thumbnail is just generated again if forced
+        thumb_name = "images/test.60x60.png"
+        self.storage.delete(thumb_name)
+        self.storage.save(thumb_name, ContentFile("invalid"))
+        lfs.core.fields.thumbs.generate_thumbs(self.storage, "images/test.png", [(60, 60)])
+        self.assertEqual(self.storage.open(thumb_name).read(), "invalid")
+
+        lfs.core.fields.thumbs.generate_thumbs(self.storage, "images/test.png", [(60, 60)], force=True)
+        self.assertEqual(self._get_thumb_size(thumb_name), (60, 36))
+        self.failIf("test.60x60_.png" in self.storage.listdir("images")[1])
+
+    def test_generate_thumbnails(self):
+        """Tests the generation of all thumbnails by the management command.
+        """
+        image = self._create_image("test.png")
+        name = image.image.name
+
+        call_command("generate_thumbnails")
+        for size in self.field.sizes:
+            thumb_name = lfs.core.fields.thumbs.get_thumb_name(name, size)
+            self.failUnless(self.storage.exists(thumb_name))
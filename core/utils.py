@@ -4,13 +4,19 @@ import sys
 import urllib
 
 # django imports
+from django.db import connection
+from django.db import models
 from django.http import HttpResponseRedirect
 from django.utils import simplejson
 from django.utils.functional import Promise
 from django.utils.encoding import force_unicode
 
 # lfs imports
+import lfs.catalog.tree
 import lfs.catalog.utils
+from lfs.caching.settings import CATEGORIES_NAMESPACE
+from lfs.caching.utils import get_request_cache
+from lfs.caching.utils import invalidate_namespaces
 from lfs.caching.utils import lfs_get_object_or_404
 from lfs.core.models import Shop
 from lfs.catalog.models import Category
@@ -23,10 +29,14 @@ class LazyEncoder(simplejson.JSONEncoder):
             return force_unicode(obj)
         return obj
 
-def get_default_shop():
+def get_default_shop(request=None):
     """Returns the default shop. At the moment this the shop with id == 1.
+
+    If a request is given the shop is loaded once per request.
     """
-    return lfs_get_object_or_404(Shop, pk=1)
+    if request is None:
+        return lfs_get_object_or_404(Shop, pk=1)
+    return get_request_cache(request, "shop", lambda: lfs_get_object_or_404(Shop, pk=1))
 
 def lfs_quote(string, encoding="utf-8"):
     """Encodes string to encoding before quoting.
@@ -89,11 +99,43 @@ def get_current_categories(request, object):
     return current_categories
 
 def set_category_levels():
-    """Creates category levels based on the position in hierarchy.
+    """Creates category paths and levels based on the position in hierarchy.
+
+    This is just needed if the hierarchy has been changed without
+    Category.save, which keeps them current.
     """
-    for category in Category.objects.all():
-        category.level = len(category.get_parents()) + 1
-        category.save()
+    children = {}
+    for id, parent_id in Category.objects.values_list("id", "parent"):
+        children.setdefault(parent_id, []).append(id)
+
+    def _set_paths(parent_id, parent_path):
+        for id in children.get(parent_id, []):
+            path = "%s%s/" % (parent_path, id)
+            Category.objects.filter(pk=id).update(path=path, level=path.count("/") - 1)
+            _set_paths(id, path)
+
+    _set_paths(None, "/")
+    invalidate_namespaces(CATEGORIES_NAMESPACE)
+
+def insert_rows(model, objects):
+    """Inserts the given (unsaved) objects of the given model with one
+    statement. Their save methods and the signals are not called and the ids
+    are not set.
+    """
+    qn = connection.ops.quote_name
+    fields = [f for f in model._meta.local_fields if not isinstance(f, models.AutoField)]
+
+    sql = "INSERT INTO %s (%s) VALUES (%s)" % (
+        qn(model._meta.db_table),
+        ", ".join([qn(f.column) for f in fields]),
+        ", ".join(["%s"] * len(fields)))
+
+    rows = []
+    for object in objects:
+        rows.append([f.get_db_prep_save(f.pre_save(object, True)) for f in fields])
+
+    cursor = connection.cursor()
+    cursor.executemany(sql, rows)
 
 def get_start_day(date):
     """Takes a string such as "2009-07-23" and returns a range of this day.
@@ -129,9 +171,14 @@ def getLOL(objects, objects_per_row=3):
     
 class CategoryTree(object):
     """Represents a category tree.
+
+    The tree is built out of the category tree snapshot (see
+    lfs.catalog.tree), hence the categories of the tree are CategoryNodes
+    and no queries are needed.
     """
     def __init__(self, currents, start_level, expand_level):
         self.currents = currents
+        self.current_ids = set([c.id for c in currents or []])
         self.start_level = start_level
         self.expand_level = expand_level
 
@@ -142,14 +189,16 @@ class CategoryTree(object):
         # actual position of a category based on the current tree. In this way
         # the category tree always start with level 1 (even if we start with
         # category level 2) an the correct css is applied.
+        self.snapshot = lfs.catalog.tree.get_category_tree_snapshot()
+
         level = 0
         categories = []
-        for category in Category.objects.filter(level = self.start_level):
+        for category in self.snapshot.get_nodes_by_level(self.start_level):
 
             if category.exclude_from_navigation:
                 continue
 
-            if (self.currents and category in self.currents):
+            if category.id in self.current_ids:
                 children = self._get_sub_tree(category, level+1)
                 is_current = True
             elif category.level <= self.expand_level:
@@ -160,7 +209,7 @@ class CategoryTree(object):
                 is_current = False
 
             if self.start_level > 1:
-                if category.parent in self.currents:
+                if category.parent_id in self.current_ids:
                     categories.append({
                         "category" : category,
                         "children" : children,
@@ -179,12 +228,12 @@ class CategoryTree(object):
 
     def _get_sub_tree(self, category, level):
         categories = []
-        for category in Category.objects.filter(parent = category):
+        for category in self.snapshot.get_children(category.id):
 
             if category.exclude_from_navigation:
                 continue
 
-            if (self.currents and category in self.currents):
+            if category.id in self.current_ids:
                 children = self._get_sub_tree(category, level+1)
                 is_current = True
             elif category.level <= self.expand_level:
@@ -0,0 +1,30 @@
+# django imports
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+
+# lfs imports
+from lfs.caching.settings import CRITERIA_NAMESPACE
+from lfs.caching.utils import invalidate_namespaces
+from lfs.criteria.models import CartPriceCriterion
+from lfs.criteria.models import CombinedLengthAndGirthCriterion
+from lfs.criteria.models import CountryCriterion
+from lfs.criteria.models import CriteriaObjects
+from lfs.criteria.models import HeightCriterion
+from lfs.criteria.models import LengthCriterion
+from lfs.criteria.models import PaymentMethodCriterion
+from lfs.criteria.models import ShippingMethodCriterion
+from lfs.criteria.models import UserCriterion
+from lfs.criteria.models import WeightCriterion
+from lfs.criteria.models import WidthCriterion
+
+def criteria_changed_listener(sender, instance, **kwargs):
+    """Invalidates the compiled criteria (see lfs.criteria.rules).
+    """
+    invalidate_namespaces(CRITERIA_NAMESPACE)
+
+for model in (CartPriceCriterion, CombinedLengthAndGirthCriterion,
+    CountryCriterion, CriteriaObjects, HeightCriterion, LengthCriterion,
+    PaymentMethodCriterion, ShippingMethodCriterion, UserCriterion,
+    WeightCriterion, WidthCriterion):
+    post_save.connect(criteria_changed_listener, sender=model)
+    post_delete.connect(criteria_changed_listener, sender=model)
@@ -1,4 +1,7 @@
 # Separated criteria and criteria_objects to prevent cyclic import:
 # PaymentMethod -> CriteriaObjects | PaymentCriteria -> PaymentMethod
 from criteria import *
-from criteria_objects import *
\ No newline at end of file
+from criteria_objects import *
+
+# Connects the listeners which invalidate the compiled criteria
+import lfs.criteria.listeners
@@ -0,0 +1,385 @@
+"""Provides the compiled criteria.
+
+All criteria of all objects (shipping methods, payment methods and their
+prices) are loaded with a few queries and compiled into plain predicates,
+which are evaluated without any further query against a CriteriaContext. The
+context calculates the values of the request (cart price, weight, dimensions,
+country, user, selected methods) just once, hence several objects can be
+checked against the same context.
+
+The rule set is loaded once per process and shared by all requests. It must
+not be changed, instead a new one is created as soon as the version of the
+criteria namespace (see lfs.caching.settings) changes, i.e. after any
+criterion has been changed.
+"""
+# django imports
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+
+# lfs imports
+from lfs.caching.settings import CRITERIA_NAMESPACE
+from lfs.caching.utils import get_generations
+from lfs.criteria.models import CartPriceCriterion
+from lfs.criteria.models import CombinedLengthAndGirthCriterion
+from lfs.criteria.models import CountryCriterion
+from lfs.criteria.models import CriteriaObjects
+from lfs.criteria.models import HeightCriterion
+from lfs.criteria.models import LengthCriterion
+from lfs.criteria.models import PaymentMethodCriterion
+from lfs.criteria.models import ShippingMethodCriterion
+from lfs.criteria.models import UserCriterion
+from lfs.criteria.models import WeightCriterion
+from lfs.criteria.models import WidthCriterion
+from lfs.criteria.settings import EQUAL
+from lfs.criteria.settings import LESS_THAN
+from lfs.criteria.settings import LESS_THAN_EQUAL
+from lfs.criteria.settings import GREATER_THAN
+from lfs.criteria.settings import GREATER_THAN_EQUAL
+from lfs.criteria.settings import IS, IS_NOT, IS_VALID, IS_NOT_VALID
+from lfs.payment.models import PaymentMethod
+from lfs.shipping.models import ShippingMethod
+
+# The current rule set of this process. This is replaced as a whole, hence no
+# lock is needed to read it.
+_rule_set = None
+
+# The number criteria and the name of their value field. This is also the name
+# of the value within the CriteriaContext.
+NUMBER_CRITERIA = (
+    (CartPriceCriterion, "price"),
+    (CombinedLengthAndGirthCriterion, "clag"),
+    (HeightCriterion, "height"),
+    (LengthCriterion, "length"),
+    (WeightCriterion, "weight"),
+    (WidthCriterion, "width"),
+)
+
+class CriteriaContext(object):
+    """The values of a request (and a product) against which the criteria are
+    evaluated. Every value is calculated once on first access.
+
+    If a product is given the number values are taken from the product
+    otherwise from the cart.
+    """
+    def __init__(self, request, product=None):
+        self.request = request
+        self.product = product
+        self.values = {}
+
+    def get(self, name):
+        """Returns the value with given name.
+        """
+        try:
+            return self.values[name]
+        except KeyError:
+            if name in [field for model, field in NUMBER_CRITERIA]:
+                self.values.update(self._get_dimensions())
+            else:
+                self.values[name] = getattr(self, "_get_%s" % name)()
+            return self.values[name]
+
+    def _get_dimensions(self):
+        """Returns the number values of the product resp. the cart. These are
+        None if there is no cart.
+        """
+        product = self.product
+        if product is not None:
+            return {
+                "price" : product.get_price(),
+                "clag" : (2 * product.get_width()) + (2 * product.get_height()) + product.get_length(),
+                "height" : product.get_height(),
+                "length" : product.get_length(),
+                "weight" : product.get_weight(),
+                "width" : product.get_width(),
+            }
+
+        from lfs.cart import utils as cart_utils
+        cart = cart_utils.get_cart(self.request)
+        if cart is None:
+            return {
+                "price" : None,
+                "clag" : None,
+                "height" : None,
+                "length" : None,
+                "weight" : None,
+                "width" : None,
+            }
+
+        max_width = 0
+        max_length = 0
+        total_height = 0
+        height = 0
+        weight = 0
+        products = cart_utils.get_cart_products(cart)
+        for item in cart.items():
+            product = products[item.product_id]
+            max_length = max(max_length, product.get_length())
+            max_width = max(max_width, product.get_width())
+            total_height += product.get_height()
+            height += product.get_height() * item.amount
+            weight += product.get_weight() * item.amount
+
+        return {
+            "price" : cart_utils.get_cart_price(self.request, cart),
+            "clag" : (2 * max_width) + (2 * total_height) + max_length,
+            "height" : height,
+            "length" : max_length,
+            "weight" : weight,
+            "width" : max_width,
+        }
+
+    def _get_country_id(self):
+        from lfs.shipping import utils as shipping_utils
+        country = shipping_utils.get_selected_shipping_country(self.request)
+        if country is None:
+            return None
+        return country.id
+
+    def _get_user_id(self):
+        user = self.request.user
+        if user is None:
+            return None
+        return user.id
+
+    def _get_shipping_method_id(self):
+        from lfs.shipping import utils as shipping_utils
+        shipping_method = shipping_utils.get_selected_shipping_method(self.request)
+        if shipping_method is None:
+            return None
+        return shipping_method.id
+
+    def _get_payment_method_id(self):
+        from lfs.payment import utils as payment_utils
+        payment_method = payment_utils.get_selected_payment_method(self.request)
+        if payment_method is None:
+            return None
+        return payment_method.id
+
+class NumberPredicate(object):
+    """Compares a number value of the context with a fixed value.
+    """
+    def __init__(self, name, operator, value):
+        self.name = name
+        self.operator = operator
+        self.value = value
+
+    def is_valid(self, rule_set, context):
+        value = context.get(self.name)
+        if value is None:
+            return False
+
+        operator = self.operator
+        if operator == LESS_THAN:
+            return value < self.value
+        elif operator == LESS_THAN_EQUAL:
+            return value <= self.value
+        elif operator == GREATER_THAN:
+            return value > self.value
+        elif operator == GREATER_THAN_EQUAL:
+            return value >= self.value
+        elif operator == EQUAL:
+            return value == self.value
+        return False
+
+class CountryPredicate(object):
+    """Checks whether the selected shipping country is (not) one of given
+    countries.
+    """
+    def __init__(self, operator, country_ids):
+        self.operator = operator
+        self.country_ids = country_ids
+
+    def is_valid(self, rule_set, context):
+        if self.operator == IS:
+            return context.get("country_id") in self.country_ids
+        else:
+            return context.get("country_id") not in self.country_ids
+
+class UserPredicate(object):
+    """Checks whether the current user is one of given users.
+    """
+    def __init__(self, user_ids):
+        self.user_ids = user_ids
+
+    def is_valid(self, rule_set, context):
+        return context.get("user_id") in self.user_ids
+
+class MethodPredicate(object):
+    """Checks whether the selected shipping resp. payment method is (not) one
+    of given methods or whether the given methods are (not) valid.
+
+    The selected method is not checked for criteria of a method of the same
+    kind, as the selection depends on the validity of these methods.
+    """
+    def __init__(self, model, operator, ids, is_same_kind):
+        self.model = model
+        self.operator = operator
+        self.ids = ids
+        self.is_same_kind = is_same_kind
+
+    def is_valid(self, rule_set, context):
+        if self.model is ShippingMethod:
+            name = "shipping_method_id"
+        else:
+            name = "payment_method_id"
+
+        if not self.is_same_kind and self.operator == IS:
+            return context.get(name) in self.ids
+        elif not self.is_same_kind and self.operator == IS_NOT:
+            return context.get(name) not in self.ids
+        elif self.operator == IS_VALID:
+            for id in self.ids:
+                if not rule_set.is_valid_by_key(context, (self.model, id)):
+                    return False
+            return True
+        elif self.operator == IS_NOT_VALID:
+            for id in self.ids:
+                if rule_set.is_valid_by_key(context, (self.model, id)):
+                    return False
+            return True
+        else:
+            return False
+
+class RuleSet(object):
+    """The compiled criteria of all objects.
+    """
+    def __init__(self, version, predicates):
+        """predicates is a dictionary: (model, object id) -> list of
+        predicates.
+        """
+        self.version = version
+        self.predicates = predicates
+
+    def is_valid(self, context, object):
+        """Returns True if all criteria of the given object are valid for the
+        given context.
+        """
+        return self.is_valid_by_key(context, (object.__class__, object.id))
+
+    def is_valid_by_key(self, context, key):
+        for predicate in self.predicates.get(key, ()):
+            if not predicate.is_valid(self, context):
+                return False
+        return True
+
+def get_rule_set():
+    """Returns the current rule set. Creates a new one if any criterion has been
+    changed since the last one has been created.
+    """
+    global _rule_set
+
+    version = get_generations([CRITERIA_NAMESPACE])[CRITERIA_NAMESPACE]
+    rule_set = _rule_set
+    if rule_set is not None and rule_set.version == version:
+        return rule_set
+
+    rule_set = RuleSet(version, _compile())
+    _rule_set = rule_set
+    return rule_set
+
+def _compile():
+    """Loads all criteria and compiles them into predicates.
+    """
+    criteria_objects = CriteriaObjects.objects.values_list(
+        "criterion_type", "criterion_id", "content_type", "content_id", "position")
+    criteria_objects = list(criteria_objects)
+
+    ids = {}
+    for criterion_type_id, criterion_id, content_type_id, content_id, position in criteria_objects:
+        ids.setdefault(criterion_type_id, []).append(criterion_id)
+
+    compilers = {}
+    for model, field in NUMBER_CRITERIA:
+        compilers[model] = _get_number_compiler(field)
+    compilers[CountryCriterion] = _compile_countries
+    compilers[UserCriterion] = _compile_users
+    compilers[PaymentMethodCriterion] = _get_method_compiler(PaymentMethod, "payment_methods")
+    compilers[ShippingMethodCriterion] = _get_method_compiler(ShippingMethod, "shipping_methods")
+
+    # The predicate factories per criterion: (type id, criterion id) ->
+    # function, which takes the model of the object the criterion belongs to.
+    factories = {}
+    for model, compiler in compilers.items():
+        criterion_type_id = ContentType.objects.get_for_model(model).id
+        if criterion_type_id in ids:
+            for criterion_id, factory in compiler(model, ids[criterion_type_id]).items():
+                factories[(criterion_type_id, criterion_id)] = factory
+
+    criteria_objects.sort(key=lambda row: row[4])
+
+    predicates = {}
+    for criterion_type_id, criterion_id, content_type_id, content_id, position in criteria_objects:
+        factory = factories.get((criterion_type_id, criterion_id))
+        if factory is None:
+            continue
+        content_model = ContentType.objects.get_for_id(content_type_id).model_class()
+        predicates.setdefault((content_model, content_id), []).append(factory(content_model))
+
+    return predicates
+
+def _get_number_compiler(field):
+    """Returns a compiler for number criteria with given value field.
+    """
+    def _compile_numbers(model, ids):
+        result = {}
+        for id, operator, value in model.objects.filter(pk__in=ids).values_list("id", "operator", field):
+            result[id] = _get_factory(NumberPredicate, field, operator, value)
+        return result
+    return _compile_numbers
+
+def _compile_countries(model, ids):
+    countries = _get_related_ids(model, "countries", ids)
+    result = {}
+    for id, operator in model.objects.filter(pk__in=ids).values_list("id", "operator"):
+        result[id] = _get_factory(CountryPredicate, operator, countries.get(id, set()))
+    return result
+
+def _compile_users(model, ids):
+    users = _get_related_ids(model, "users", ids)
+    result = {}
+    for id in model.objects.filter(pk__in=ids).values_list("id", flat=True):
+        result[id] = _get_factory(UserPredicate, users.get(id, set()))
+    return result
+
+def _get_method_compiler(method_model, field):
+    """Returns a compiler for criteria which refer to shipping resp. payment
+    methods.
+    """
+    def _compile_methods(model, ids):
+        methods = _get_related_ids(model, field, ids)
+        result = {}
+        for id, operator in model.objects.filter(pk__in=ids).values_list("id", "operator"):
+            def factory(content_model, operator=operator, method_ids=methods.get(id, set())):
+                return MethodPredicate(method_model, operator, method_ids,
+                    content_model is method_model)
+            result[id] = factory
+        return result
+    return _compile_methods
+
+def _get_factory(cls, *args):
+    """Returns a predicate factory which doesn't depend on the object the
+    criterion belongs to.
+    """
+    predicate = cls(*args)
+    return lambda content_model: predicate
+
+def _get_related_ids(model, field_name, ids):
+    """Returns the ids of the related objects of the many to many field with
+    given name of the given criteria as dictionary: criterion id -> set of ids.
+    """
+    field = model._meta.get_field(field_name)
+    qn = connection.ops.quote_name
+
+    result = {}
+    if not ids:
+        return result
+
+    cursor = connection.cursor()
+    cursor.execute("SELECT %s, %s FROM %s WHERE %s IN (%s)" % (
+        qn(field.m2m_column_name()), qn(field.m2m_reverse_name()),
+        qn(field.m2m_db_table()), qn(field.m2m_column_name()),
+        ", ".join([str(int(id)) for id in ids])))
+
+    for criterion_id, related_id in cursor.fetchall():
+        result.setdefault(criterion_id, set()).add(related_id)
+    return result
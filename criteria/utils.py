@@ -10,6 +10,8 @@ from lfs.criteria.models.criteria import ShippingMethodCriterion
 from lfs.criteria.models.criteria import UserCriterion
 from lfs.criteria.models.criteria import WidthCriterion
 from lfs.criteria.models.criteria import WeightCriterion
+from lfs.criteria.rules import CriteriaContext
+from lfs.criteria.rules import get_rule_set
 
 def is_valid(request, object, product=None):
     """Returns True if the given object is valid. This is calculated via the 
@@ -18,19 +20,29 @@ def is_valid(request, object, product=None):
     Passed object is an object which can have criteria. At the momemnt are are
     shipping or payment methods.
     """
-    for criterion_object in object.criteria_objects.all():
-        if criterion_object.criterion.is_valid(request, product) == False:
-            return False
-    return True
+    context = CriteriaContext(request, product)
+    return get_rule_set().is_valid(context, object)
     
+def get_valid(request, objects, product=None):
+    """Returns all valid objects of given objects as list.
+
+    All objects are checked against the same context, hence the values of the
+    request are calculated just once.
+    """
+    rule_set = get_rule_set()
+    context = CriteriaContext(request, product)
+    return [object for object in objects if rule_set.is_valid(context, object)]
+
 def get_first_valid(request, objects, product=None):
     """Returns the first valid object of given objects.
     
     Passed objects are objects which can have criteria. At the momemnt these are
     shipping or payment methods.
     """    
+    rule_set = get_rule_set()
+    context = CriteriaContext(request, product)
     for object in objects:
-        if is_valid(request, object, product):
+        if rule_set.is_valid(context, object):
             return object
     return None
     
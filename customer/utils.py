@@ -2,6 +2,9 @@
 from django.core.exceptions import ObjectDoesNotExist
 
 # lfs imports
+from lfs.caching.utils import delete_request_cache
+from lfs.caching.utils import get_request_cache
+from lfs.caching.utils import set_request_cache
 from lfs.customer.models import Customer
 
 def get_or_create_customer(request):
@@ -25,11 +28,19 @@ def create_customer(request):
         customer.user = request.user
 
     customer.save()
+    set_request_cache(request, "customer", customer)
     return customer
 
 def get_customer(request):
     """Returns the customer for the given request (which means for the current 
     logged in user/or the session user).
+
+    The customer is loaded once per request.
+    """
+    return get_request_cache(request, "customer", lambda: _get_customer(request))
+
+def _get_customer(request):
+    """Loads the customer for the given request.
     """
     session_key = request.session.session_key
     user = request.user
@@ -66,4 +77,6 @@ def update_customer_after_login(request):
             user_customer.save()
             session_customer.delete()
     except ObjectDoesNotExist:
-        pass
\ No newline at end of file
+        pass
+
+    delete_request_cache(request, "customer")
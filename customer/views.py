@@ -30,7 +30,7 @@ def login(request, template_name="lfs/customer/login.html"):
 
     It uses Django's standard AuthenticationForm, though.
     """
-    shop = lfs.core.utils.get_default_shop()
+    shop = lfs.core.utils.get_default_shop(request)
     
     # If only anonymous checkout is allowed this view doesn't exists :)
     # if shop.checkout_type == CHECKOUT_TYPE_ANON:
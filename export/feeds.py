@@ -0,0 +1,152 @@
+"""Provides pre-generated export files (feeds).
+
+An export is generated in the background (see the management command
+generate_export_feeds, e.g. called by cron) into a gzipped file within
+FEED_DIR. The file is written under a temporary name and renamed when it is
+complete, hence the served file is never incomplete. As long as a feed file
+exists it is served instead of running the export script within the request.
+The file is deleted as soon as the export itself, its products or its
+category options are changed (see delete_feed), hence the export is run
+within the request again until the next generation. A generation which has
+been running meanwhile discards its file, as it could miss the changes.
+
+The rows of the generic export are cached per product (see
+lfs.export.utils.get_rows), hence a regeneration just renders the rows of the
+products which have been changed since the last run. This needs a cache
+backend which is shared between the processes, e.g. memcached. For the
+same reason an interrupted generation doesn't start from scratch: the rows
+which have been rendered already are taken from the cache.
+"""
+# python imports
+from email.Utils import formatdate
+import gzip
+import os
+import tempfile
+
+# django imports
+from django.http import HttpRequest
+from django.http import HttpResponse
+from django.http import HttpResponseNotModified
+from django.views.static import was_modified_since
+
+# lfs imports
+import lfs.core.utils
+from lfs.caching.settings import FEED_NAMESPACE
+from lfs.caching.utils import get_generations
+from lfs.caching.utils import invalidate_namespaces
+from lfs.export.settings import FEED_DIR
+
+# The size of the blocks which are read from a feed file.
+BLOCK_SIZE = 64 * 1024
+
+def get_feed_path(export):
+    """Returns the path of the feed file of the given export.
+    """
+    return os.path.join(FEED_DIR, "%s.csv.gz" % export.slug)
+
+def generate_feed(export):
+    """Runs the script of the given export and writes the content of its
+    response into the feed file of the export. Returns the path of the file
+    or None if the feed has been deleted during the generation (see
+    delete_feed). In this case the file is discarded.
+
+    The script is called with an empty request.
+    """
+    if not os.path.isdir(FEED_DIR):
+        os.makedirs(FEED_DIR)
+
+    namespace = FEED_NAMESPACE % export.id
+    generation = get_generations([namespace])[namespace]
+
+    module = lfs.core.utils.import_module(export.script.module)
+    response = getattr(module, export.script.method)(HttpRequest(), export)
+
+    path = get_feed_path(export)
+    fd, temp_path = tempfile.mkstemp(prefix=".%s-" % export.slug, dir=FEED_DIR)
+    try:
+        fileobj = os.fdopen(fd, "wb")
+        try:
+            file = gzip.GzipFile(filename="", mode="wb", fileobj=fileobj)
+            for content in response:
+                file.write(content)
+            file.close()
+        finally:
+            fileobj.close()
+        os.chmod(temp_path, 0644)
+
+        if get_generations([namespace])[namespace] != generation:
+            os.remove(temp_path)
+            return None
+        os.rename(temp_path, path)
+    except:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    # delete_feed could have been called between the check and the rename.
+    # As it increments the generation before it deletes the file, the file
+    # is either deleted by it or here.
+    if get_generations([namespace])[namespace] != generation:
+        delete_feed(export)
+        return None
+
+    return path
+
+def delete_feed(export):
+    """Deletes the feed file of the given export, if there is one. A running
+    generation of the feed discards its file (see generate_feed).
+    """
+    invalidate_namespaces(FEED_NAMESPACE % export.id)
+    try:
+        os.remove(get_feed_path(export))
+    except OSError:
+        pass
+
+def serve_feed(request, export):
+    """Returns a response with the feed file of the given export or None if
+    there is none.
+
+    The response contains an ETag and a Last-Modified header. If the client
+    has the current file already the response is 304 (Not Modified). If the
+    client accepts gzip the file is sent as it is, otherwise uncompressed.
+    """
+    path = get_feed_path(export)
+    try:
+        file = open(path, "rb")
+    except IOError:
+        return None
+
+    stat = os.fstat(file.fileno())
+    etag = '"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if (if_none_match is not None and if_none_match == etag) or \
+       (if_none_match is None and not was_modified_since(
+            request.META.get("HTTP_IF_MODIFIED_SINCE"), stat.st_mtime, stat.st_size)):
+        file.close()
+        return HttpResponseNotModified()
+
+    if "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", ""):
+        response = HttpResponse(_read_blocks(file, file), mimetype="text/csv")
+        response["Content-Encoding"] = "gzip"
+        response["Content-Length"] = str(stat.st_size)
+    else:
+        response = HttpResponse(_read_blocks(gzip.GzipFile(fileobj=file), file), mimetype="text/csv")
+
+    response["Content-Disposition"] = "attachment; filename=%s.csv" % export.name
+    response["ETag"] = etag
+    response["Last-Modified"] = formatdate(stat.st_mtime, usegmt=True)
+    return response
+
+def _read_blocks(reader, file):
+    """Returns a generator over the blocks which are read by the given reader
+    from the given file. Closes the file at the end.
+    """
+    try:
+        while True:
+            block = reader.read(BLOCK_SIZE)
+            if not block:
+                break
+            yield block
+    finally:
+        file.close()
@@ -5,20 +5,26 @@ import csv
 from django.http import HttpResponse
 
 # lfs imports
+from lfs.export.utils import get_rows
 from lfs.export.utils import register
+from lfs.export.utils import stream_csv
 from lfs.export.models import Export
 
 def export(request, export):
-    """Generic export method.
+    """Generic export method. The rows are streamed while the products are
+    loaded in chunks (see lfs.export.utils.get_rows).
     """
-    response = HttpResponse(mimetype="text/csv")
-    response["Content-Disposition"] = "attachment; filename=%s.csv" % export.name
-    writer = csv.writer(response, delimiter=";", quotechar='"', quoting=csv.QUOTE_ALL)
+    rows = get_rows(export, get_row)
 
-    for product in export.get_products():        
-        writer.writerow((
-            product.get_name().encode("utf-8"),
-        ))
+    response = HttpResponse(
+        stream_csv(rows, delimiter=";", quotechar='"', quoting=csv.QUOTE_ALL),
+        mimetype="text/csv")
+    response["Content-Disposition"] = "attachment; filename=%s.csv" % export.name
     return response
-    
+
+def get_row(product):
+    """Returns the row of the given product.
+    """
+    return (product.get_name().encode("utf-8"), )
+
 register(export, "Generic")
\ No newline at end of file
@@ -0,0 +1,41 @@
+# python imports
+from optparse import make_option
+
+# django imports
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+# lfs imports
+from lfs.caching.settings import EXPORT_NAMESPACE
+from lfs.caching.utils import invalidate_namespaces
+from lfs.export.feeds import generate_feed
+from lfs.export.models import Export
+
+class Command(BaseCommand):
+    """Generates the feed files of the exports with given slugs (default: all
+    exports), see lfs.export.feeds. This is meant to be called regularly, e.g.
+    by cron.
+    """
+    option_list = BaseCommand.option_list + (
+        make_option("--full", action="store_true", dest="full", default=False,
+            help="Renders all rows again instead of just the changed ones."),
+    )
+    help = "Generates the feed files of exports."
+    args = "[slug ...]"
+
+    def handle(self, *slugs, **options):
+        exports = Export.objects.all()
+        if slugs:
+            exports = exports.filter(slug__in=slugs)
+            if len(exports) != len(slugs):
+                raise CommandError("Unknown export: %s" % ", ".join(
+                    set(slugs) - set([e.slug for e in exports])))
+
+        for export in exports:
+            if options.get("full"):
+                invalidate_namespaces(EXPORT_NAMESPACE % export.id)
+            path = generate_feed(export)
+            if path is None:
+                print "%s: changed during the generation, discarded" % export.slug
+            else:
+                print "%s: %s" % (export.slug, path)
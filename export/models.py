@@ -32,20 +32,11 @@ class Export(models.Model):
             "lfs_export", kwargs={ "export_id" : self.id })
 
     def get_products(self):
-        """Returns selected products. Takes variant options into account.
+        """Returns a generator over the selected products. Takes variant
+        options into account (see lfs.export.utils.get_products).
         """
         import lfs.export.utils
-        products = []
-
-        for product in self.products.all():
-            if product.is_product_with_variants():
-                variants = lfs.export.utils.get_variants(product, self)
-                if variants:
-                    products.extend(variants)
-            else:
-                products.append(product)
-
-        return products
+        return lfs.export.utils.get_products(self)
 
 class Script(models.Model):
     """Represents an export script for an Export
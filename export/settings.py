@@ -1,4 +1,8 @@
+# python imports
+import os
+
 # django imports
+from django.conf import settings
 from django.utils.translation import ugettext_lazy as _
 
 CATEGORY_VARIANTS_NONE = 0
@@ -11,4 +15,15 @@ CATEGORY_VARIANTS_CHOICES = (
     (CATEGORY_VARIANTS_DEFAULT, _(u"Default")),
     (CATEGORY_VARIANTS_CHEAPEST, _(u"Cheapest")),
     (CATEGORY_VARIANTS_ALL, _(u"All")),
-)
\ No newline at end of file
+)
+
+# The amount of products which are loaded (and written) at once by an export.
+CHUNK_SIZE = getattr(settings, "LFS_EXPORT_CHUNK_SIZE", 500)
+
+# The directory of the pre-generated export files (see lfs.export.feeds).
+FEED_DIR = getattr(settings, "LFS_EXPORT_FEED_DIR",
+    os.path.join(settings.MEDIA_ROOT, "exports"))
+
+# The time in seconds the rendered rows of an export are cached. As long as a
+# row is cached it is not rendered again, unless the product has been changed.
+ROW_CACHE_TIMEOUT = getattr(settings, "LFS_EXPORT_ROW_CACHE_TIMEOUT", 7 * 24 * 60 * 60)
@@ -0,0 +1,328 @@
+# python imports
+import gzip
+import os
+import shutil
+import tempfile
+
+# django imports
+from django.http import HttpResponse
+from django.test import TestCase
+
+# lfs imports
+import lfs.export.feeds
+import lfs.export.utils
+from lfs.catalog.models import Category
+from lfs.catalog.models import Product
+from lfs.catalog.settings import PRODUCT_WITH_VARIANTS
+from lfs.catalog.settings import VARIANT
+from lfs.export.models import CategoryOption
+from lfs.export.models import Export
+from lfs.export.models import Script
+from lfs.export.settings import CATEGORY_VARIANTS_NONE
+from lfs.export.settings import CATEGORY_VARIANTS_DEFAULT
+from lfs.export.settings import CATEGORY_VARIANTS_CHEAPEST
+from lfs.export.settings import CATEGORY_VARIANTS_ALL
+from lfs.manage.views.export import _get_category_states
+from lfs.tax.models import Tax
+from lfs.tests.utils import RequestFactory
+
+class ExportTestCase(TestCase):
+    """Tests the products of an export.
+    """
+    def setUp(self):
+        """
+        """
+        tax = Tax.objects.create(rate=19)
+        script = Script.objects.create(
+            module="lfs.export.generic", method="export", name="Generic")
+        self.export = Export.objects.create(
+            name="Export", slug="export", script=script)
+
+        self.c1 = Category.objects.create(name="Category 1", slug="category-1")
+        self.c11 = Category.objects.create(name="Category 11", slug="category-11", parent=self.c1)
+        self.c2 = Category.objects.create(name="Category 2", slug="category-2")
+
+        # Standard products and products with variants alternately, hence
+        # the products with variants are spread over several chunks.
+        categories = [self.c1, self.c11, self.c2, self.c2, self.c1, self.c11]
+        for i, category in enumerate(categories):
+            product = Product.objects.create(
+                name="Product %s" % i, slug="product-%s" % i, price=10.0 + i,
+                tax=tax, active=True)
+            category.products.add(product)
+            self.export.products.add(product)
+
+            if i % 2 == 0:
+                continue
+
+            product.sub_type = PRODUCT_WITH_VARIANTS
+            product.save()
+
+            # The cheapest variant is not the first one, the last one is
+            # inactive.
+            for j, price in enumerate((3.0, 1.0, 2.0, 0.5)):
+                Product.objects.create(
+                    name="Variant %s-%s" % (i, j), slug="variant-%s-%s" % (i, j),
+                    parent=product, sub_type=VARIANT, price=price,
+                    active_price=True, variant_position=j, active=j < 3)
+
+            if i == 3:
+                product.default_variant = Product.objects.get(slug="variant-3-2")
+                product.save()
+
+        CategoryOption.objects.create(export=self.export, category=self.c1,
+            variants_option=CATEGORY_VARIANTS_CHEAPEST)
+
+    def test_get_products(self):
+        """Tests that the products which are loaded in chunks are the same as
+        the ones of get_baseline_products.
+        """
+        for variants_option in (CATEGORY_VARIANTS_NONE, CATEGORY_VARIANTS_DEFAULT,
+                                CATEGORY_VARIANTS_CHEAPEST, CATEGORY_VARIANTS_ALL):
+
+            # The option of the export is taken for category 2, the one of
+            # category 11 overrides the one of its parent.
+            self.export.variants_option = variants_option
+            self.export.save()
+            CategoryOption.objects.filter(export=self.export, category=self.c11).delete()
+            CategoryOption.objects.create(export=self.export, category=self.c11,
+                variants_option=variants_option)
+
+            expected = [p.slug for p in get_baseline_products(self.export)]
+            for chunk_size in (1, 2, 4, 100):
+                products = lfs.export.utils.get_products(self.export, chunk_size)
+                self.assertEqual(sorted([p.slug for p in products]), sorted(expected))
+
+    def test_get_products_all(self):
+        """Tests the products if all variants are exported.
+        """
+        self.export.variants_option = CATEGORY_VARIANTS_ALL
+        self.export.save()
+        CategoryOption.objects.filter(export=self.export).delete()
+
+        products = lfs.export.utils.get_products(self.export, 2)
+        self.assertEqual([p.slug for p in products], [
+            "product-0", "variant-1-0", "variant-1-1", "variant-1-2",
+            "product-2", "variant-3-0", "variant-3-1", "variant-3-2",
+            "product-4", "variant-5-0", "variant-5-1", "variant-5-2"])
+
+class FeedsTestCase(TestCase):
+    """Tests the rows and the pre-generated files of an export.
+    """
+    def setUp(self):
+        """
+        """
+        script = Script.objects.create(
+            module="lfs.export.generic", method="export", name="Generic")
+        self.export = Export.objects.create(
+            name="Export", slug="export", script=script)
+
+        self.p0 = Product.objects.create(name="Product 0", slug="product-0", price=1.0, active=True)
+        self.p1 = Product.objects.create(name="Product 1", slug="product-1", price=2.0, active=True)
+        self.export.products.add(self.p0, self.p1)
+
+        self.old_feed_dir = lfs.export.feeds.FEED_DIR
+        lfs.export.feeds.FEED_DIR = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """
+        """
+        shutil.rmtree(lfs.export.feeds.FEED_DIR)
+        lfs.export.feeds.FEED_DIR = self.old_feed_dir
+
+    def test_get_rows(self):
+        """Tests that just the rows of changed products are rendered again.
+        """
+        rendered = []
+        def render(product):
+            rendered.append(product.slug)
+            return (product.name, )
+
+        rows = list(lfs.export.utils.get_rows(self.export, render, 1))
+        self.assertEqual(rows, [("Product 0", ), ("Product 1", )])
+        self.assertEqual(rendered, ["product-0", "product-1"])
+
+        # The rows are cached
+        rows = list(lfs.export.utils.get_rows(self.export, render, 1))
+        self.assertEqual(rows, [("Product 0", ), ("Product 1", )])
+        self.assertEqual(rendered, ["product-0", "product-1"])
+
+        # Just the changed product is rendered again
+        self.p1.name = "Product 1 changed"
+        self.p1.save()
+        rows = list(lfs.export.utils.get_rows(self.export, render, 1))
+        self.assertEqual(rows, [("Product 0", ), ("Product 1 changed", )])
+        self.assertEqual(rendered, ["product-0", "product-1", "product-1"])
+
+        # All rows are rendered again if the export has been changed
+        self.export.save()
+        list(lfs.export.utils.get_rows(self.export, render, 1))
+        self.assertEqual(rendered, ["product-0", "product-1", "product-1",
+                                    "product-0", "product-1"])
+
+    def test_generate_feed(self):
+        """Tests the generation of a feed file.
+        """
+        path = lfs.export.feeds.generate_feed(self.export)
+        self.assertEqual(path, lfs.export.feeds.get_feed_path(self.export))
+        self.assertEqual(gzip.open(path).read(), '"Product 0"\r\n"Product 1"\r\n')
+
+        lfs.export.feeds.delete_feed(self.export)
+        self.failIf(os.path.exists(path))
+
+    def test_generate_feed_deleted(self):
+        """Tests that a feed which is deleted during its generation is
+        discarded.
+        """
+        self.export.script = Script.objects.create(
+            module="lfs.export.tests", method="deleting_export", name="Deleting")
+        self.export.save()
+
+        self.assertEqual(lfs.export.feeds.generate_feed(self.export), None)
+        self.assertEqual(os.listdir(lfs.export.feeds.FEED_DIR), [])
+
+    def test_serve_feed(self):
+        """Tests the serving of a feed file.
+        """
+        rf = RequestFactory()
+
+        # There is no feed file yet
+        request = rf.get("/")
+        self.assertEqual(lfs.export.feeds.serve_feed(request, self.export), None)
+
+        path = lfs.export.feeds.generate_feed(self.export)
+
+        # The gzipped file is sent as it is ...
+        request = rf.get("/", HTTP_ACCEPT_ENCODING="gzip, deflate")
+        response = lfs.export.feeds.serve_feed(request, self.export)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Length"], str(os.path.getsize(path)))
+        self.assertEqual(response.content, open(path, "rb").read())
+
+        # ... or uncompressed
+        request = rf.get("/")
+        response = lfs.export.feeds.serve_feed(request, self.export)
+        self.assertEqual(response.status_code, 200)
+        self.failIf(response.has_header("Content-Encoding"))
+        self.assertEqual(response.content, '"Product 0"\r\n"Product 1"\r\n')
+
+        # The client has the current file already
+        request = rf.get("/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(lfs.export.feeds.serve_feed(request, self.export).status_code, 304)
+
+        request = rf.get("/", HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(lfs.export.feeds.serve_feed(request, self.export).status_code, 304)
+
+        request = rf.get("/", HTTP_IF_NONE_MATCH='"0-0"')
+        self.assertEqual(lfs.export.feeds.serve_feed(request, self.export).status_code, 200)
+
+class CategoryStatesTestCase(TestCase):
+    """Tests the states of the categories within the management of an export.
+    """
+    def setUp(self):
+        """
+        """
+        script = Script.objects.create(
+            module="lfs.export.generic", method="export", name="Generic")
+        self.export = Export.objects.create(
+            name="Export", slug="export", script=script)
+
+        self.c1 = Category.objects.create(name="Category 1", slug="category-1")
+        self.c11 = Category.objects.create(name="Category 11", slug="category-11", parent=self.c1)
+        self.c111 = Category.objects.create(name="Category 111", slug="category-111", parent=self.c11)
+        self.c12 = Category.objects.create(name="Category 12", slug="category-12", parent=self.c1)
+        self.c2 = Category.objects.create(name="Category 2", slug="category-2")
+        self.c3 = Category.objects.create(name="Category 3", slug="category-3")
+
+        self.p1 = Product.objects.create(name="Product 1", slug="product-1", active=True)
+        self.p2 = Product.objects.create(name="Product 2", slug="product-2", active=True)
+        self.p3 = Product.objects.create(name="Product 3", slug="product-3", active=False)
+        self.p4 = Product.objects.create(name="Product 4", slug="product-4",
+            sub_type=PRODUCT_WITH_VARIANTS, active=True)
+        self.v1 = Product.objects.create(name="Variant 1", slug="variant-1",
+            sub_type=VARIANT, parent=self.p4, active=True)
+
+        self.c111.products.add(self.p1)
+        self.c12.products.add(self.p2, self.p3)
+        self.c3.products.add(self.p4, self.v1)
+
+    def test_get_category_states(self):
+        """Tests the propagation of the states through the category tree.
+        Inactive products and variants are not taken into account.
+        """
+        self.export.products.add(self.p1, self.p4)
+        states = _get_category_states(self.export)
+
+        self.assertEqual(states[self.c111.id], (True, "full"))
+        self.assertEqual(states[self.c11.id], (True, "full"))
+        self.assertEqual(states[self.c12.id], (False, ""))
+        self.assertEqual(states[self.c1.id], (True, "half"))
+        self.assertEqual(states[self.c2.id], (False, ""))
+        self.assertEqual(states[self.c3.id], (True, "full"))
+
+        # All active products of category 1 are selected now
+        self.export.products.add(self.p2)
+        states = _get_category_states(self.export)
+        self.assertEqual(states[self.c12.id], (True, "full"))
+        self.assertEqual(states[self.c1.id], (True, "full"))
+
+        # The passed selected products are taken
+        states = _get_category_states(self.export, set([self.p2.id]))
+        self.assertEqual(states[self.c111.id], (False, ""))
+        self.assertEqual(states[self.c11.id], (False, ""))
+        self.assertEqual(states[self.c12.id], (True, "full"))
+        self.assertEqual(states[self.c1.id], (True, "half"))
+        self.assertEqual(states[self.c3.id], (False, ""))
+
+        self.export.products.clear()
+        states = _get_category_states(self.export)
+        for category in Category.objects.all():
+            self.assertEqual(states[category.id], (False, ""))
+
+def deleting_export(request, export):
+    """An export script which deletes the feed of the export meanwhile, like
+    a change of the export during a generation.
+    """
+    lfs.export.feeds.delete_feed(export)
+    return HttpResponse("")
+
+def get_baseline_products(export):
+    """Returns the products of the given export like the former
+    implementation, which loaded the variants option and the variants per
+    product.
+    """
+    products = []
+    for product in export.products.all():
+        if not product.is_product_with_variants():
+            products.append(product)
+            continue
+
+        variants_option = None
+        try:
+            category = product.get_categories()[0]
+        except IndexError:
+            category = None
+        while category:
+            try:
+                variants_option = CategoryOption.objects.get(
+                    export=export, category=category).variants_option
+            except CategoryOption.DoesNotExist:
+                category = category.parent
+            else:
+                break
+        if variants_option is None:
+            variants_option = export.variants_option
+
+        if variants_option == CATEGORY_VARIANTS_DEFAULT:
+            if product.get_default_variant():
+                products.append(product.get_default_variant())
+        elif variants_option == CATEGORY_VARIANTS_ALL:
+            products.extend(product.get_variants())
+        elif variants_option == CATEGORY_VARIANTS_CHEAPEST:
+            variants = list(product.get_variants())
+            variants.sort(lambda a, b: cmp(a.get_price(), b.get_price()))
+            if variants:
+                products.append(variants[0])
+
+    return products
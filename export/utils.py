@@ -1,11 +1,22 @@
+# python imports
+import csv
+from cStringIO import StringIO
+
+# django imports
+from django.db import connection
+
 # lfs imports
-import lfs.catalog.utils
+from lfs.catalog.models import Category
+from lfs.catalog.models import Product
+from lfs.catalog.prices import get_price_records
 from lfs.export.models import CategoryOption
 from lfs.export.models import Export
 from lfs.export.models import Script
 from lfs.export.settings import CATEGORY_VARIANTS_DEFAULT
 from lfs.export.settings import CATEGORY_VARIANTS_CHEAPEST
 from lfs.export.settings import CATEGORY_VARIANTS_ALL
+from lfs.export.settings import CHUNK_SIZE
+from lfs.export.settings import ROW_CACHE_TIMEOUT
 
 def register(method, name):
     """Registers a new export logic.
@@ -24,42 +35,184 @@ def register(method, name):
         # Fail silently
         pass
 
-def get_variants_option(export, product):
-    """Returns the variants option for given category or None.
+class VariantsOptions(object):
+    """The variants options of the categories of an export. The options and
+    the category tree are loaded with one query each.
     """
-    try:
-        category = product.get_categories()[0]
-    except IndexError:
-        return None
+    def __init__(self, export):
+        self.export = export
+        self.options = dict(CategoryOption.objects.filter(
+            export=export).values_list("category", "variants_option"))
+        self.parents = dict(Category.objects.values_list("id", "parent"))
 
-    while category:
-        try:
-            category_option = CategoryOption.objects.get(
-                export=export, category=category)
-        except:
-            category = category.parent
-        else:
-            return category_option.variants_option
-    return None
+    def get(self, category_id):
+        """Returns the variants option of the category with given id. This is
+        the option of the category or of its nearest parent which has one,
+        otherwise the option of the export.
+        """
+        while category_id is not None:
+            variants_option = self.options.get(category_id)
+            if variants_option is not None:
+                return variants_option
+            category_id = self.parents.get(category_id)
+        return self.export.variants_option
 
-def get_variants(product, export):
-    """Returns the variants for given product and export.
+def get_products(export, chunk_size=CHUNK_SIZE):
+    """Returns a generator over the selected products of the given export.
+    Takes variant options into account.
     """
-    variants_option = get_variants_option(export, product)
-    if variants_option is None:
-        variants_option = export.variants_option
-    
-    if variants_option == CATEGORY_VARIANTS_DEFAULT:
-        if product.get_default_variant():
-            return [product.get_default_variant()]
-        else:
-            return []
-    elif variants_option == CATEGORY_VARIANTS_ALL:
-        return product.get_variants()
-    elif variants_option == CATEGORY_VARIANTS_CHEAPEST:
-        variants = list(product.get_variants())
-        variants.sort(lambda a, b: cmp(a.get_price(), b.get_price()))
-        try:
-            return [variants[0]]
-        except IndexError:
-            return []
\ No newline at end of file
+    for chunk in get_product_chunks(export, chunk_size):
+        for product in chunk:
+            yield product
+
+def get_product_chunks(export, chunk_size=CHUNK_SIZE):
+    """Returns a generator over the selected products of the given export in
+    lists of given size. Takes variant options into account.
+
+    The products are loaded ordered by id. The variants, categories and price
+    records of every chunk are loaded with a few queries, hence the used
+    memory doesn't depend on the amount of products.
+    """
+    variants_options = VariantsOptions(export)
+    products = export.products.order_by("id")
+
+    last_id = 0
+    while True:
+        chunk = list(products.filter(pk__gt=last_id)[:chunk_size])
+        if not chunk:
+            break
+        last_id = chunk[-1].id
+
+        yield _get_chunk(chunk, variants_options)
+
+def get_rows(export, render, chunk_size=CHUNK_SIZE):
+    """Returns a generator over the rows of the given export. render is called
+    with a product and returns its row.
+
+    The rows are cached until the product or the export has been changed,
+    hence a regenerated export just renders the rows of the changed products
+    (see lfs.export.feeds). Rows must be picklable.
+    """
+    from lfs.caching.settings import EXPORT_NAMESPACE
+    from lfs.caching.settings import PRODUCT_NAMESPACE
+    from lfs.caching.settings import TAX_NAMESPACE
+    from lfs.caching.utils import get_many_cache
+    from lfs.caching.utils import set_cache
+
+    for chunk in get_product_chunks(export, chunk_size):
+        keys = {}
+        for product in chunk:
+            keys[product.id] = ("export-row-%s-%s" % (export.id, product.id), [
+                EXPORT_NAMESPACE % export.id,
+                PRODUCT_NAMESPACE % (product.parent_id or product.id),
+                TAX_NAMESPACE])
+
+        cached = get_many_cache(keys.values())
+        for product in chunk:
+            key, namespaces = keys[product.id]
+            row = cached.get(key)
+            if row is None:
+                row = render(product)
+                set_cache(key, row, namespaces, ROW_CACHE_TIMEOUT)
+            yield row
+
+def stream_csv(rows, **kwargs):
+    """Returns a generator which writes the given rows as CSV (kwargs are
+    passed to the csv writer) and yields the output of every chunk of rows.
+    This can be passed to a HttpResponse to stream an export.
+    """
+    buffer = StringIO()
+    writer = csv.writer(buffer, **kwargs)
+
+    for i, row in enumerate(rows):
+        writer.writerow(row)
+        if (i + 1) % CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+def _get_chunk(products, variants_options):
+    """Returns the given products, whereby products with variants are
+    replaced by their variants according to the variants options.
+    """
+    parents = [p for p in products if p.is_product_with_variants()]
+    if not parents:
+        return products
+
+    parent_ids = [p.id for p in parents]
+    categories = _get_first_category_ids(parent_ids)
+
+    # All active variants, ordered by position, and the selected default
+    # variants, which are taken even if they are inactive.
+    variants = {}
+    cache_name = Product._meta.get_field("parent").get_cache_name()
+    for variant in Product.objects.filter(parent__in=parent_ids, active=True).order_by("variant_position"):
+        variants.setdefault(variant.parent_id, []).append(variant)
+
+    default_ids = [p.default_variant_id for p in parents if p.default_variant_id]
+    default_variants = Product.objects.in_bulk(default_ids)
+
+    options = {}
+    cheapest = []
+    for product in parents:
+        options[product.id] = variants_options.get(categories.get(product.id))
+        if options[product.id] == CATEGORY_VARIANTS_CHEAPEST:
+            cheapest.extend(variants.get(product.id, []))
+
+    records = get_price_records(cheapest)
+
+    result = []
+    for product in products:
+        if not product.is_product_with_variants():
+            result.append(product)
+            continue
+
+        product_variants = variants.get(product.id, [])
+        for variant in product_variants:
+            setattr(variant, cache_name, product)
+
+        variants_option = options[product.id]
+        if variants_option == CATEGORY_VARIANTS_DEFAULT:
+            if product.default_variant_id:
+                variant = default_variants.get(product.default_variant_id)
+            elif product_variants:
+                # The first active variant (see Product.get_default_variant)
+                variant = min(product_variants, key=lambda v: v.name)
+            else:
+                variant = None
+            if variant is not None:
+                setattr(variant, cache_name, product)
+                result.append(variant)
+        elif variants_option == CATEGORY_VARIANTS_ALL:
+            result.extend(product_variants)
+        elif variants_option == CATEGORY_VARIANTS_CHEAPEST:
+            if product_variants:
+                result.append(min(product_variants,
+                    key=lambda v: records[v.id]["price_gross"]))
+
+    return result
+
+def _get_first_category_ids(product_ids):
+    """Returns the id of the first category (see Product.get_categories) of
+    the products with given ids as dictionary: product id -> category id.
+    """
+    field = Category._meta.get_field("products")
+    qn = connection.ops.quote_name
+
+    cursor = connection.cursor()
+    cursor.execute("""SELECT m.%s, m.%s
+                      FROM %s m
+                      INNER JOIN %s c ON c.id = m.%s
+                      WHERE m.%s IN (%s)
+                      ORDER BY c.position""" % (
+        qn(field.m2m_reverse_name()), qn(field.m2m_column_name()),
+        qn(field.m2m_db_table()), qn(Category._meta.db_table),
+        qn(field.m2m_column_name()), qn(field.m2m_reverse_name()),
+        ", ".join([str(int(id)) for id in product_ids])))
+
+    result = {}
+    for product_id, category_id in cursor.fetchall():
+        result.setdefault(product_id, category_id)
+    return result
@@ -85,6 +85,7 @@ urlpatterns += patterns('lfs.manage.views.product.variants',
     url(r'^change-property-position$', "change_property_position"),
     url(r'^update-variants/(?P<product_id>\d*)$', "update_variants", name="lfs_manage_update_variants"),
     url(r'^add-variants/(?P<product_id>\d*)$', "add_variants", name="lfs_add_variants"),
+    url(r'^add-variants-progress/(?P<product_id>\d*)$', "add_variants_progress", name="lfs_add_variants_progress"),
     url(r'^edit-sub-type/(?P<product_id>\d*)$', "edit_sub_type", name="lfs_edit_sub_type"),
 )
 
@@ -326,5 +327,6 @@ urlpatterns += patterns('lfs.manage.views.utils',
     url(r'^clear-cache$', "clear_cache", name="lfs_clear_cache"),
     url(r'^set-category-levels$', "set_category_levels", name="lfs_set_category_levels"),
     url(r'^update-effective-price$', "update_effective_price", name="lfs_update_effective_price"),
+    url(r'^update-search-index$', "update_search_index", name="lfs_update_search_index"),
 )
 
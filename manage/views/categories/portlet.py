@@ -2,9 +2,11 @@
 from django.contrib.auth.decorators import permission_required
 from django.template import RequestContext
 from django.template.loader import render_to_string
-from django.core.cache import cache
 
 # lfs imports
+from lfs.caching.settings import CATEGORIES_NAMESPACE
+from lfs.caching.utils import get_cache
+from lfs.caching.utils import set_cache
 from lfs.catalog.models import Category
 
 @permission_required("manage_shop", login_url="/login/")
@@ -13,7 +15,7 @@ def manage_categories_portlet(request, category_id,
     """Returns a management portlet of all categories.
     """
     cache_key = "manage-category-portlet"
-    result = cache.get(cache_key)
+    result = get_cache(cache_key, [CATEGORIES_NAMESPACE])
     if result is not None:
         return result
 
@@ -34,7 +36,7 @@ def manage_categories_portlet(request, category_id,
         "category_id" : category_id,
     }))
 
-    cache.set(cache_key, result)
+    set_cache(cache_key, result, [CATEGORIES_NAMESPACE])
     return result
 
 @permission_required("manage_shop", login_url="/login/")
@@ -1,5 +1,6 @@
 # django imports
 from django.core.urlresolvers import reverse
+from django.db import connection
 from django.forms import ModelForm
 from django.http import HttpResponse
 from django.http import HttpResponseRedirect
@@ -14,11 +15,14 @@ from django.utils.translation import ugettext_lazy as _
 import lfs.core.utils
 from lfs.catalog.settings import STANDARD_PRODUCT
 from lfs.catalog.settings import PRODUCT_WITH_VARIANTS
+from lfs.catalog.settings import VARIANT
 from lfs.catalog.models import Category
 from lfs.catalog.models import Product
 from lfs.core.utils import LazyEncoder
 from lfs.export.models import Export
 from lfs.export.models import CategoryOption
+from lfs.export.feeds import delete_feed
+from lfs.export.feeds import serve_feed
 from lfs.export.settings import CATEGORY_VARIANTS_CHOICES
 from lfs.export.settings import CATEGORY_VARIANTS_NONE
 
@@ -33,20 +37,15 @@ def manage_export(request, export_id, template_name="manage/export/export.html")
     """The main view to display exports.
     """
     export = Export.objects.get(pk=export_id)
+    states = _get_category_states(export)
+    variants_options = _get_variants_options(export)
 
     categories = []
     for category in Category.objects.filter(parent=None):
 
         # Options
         options = []
-
-        try:
-            category_option = CategoryOption.objects.get(export = export, category = category)
-        except CategoryOption.DoesNotExist:
-            variants_option = None
-        else:
-            variants_option = category_option.variants_option
-
+        variants_option = variants_options.get(category.id)
         for option in CATEGORY_VARIANTS_CHOICES:
             options.append({
                 "name" : option[1],
@@ -55,7 +54,7 @@ def manage_export(request, export_id, template_name="manage/export/export.html")
             })
 
         # Checking state
-        checked, klass = _get_category_state(export, category)
+        checked, klass = states[category.id]
 
         categories.append({
             "id" : category.id,
@@ -98,7 +97,7 @@ def export_inline(request, export_id, category_id,
     """Returns categories and products for given export id and category id.
     """
     export = Export.objects.get(pk=export_id)
-    selected_products = export.products.all()
+    selected_products = set(export.products.values_list("id", flat=True))
 
     products = []
     for product in Product.objects.filter(sub_type__in=[STANDARD_PRODUCT, PRODUCT_WITH_VARIANTS], categories__in=[category_id], active=True):
@@ -111,23 +110,19 @@ def export_inline(request, export_id, category_id,
         products.append({
             "id" : product.id,
             "name" : product.get_name(),
-            "checked" : product in selected_products,
+            "checked" : product.id in selected_products,
             "type" : type,
         })
 
+    states = _get_category_states(export, selected_products)
+    variants_options = _get_variants_options(export)
+
     categories = []
     for category in Category.objects.filter(parent=category_id):
 
         # Options
         options = []
-
-        try:
-            category_option = CategoryOption.objects.get(export = export, category = category)
-        except CategoryOption.DoesNotExist:
-            variants_option = None
-        else:
-            variants_option = category_option.variants_option
-
+        variants_option = variants_options.get(category.id)
         for option in CATEGORY_VARIANTS_CHOICES:
             options.append({
                 "name" : option[1],
@@ -135,7 +130,7 @@ def export_inline(request, export_id, category_id,
                 "selected" : option[0] == variants_option,
             })
 
-        checked, klass = _get_category_state(export, category)
+        checked, klass = states[category.id]
 
         categories.append({
             "id" : category.id,
@@ -211,6 +206,9 @@ def edit_category(request, export_id, category_id):
         for product in category.get_all_products():
             export.products.remove(product)
 
+    # The feed doesn't contain the changed products yet.
+    delete_feed(export)
+
     return HttpResponse("")
 
 def edit_product(request, export_id, product_id):
@@ -224,12 +222,19 @@ def edit_product(request, export_id, product_id):
     else:
         export.products.remove(product)
 
+    delete_feed(export)
+
     return HttpResponse("")
 
 def export(request, slug):
-    """Exports the export with passed export id.
+    """Exports the export with passed export id. Serves the pre-generated file
+    of the export if there is one (see lfs.export.feeds).
     """
     export = get_object_or_404(Export, slug=slug)
+    response = serve_feed(request, export)
+    if response is not None:
+        return response
+
     module = lfs.core.utils.import_module(export.script.module)
     return getattr(module, export.script.method)(request, export)
 
@@ -239,7 +244,7 @@ def category_state(request, export_id, category_id):
     """
     export = Export.objects.get(pk=export_id)
     category = Category.objects.get(pk=category_id)
-    checked, klass = _get_category_state(export, category)
+    checked, klass = _get_category_states(export)[category.id]
 
     if klass == "half":
         result = "(1/2)"
@@ -316,28 +321,75 @@ def update_data(request, export_id):
 
     return HttpResponse(result)
 
-def _get_category_state(export, category):
-    """Calculates the state for given category for given export.
-    """
-    selected_products = export.products.all()
-
-    found = False
-    not_found = False
+def _get_category_states(export, selected_products=None):
+    """Calculates the states of all categories for given export as
+    dictionary: category id -> (checked, klass). A category is "full" if all
+    products of it and its sub categories are selected and "half" if just some
+    of them are.
 
-    for product in category.get_all_products():
-        if product in selected_products:
-            found = True
+    The selected products, the products of all categories and the category
+    tree are loaded with one query each. selected_products are the ids of the
+    selected products, if they are already known.
+    """
+    if selected_products is None:
+        selected_products = set(export.products.values_list("id", flat=True))
+
+    children = {}
+    for id, parent_id in Category.objects.values_list("id", "parent"):
+        children.setdefault(parent_id, []).append(id)
+
+    # The categories which contain (directly) selected resp. not selected
+    # products
+    found = set()
+    not_found = set()
+    for category_id, product_id in _get_category_products():
+        if product_id in selected_products:
+            found.add(category_id)
         else:
-            not_found = True
-
-    if found and not_found:
-        checked = True
-        klass = "half"
-    elif found:
-        checked = True
-        klass = "full"
-    else:
-        checked = False
-        klass = ""
-
-    return (checked, klass)
+            not_found.add(category_id)
+
+    # A category contains the products of its sub categories
+    def _add_children(category_id):
+        for child_id in children.get(category_id, []):
+            _add_children(child_id)
+            if child_id in found:
+                found.add(category_id)
+            if child_id in not_found:
+                not_found.add(category_id)
+    _add_children(None)
+
+    states = {}
+    for category_ids in children.values():
+        for category_id in category_ids:
+            if category_id in found and category_id in not_found:
+                states[category_id] = (True, "half")
+            elif category_id in found:
+                states[category_id] = (True, "full")
+            else:
+                states[category_id] = (False, "")
+
+    return states
+
+def _get_category_products():
+    """Returns (category id, product id) tuples of all active products, which
+    are not variants (see Category.get_all_products).
+    """
+    field = Category._meta.get_field("products")
+    qn = connection.ops.quote_name
+
+    cursor = connection.cursor()
+    cursor.execute("""SELECT m.%s, m.%s
+                      FROM %s m
+                      INNER JOIN %s p ON p.id = m.%s
+                      WHERE p.active = %%s AND p.sub_type <> %%s""" % (
+        qn(field.m2m_column_name()), qn(field.m2m_reverse_name()),
+        qn(field.m2m_db_table()), qn(Product._meta.db_table),
+        qn(field.m2m_reverse_name())), [True, VARIANT])
+    return cursor.fetchall()
+
+def _get_variants_options(export):
+    """Returns the variants options of the categories of given export as
+    dictionary: category id -> variants option.
+    """
+    return dict(CategoryOption.objects.filter(
+        export=export).values_list("category", "variants_option"))
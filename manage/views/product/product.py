@@ -56,7 +56,9 @@ class VariantDataForm(ModelForm):
             "active_related_products")
 
 class ProductStockForm(ModelForm):
-    """Form to add and edit stock data of a product.
+    """Form to add and edit stock data of a product. Just the change of the
+    stock amount is saved, hence concurrent sales are not lost (see
+    Product.save).
     """
     class Meta:
         model = Product
@@ -2,16 +2,19 @@
 from django.contrib.auth.decorators import permission_required
 from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
+from django.core.urlresolvers import reverse
 from django.forms import ModelForm
 from django.http import HttpResponse
 from django.template import RequestContext
 from django.template.defaultfilters import slugify
 from django.template.loader import render_to_string
 from django.utils import simplejson
+from django.utils.translation import ugettext_lazy as _
 
 # lfs imports
 from lfs.caching.utils import lfs_get_object_or_404
 from lfs.core.signals import product_changed
+from lfs.core.utils import LazyEncoder
 from lfs.catalog.models import Product
 from lfs.catalog.models import ProductPropertyValue
 from lfs.catalog.models import ProductsPropertiesRelation
@@ -20,6 +23,7 @@ from lfs.catalog.models import PropertyGroup
 from lfs.catalog.models import PropertyOption
 from lfs.catalog.settings import VARIANT, PROPERTY_SELECT_FIELD
 import lfs.catalog.utils
+import lfs.catalog.variants
 from lfs.manage import utils as manage_utils
 
 
@@ -268,37 +272,41 @@ def add_variants(request, product_id):
                 properties.append(["%s|%s" % (property_id, value)])
 
     # Create a variant for every requested option combination
-    for i, options in enumerate(manage_utils.cartesian_product(*properties)):
-
-        if product.has_variant(options):
-            continue
-
-        price = request.POST.get("price")
-
-        slug = ""
-        for option in options:
-            property_id, option_id = option.split("|")
-            o = PropertyOption.objects.get(pk=option_id)
-            slug += "-" + slugify(o.name)
-
-        slug = "%s%s" % (product.slug, slug)
-        sku = "%s-%s" % (product.sku, i+1)
+    try:
+        price = float(request.POST.get("price"))
+    except (TypeError, ValueError):
+        price = 0.0
+
+    # Large amounts of variants are created in the background, the progress
+    # is polled via add_variants_progress.
+    if lfs.catalog.variants.is_background_job(properties):
+        lfs.catalog.variants.add_variants_job(product, properties, price)
+        result = simplejson.dumps({
+            "properties" : manage_variants(request, product_id, as_string=True),
+            "progress_url" : reverse("lfs_add_variants_progress", kwargs={"product_id" : product_id}),
+            "message" : _(u"Variants are created in the background."),
+        }, cls = LazyEncoder)
+    else:
+        lfs.catalog.variants.create_variants(product, properties, price)
+        result = simplejson.dumps({
+            "properties" : manage_variants(request, product_id, as_string=True),
+        })
 
-        variant = Product(slug=slug, sku=sku, parent=product, price=price, variant_position=i+1, sub_type=VARIANT)
-        variant.save()
+    return HttpResponse(result)
 
-        # Save the value for this product and property
-        for option in options:
-            property_id, option_id = option.split("|")
-            pvo = ProductPropertyValue(product = variant, property_id = property_id, value=option_id)
-            pvo.save()
+@permission_required("manage_shop", login_url="/login/")
+def add_variants_progress(request, product_id):
+    """Returns the progress of the creation of variants of the product with
+    passed product_id. If it is finished the variants are returned as well.
+    """
+    product = Product.objects.get(pk=product_id)
+    progress = lfs.catalog.variants.get_progress(product)
 
-    from lfs.manage.views.product.product import selectable_products_inline
-    result = simplejson.dumps({
-        "properties" : manage_variants(request, product_id, as_string=True),
-    })
+    result = {"progress" : progress}
+    if progress is None or progress["done"] >= progress["total"]:
+        result["properties"] = manage_variants(request, product_id, as_string=True)
 
-    return HttpResponse(result)
+    return HttpResponse(simplejson.dumps(result))
 
 @permission_required("manage_shop", login_url="/login/")
 def update_variants(request, product_id):
@@ -8,7 +8,8 @@ from django.utils.translation import ugettext_lazy as _
 # lfs imports
 import lfs.caching.utils
 import lfs.core.utils
-import lfs.catalog.models
+import lfs.catalog.prices
+import lfs.search.index
 
 @permission_required("manage_shop", login_url="/login/")
 def utilities(request, template_name="manage/utils.html"):
@@ -16,6 +17,7 @@ def utilities(request, template_name="manage/utils.html"):
     """
     return render_to_response(template_name, RequestContext(request, {}))
     
+@permission_required("manage_shop", login_url="/login/")
 def clear_cache(request):
     """Clears the whole cache.
     """
@@ -25,6 +27,7 @@ def clear_cache(request):
         msg = _(u"Cache has been cleared."),
     )
 
+@permission_required("manage_shop", login_url="/login/")
 def set_category_levels(request):
     """Sets the category levels based on the position in category hierarchy.
     """
@@ -34,14 +37,27 @@ def set_category_levels(request):
         msg = _(u"Categoy levels have been created."),
     )
     
+@permission_required("manage_shop", login_url="/login/")
 def update_effective_price(request):
-    """Saves the price or sale price to effective price.
+    """Saves the real gross price of all products to effective price.
     """
-    for product in lfs.catalog.models.Product.objects.all():
-        product.save()
-        
+    lfs.catalog.prices.set_effective_prices()
+
+    # The effective prices are part of the filter indexes and cached listings
+    lfs.caching.utils.clear_cache()
+
     return lfs.core.utils.set_message_cookie(
         url = reverse("lfs_manage_utils"),
         msg = _(u"Effective prices have been set."),
     )
-        
\ No newline at end of file
+        
+@permission_required("manage_shop", login_url="/login/")
+def update_search_index(request):
+    """Creates the search index of all products.
+    """
+    lfs.search.index.rebuild_search_index()
+
+    return lfs.core.utils.set_message_cookie(
+        url = reverse("lfs_manage_utils"),
+        msg = _(u"Search index has been updated."),
+    )
@@ -0,0 +1,27 @@
+# django imports
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_delete
+
+# lfs imports
+from lfs.marketing.utils import add_product_sales
+from lfs.order.models import OrderItem
+
+def order_item_saved_listener(sender, instance, created, **kwargs):
+    """Adds the amount of a new order item to the sales of its product.
+
+    Note: The items of submitted orders are inserted without signals, their
+    sales are added by lfs.order.utils.add_order.
+    """
+    if created and instance.product_id and instance.product_amount:
+        add_product_sales({instance.product_id : instance.product_amount},
+            instance.order.created.date())
+post_save.connect(order_item_saved_listener, sender=OrderItem)
+
+def order_item_deleted_listener(sender, instance, **kwargs):
+    """Subtracts the amount of a deleted order item from the sales of its
+    product.
+    """
+    if instance.product_id and instance.product_amount:
+        add_product_sales({instance.product_id : -instance.product_amount},
+            instance.order.created.date())
+pre_delete.connect(order_item_deleted_listener, sender=OrderItem)
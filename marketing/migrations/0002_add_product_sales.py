@@ -0,0 +1,56 @@
+
+from south.db import db
+from django.db import models
+from lfs.marketing.models import *
+
+class Migration:
+    
+    def forwards(self, orm):
+        
+        # Adding model 'ProductSales'
+        db.create_table('marketing_productsales', (
+            ('id', models.AutoField(primary_key=True)),
+            ('product', models.ForeignKey(orm['catalog.Product'], verbose_name=_(u"Product"))),
+            ('date', models.DateField(_(u"Date"), db_index=True)),
+            ('amount', models.IntegerField(_(u"Amount"), default=0)),
+        ))
+        db.send_create_signal('marketing', ['ProductSales'])
+        
+        # Creating unique_together for [product, date] on ProductSales.
+        db.create_unique('marketing_productsales', ['product_id', 'date'])
+        
+        # Calculating the sales of the existing orders
+        if not db.dry_run:
+            from lfs.marketing.utils import rebuild_product_sales
+            rebuild_product_sales()
+        
+    def backwards(self, orm):
+        
+        # Deleting unique_together for [product, date] on ProductSales.
+        db.delete_unique('marketing_productsales', ['product_id', 'date'])
+        
+        # Deleting model 'ProductSales'
+        db.delete_table('marketing_productsales')
+        
+    models = {
+        'marketing.topseller': {
+            'Meta': {'ordering': '["position"]'},
+            'id': ('models.AutoField', [], {'primary_key': 'True'}),
+            'position': ('models.PositiveSmallIntegerField', ['_(u"Position")'], {'default': '1'}),
+            'product': ('models.ForeignKey', ['Product'], {'verbose_name': '_(u"Product")'})
+        },
+        'marketing.productsales': {
+            'Meta': {'unique_together': '("product","date")'},
+            'amount': ('models.IntegerField', ['_(u"Amount")'], {'default': '0'}),
+            'date': ('models.DateField', ['_(u"Date")'], {'db_index': 'True'}),
+            'id': ('models.AutoField', [], {'primary_key': 'True'}),
+            'product': ('models.ForeignKey', ['Product'], {'verbose_name': '_(u"Product")'})
+        },
+        'catalog.product': {
+            'Meta': {'ordering': '("name",)'},
+            '_stub': True,
+            'id': ('models.AutoField', [], {'primary_key': 'True'})
+        }
+    }
+    
+    complete_apps = ['marketing']
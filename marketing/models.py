@@ -18,6 +18,22 @@ class Topseller(models.Model):
     def __unicode__(self):
         return "%s (%s)" % (self.product.name, self.position)
         
+class ProductSales(models.Model):
+    """The sold amount of a product at one day. This is maintained
+    incrementally as order items are added (see
+    lfs.marketing.utils.add_product_sales), hence the topseller are calculated
+    without reading all order items.
+    """
+    product = models.ForeignKey(Product, verbose_name=_(u"Product"))
+    date = models.DateField(_(u"Date"), db_index=True)
+    amount = models.IntegerField(_(u"Amount"), default=0)
+
+    class Meta:
+        unique_together = ("product", "date")
+
+    def __unicode__(self):
+        return "%s (%s: %s)" % (self.product.name, self.date, self.amount)
+
 class OrderRatingMail(models.Model):
     """Saves whether and when a rating mail has been send for an order.
     """
@@ -26,4 +42,5 @@ class OrderRatingMail(models.Model):
     
     def __unicode__(self):
         return "%s (%s)" % (self.order.id, self.rating_mail_sent)
-    
\ No newline at end of file
+
+from listeners import *
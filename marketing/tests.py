@@ -163,6 +163,40 @@ class UtilsTestCase(TestCase):
         self.assertEqual(ts[0], self.p4)
         self.assertEqual(ts[1], self.p3)
         
+    def test_topseller_4(self):
+        """Tests general topseller within the last days.
+        """
+        # Old sales of P1
+        lfs.marketing.utils.add_product_sales(
+            {self.p1.id : 10}, datetime.now().date() - timedelta(days=20))
+
+        ts = lfs.marketing.utils.get_topseller(2)
+        self.assertEqual(ts[0], self.p1)
+        self.assertEqual(ts[1], self.p4)
+
+        ts = lfs.marketing.utils.get_topseller(2, days=7)
+        self.assertEqual(ts[0], self.p4)
+        self.assertEqual(ts[1], self.p3)
+
+        ts = lfs.marketing.utils.get_topseller(2, days=30)
+        self.assertEqual(ts[0], self.p1)
+        self.assertEqual(ts[1], self.p4)
+
+    def test_topseller_5(self):
+        """Tests that the sales are changed with the order items.
+        """
+        self.oi4.delete()
+
+        ts = lfs.marketing.utils.get_topseller(2)
+        self.assertEqual(ts[0], self.p3)
+        self.assertEqual(ts[1], self.p2)
+
+        OrderItem.objects.create(order=self.o, product_amount=5, product=self.p1)
+
+        ts = lfs.marketing.utils.get_topseller(2)
+        self.assertEqual(ts[0], self.p1)
+        self.assertEqual(ts[1], self.p3)
+
     def test_topseller_for_category_1(self):
         """Tests topseller for specific categories.
         """
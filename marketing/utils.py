@@ -4,15 +4,24 @@ from datetime import timedelta
 
 # django imports
 from django.core.cache import cache
-from django.db.models import Q
+from django.db import connection
+from django.db import transaction
+from django.db import IntegrityError
 
 # lfs imports
+from lfs.caching.settings import CATEGORY_NAMESPACE
+from lfs.caching.settings import TOPSELLER_NAMESPACE
+from lfs.caching.utils import get_cache
+from lfs.caching.utils import invalidate_namespaces
+from lfs.caching.utils import set_cache
+from lfs.catalog.models import Category
 from lfs.catalog.models import Product
+from lfs.core.utils import insert_rows
+from lfs.marketing.models import ProductSales
 from lfs.marketing.models import Topseller
 from lfs.order.models import Order
 from lfs.order.settings import CLOSED
 from lfs.order.models import OrderItem
-from django.db import connection
 
 def get_orders(days=14):
     """Returns closed orders which are closed for given amount of days.
@@ -22,102 +31,209 @@ def get_orders(days=14):
     orders = Order.objects.filter(state=CLOSED, state_modified__lte=limit)
     return orders
 
-def get_topseller(limit=5):
-    """Returns products with the most sales. Limited by given limit.
+def add_product_view(product):
+    """Counts a view of the given product. The views of variants are counted
+    for the parent.
+    """
+    key = "product-views-%s" % (product.parent_id or product.id)
+    try:
+        cache.incr(key)
+    except AttributeError:
+        # The cache backend of Django 1.0 has no incr
+        cache.set(key, (cache.get(key) or 0) + 1)
+    except ValueError:
+        cache.add(key, 1)
+
+def get_product_views(product_ids):
+    """Returns the views of the products with given ids as dictionary: product
+    id -> amount of views. The views are counted within the cache, hence they
+    are lost as soon as the cache is cleared.
+    """
+    keys = {}
+    for id in product_ids:
+        keys["product-views-%s" % id] = id
+
+    result = {}
+    for key, views in cache.get_many(keys.keys()).items():
+        result[keys[key]] = views
+    return result
+
+def get_product_sales():
+    """Returns the sold amount of all products as dictionary: product id ->
+    amount. The sales of variants are counted for the parent.
     """
-    cache_key = "topseller"
-    topseller = cache.get(cache_key)
-    if topseller is not None:
-        return topseller
-
-    # TODO: Check Django 1.1's aggregation
     cursor = connection.cursor()
-    cursor.execute("""SELECT product_id, sum(product_amount) as sum
-                      FROM order_orderitem
-                      GROUP BY product_id
-                      ORDER BY sum DESC limit %s""" % (limit*2))
-
-    products = []
-    for topseller in cursor.fetchall():
-        product = Product.objects.get(pk=topseller[0])
-        if product.is_active():
-            try:
-                products.append(product)
-            except Product.DoesNotExist:
-                pass
-
-    for explicit_ts in Topseller.objects.all():
+    cursor.execute("""SELECT product_id, sum(amount)
+                      FROM %s
+                      GROUP BY product_id""" % ProductSales._meta.db_table)
+    sales = dict(cursor.fetchall())
+
+    result = {}
+    for id, parent_id in Product.objects.filter(pk__in=sales.keys()).values_list("id", "parent"):
+        product_id = parent_id or id
+        result[product_id] = result.get(product_id, 0) + sales[id]
+    return result
+
+def add_product_sales(amounts, date=None):
+    """Adds sold amounts to the sales of the given day (default: today).
+    amounts is a dictionary: product id -> amount. Negative amounts are
+    subtracted.
+
+    Every amount is changed with an UPDATE within the database, hence
+    concurrent orders don't overwrite each other's sales.
+    """
+    if date is None:
+        date = datetime.now().date()
 
-        if explicit_ts.product.is_active():
-            # Remove explicit_ts if it's already in the object list
-            if explicit_ts.product in products:
-                products.pop(products.index(explicit_ts.product))
+    qn = connection.ops.quote_name
+    table = qn(ProductSales._meta.db_table)
+    update = "UPDATE %s SET %s = %s + %%s WHERE %s = %%s AND %s = %%s" % (
+        table, qn("amount"), qn("amount"), qn("product_id"), qn("date"))
+    insert = "INSERT INTO %s (%s, %s, %s) VALUES (%%s, %%s, %%s)" % (
+        table, qn("product_id"), qn("date"), qn("amount"))
 
-            # Then reinsert the explicit_ts on the given position
-            position = explicit_ts.position - 1
-            if position < 0:
-                position = 0
-            products.insert(position, explicit_ts.product)
+    cursor = connection.cursor()
+    for product_id, amount in amounts.items():
+        if not amount:
+            continue
+        cursor.execute(update, [amount, product_id, date])
+        if cursor.rowcount > 0:
+            continue
+
+        # The first sale of the product at this day. If another process has
+        # inserted the row meanwhile, the amount is added to it.
+        sid = transaction.savepoint()
+        try:
+            cursor.execute(insert, [product_id, date, amount])
+        except IntegrityError:
+            transaction.savepoint_rollback(sid)
+            cursor.execute(update, [amount, product_id, date])
+        else:
+            transaction.savepoint_commit(sid)
+
+    transaction.commit_unless_managed()
+
+def rebuild_product_sales():
+    """Calculates the sales of all products from scratch on base of all order
+    items. This is only needed if the sales are lost or the order items have
+    been changed directly within the database.
+    """
+    sales = {}
+    order_items = OrderItem.objects.exclude(product=None).values_list(
+        "product", "order__created", "product_amount")
+    for product_id, created, amount in order_items:
+        if amount:
+            key = (product_id, created.date())
+            sales[key] = sales.get(key, 0) + amount
+
+    ProductSales.objects.all().delete()
+    insert_rows(ProductSales, [ProductSales(product_id=product_id, date=date, amount=amount)
+        for (product_id, date), amount in sales.items()])
+    transaction.commit_unless_managed()
+    invalidate_namespaces(TOPSELLER_NAMESPACE)
+
+def get_topseller(limit=5, days=None):
+    """Returns products with the most sales. Limited by given limit. If days
+    is given only the sales of the last days are taken into account (e.g. 7,
+    30 or 90).
+    """
+    cache_key = "topseller-%s-%s" % (limit, days)
+    topseller = get_cache(cache_key, [TOPSELLER_NAMESPACE])
+    if topseller is not None:
+        return topseller
+
+    products = _get_calculated_topseller(limit, days)
+    explicit_topseller = Topseller.objects.select_related("product")
+    products = _insert_explicit_topseller(products, explicit_topseller, limit)
 
-    products = products[:limit]
-    cache.set(cache_key, products)
+    set_cache(cache_key, products, [TOPSELLER_NAMESPACE])
     return products
 
-def get_topseller_for_category(category, limit=5):
-    """Returns products with the most sales withing given category. Limited by
-    given limit.
+def get_topseller_for_category(category, limit=5, days=None):
+    """Returns products with the most sales withing given category (including
+    its sub categories). Limited by given limit. If days is given only the
+    sales of the last days are taken into account (e.g. 7, 30 or 90).
     """
-    # TODO: Check Django 1.1's aggregation
-
-    cache_key = "topseller-%s" % category.id
-    topseller = cache.get(cache_key)
+    cache_key = "topseller-%s-%s-%s" % (category.id, limit, days)
+    namespaces = [TOPSELLER_NAMESPACE, CATEGORY_NAMESPACE % category.id]
+    topseller = get_cache(cache_key, namespaces)
     if topseller is not None:
         return topseller
 
-    # 1. Get all sub catgegories of passed category
-    categories = [category]
-    categories.extend(category.get_all_children())
-    category_ids = [c.id for c in categories]
-    
-    # 2. Get all order items with products within these categories.
-    #    product__parent__categories is for variants
-    f = Q(product__parent__categories__in=category_ids) | \
-        Q(product__categories__in=category_ids)
-        
-    order_items = OrderItem.objects.filter(f)
-    
-    # 3. Calculate totals per product
-    products = {}
-    for order_item in order_items:
-        if order_item.product.is_active():
-            if not products.has_key(order_item.product.id):
-                products[order_item.product.id] = 0
-            products[order_item.product.id] += order_item.product_amount
-
-    # 4. Sort product ids on values
-    products = products.items()
-    products.sort(lambda a, b: cmp(b[1], a[1]))
-
-    objects = []
-    for product_id, quantity in products[:limit]:
-        try:
-            objects.append(Product.objects.get(pk=product_id))
-        except Product.DoesNotExist:
-            pass
+    # The sales of all products of the category and of all sub categories.
+    # Variants belong to the categories of their parent.
+    category_ids = [category.id]
+    category_ids.extend([c.id for c in category.get_all_children()])
+
+    products = _get_calculated_topseller(limit, days, category_ids)
+    explicit_topseller = Topseller.objects.filter(
+        product__categories__in=category_ids).select_related("product").distinct()
+    products = _insert_explicit_topseller(products, explicit_topseller, limit)
+
+    set_cache(cache_key, products, namespaces)
+    return products
+
+def _get_calculated_topseller(limit, days=None, category_ids=None):
+    """Returns the active products with the most sales, optionally only of the
+    last days and of the categories with given ids. The sums are calculated
+    with one query over the sales of the products, the products are loaded
+    with one query and their parents with another one.
+    """
+    qn = connection.ops.quote_name
+    product_table = qn(Product._meta.db_table)
+
+    sql = """SELECT s.product_id, sum(s.amount) AS total
+             FROM %s s
+             INNER JOIN %s p ON p.id = s.product_id
+             LEFT OUTER JOIN %s pp ON pp.id = p.parent_id
+             WHERE p.active = %%s AND (p.parent_id IS NULL OR pp.active = %%s)""" % (
+        qn(ProductSales._meta.db_table), product_table, product_table)
+    params = [True, True]
+
+    if days is not None:
+        sql += " AND s.date >= %s"
+        params.append(datetime.now().date() - timedelta(days=days))
+
+    if category_ids is not None:
+        field = Category._meta.get_field("products")
+        categories = "SELECT %s FROM %s WHERE %s IN (%s)" % (
+            qn(field.m2m_reverse_name()), qn(field.m2m_db_table()),
+            qn(field.m2m_column_name()), ", ".join([str(int(id)) for id in category_ids]))
+        sql += " AND (p.id IN (%s) OR p.parent_id IN (%s))" % (categories, categories)
+
+    sql += " GROUP BY s.product_id HAVING sum(s.amount) > 0"
+    sql += " ORDER BY total DESC, s.product_id LIMIT %d" % limit
+
+    cursor = connection.cursor()
+    cursor.execute(sql, params)
+    product_ids = [row[0] for row in cursor.fetchall()]
+
+    products = Product.objects.in_bulk(product_ids)
+    parent_ids = [p.parent_id for p in products.values() if p.parent_id]
+    if parent_ids:
+        parents = Product.objects.in_bulk(parent_ids)
+        cache_name = Product._meta.get_field("parent").get_cache_name()
+        for product in products.values():
+            if product.parent_id in parents:
+                setattr(product, cache_name, parents[product.parent_id])
+
+    return [products[id] for id in product_ids if id in products]
+
+def _insert_explicit_topseller(products, explicit_topseller, limit):
+    """Inserts the given explicitly selected topseller into the given
+    calculated topseller on their positions.
+    """
+    for explicit_ts in explicit_topseller:
 
-    for explicit_ts in Topseller.objects.filter(product__categories__in=category_ids):
-        
         if explicit_ts.product.is_active():
             # Remove explicit_ts if it's already in the object list
-            if explicit_ts.product in objects:
-                objects.pop(objects.index(explicit_ts.product))
+            if explicit_ts.product in products:
+                products.pop(products.index(explicit_ts.product))
 
             # Then reinsert the explicit_ts on the given position
             position = explicit_ts.position - 1
             if position < 0:
                 position = 0
-            objects.insert(position, explicit_ts.product)
+            products.insert(position, explicit_ts.product)
 
-    objects = objects[:limit]
-    cache.set(cache_key, objects)
-    return objects
\ No newline at end of file
+    return products[:limit]
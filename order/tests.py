@@ -119,6 +119,44 @@ class OrderTestCase(TestCase):
             amount = 3,
         )
         
+    def test_cart_summary(self):
+        """Tests the summary of the cart the order is based on.
+        """
+        cart = cart_utils.get_cart(self.request)
+        summary = cart_utils.get_cart_summary(self.request, cart)
+
+        self.assertEqual(len(summary.items), 2)
+        self.assertEqual(summary.items[0].amount, 2)
+        self.assertEqual("%.2f" % summary.items[0].price_gross, "2.20")
+        self.assertEqual(summary.items[1].amount, 3)
+        self.assertEqual("%.2f" % summary.items[1].price_gross, "6.60")
+
+        self.assertEqual("%.2f" % summary.price, "8.80")
+        self.assertEqual(summary.shipping_price, 1.0)
+        self.assertEqual("%.2f" % summary.total_price, "9.80")
+        self.assertEqual("%.2f" % summary.total_tax, "1.56")
+        self.failIf(summary.max_delivery_time is None)
+
+        # The summary is shared, hence it can't be changed
+        self.assertRaises(AttributeError, setattr, summary, "price", 0)
+
+    def test_cart_summary_product_changed(self):
+        """Tests that the summary is calculated again when a product of the
+        cart has been changed.
+        """
+        cart = cart_utils.get_cart(self.request)
+        summary = cart_utils.get_cart_summary(self.request, cart)
+        self.assertEqual("%.2f" % summary.price, "8.80")
+
+        product = Product.objects.get(slug="product-1")
+        product.price = 2.2
+        product.save()
+
+        summary = cart_utils.get_cart_summary(self.request, cart)
+        self.assertEqual("%.2f" % summary.items[0].price_gross, "4.40")
+        self.assertEqual("%.2f" % summary.price, "11.00")
+        self.assertEqual("%.2f" % cart_utils.get_cart_price(self.request, cart), "11.00")
+
     def test_add_order(self):
         """Tests the general adding of an order via the add_order method
         """
@@ -173,4 +211,8 @@ class OrderTestCase(TestCase):
         
         # The cart should be deleted after the order has been created
         cart = cart_utils.get_cart(self.request)
-        self.assertEqual(cart, None)
\ No newline at end of file
+        self.assertEqual(cart, None)
+
+        # The stock amounts have been decreased
+        self.assertEqual(Product.objects.get(slug="product-1").stock_amount, -2)
+        self.assertEqual(Product.objects.get(slug="product-2").stock_amount, -3)
\ No newline at end of file
@@ -1,10 +1,19 @@
 # django imports
 from django.core.urlresolvers import reverse
+from django.db import transaction
 
 # lfs imports
+from lfs.caching.settings import TOPSELLER_NAMESPACE
+from lfs.caching.utils import delete_request_cache
+from lfs.caching.utils import invalidate_namespaces
 from lfs.cart import utils as cart_utils
+from lfs.catalog.stock import OutOfStock
+from lfs.catalog.stock import decrease_stock_amounts
+from lfs.catalog.stock import update_stock_cache
 from lfs.core.signals import order_submitted
+from lfs.core.utils import insert_rows
 from lfs.customer import utils as customer_utils
+from lfs.marketing.utils import add_product_sales
 from lfs.order.models import Order
 from lfs.order.models import OrderItem
 from lfs.payment import utils as payment_utils
@@ -15,6 +24,14 @@ def add_order(request):
     
     It assumes that the customer is prepared with all needed information. This 
     is within the responsibility of the checkout form.
+
+    Returns None if there is no cart or a product is not on stock anymore (see
+    lfs.catalog.stock).
+
+    The prices are taken from the summary of the cart, which is cached until
+    the cart or one of its products has been changed. The order, its items and
+    the decreased stock amounts are stored within one transaction with a few
+    statements, independent of the amount of items.
     """
     customer = customer_utils.get_customer(request)
     order = None
@@ -28,13 +45,11 @@ def add_order(request):
     cart = cart_utils.get_cart(request)
     if cart is None:
         return order
-    cart_costs = cart_utils.get_cart_costs(request, cart, total=False)
-    
-    shipping_method = shipping_utils.get_selected_shipping_method(request)
-    shipping_costs = shipping_utils.get_shipping_costs(request, shipping_method)
+    summary = cart_utils.get_cart_summary(request, cart)
+    products = cart_utils.get_cart_products(cart)
 
+    shipping_method = shipping_utils.get_selected_shipping_method(request)
     payment_method = payment_utils.get_selected_payment_method(request)
-    payment_costs = payment_utils.get_payment_costs(request, payment_method)
 
     # Set email dependend on login state. An anonymous customer doesn't  have a 
     # django user account, so we set the name of the invoice address to the 
@@ -50,26 +65,22 @@ def add_order(request):
         user = None
         customer_email = invoice_address.email
         
-    # Calculate the totals    
-    price = cart_costs["price"] + shipping_costs["price"] + payment_costs["price"]
-    tax = cart_costs["tax"] + shipping_costs["tax"] + payment_costs["tax"]
-    
-    order = Order.objects.create(
+    order = Order(
         user = user,
         session = request.session.session_key,
-        price = price,
-        tax = tax,
+        price = summary.total_price,
+        tax = summary.total_tax,
 
         customer_firstname = invoice_address.firstname,
         customer_lastname = invoice_address.lastname,
         customer_email = customer_email,
                 
         shipping_method = shipping_method,
-        shipping_price = shipping_costs["price"],
-        shipping_tax = shipping_costs["tax"],
+        shipping_price = summary.shipping_price,
+        shipping_tax = summary.shipping_tax,
         payment_method = payment_method,
-        payment_price = payment_costs["price"],
-        payment_tax = payment_costs["tax"],
+        payment_price = summary.payment_price,
+        payment_tax = summary.payment_tax,
 
         invoice_firstname = invoice_address.firstname,
         invoice_lastname = invoice_address.lastname,
@@ -100,29 +111,17 @@ def add_order(request):
         order.bank_name = bank_account.bank_name
         order.depositor = bank_account.depositor
     
-    order.save()
-    
-    # Copy cart items
-    for cart_item in cart.cartitem_set.all():        
-        OrderItem.objects.create(
-            order=order,
-            
-            price_net = cart_item.get_price_net(),
-            price_gross = cart_item.get_price_gross(),
-            tax = cart_item.get_tax(),
-
-            product = cart_item.product,
-            product_sku = cart_item.product.sku,
-            product_name = cart_item.product.get_name(),
-            product_amount=cart_item.amount,                        
-            product_price_net = cart_item.product.get_price_net(),
-            product_price_gross = cart_item.product.get_price_gross(),
-            product_tax = cart_item.product.get_tax(),
-        )
-        
-        cart_item.product.decrease_stock_amount(cart_item.amount)
-        
+    try:
+        _save_order(order, summary, products, cart)
+    except OutOfStock:
+        return None
+
+    # The stock amounts have been changed without saving the products.
+    update_stock_cache([p.id for p in products.values() if p.manage_stock_amount])
+    invalidate_namespaces(TOPSELLER_NAMESPACE)
+
     cart.delete()
+    delete_request_cache(request, "cart")
     order_submitted.send(order)
     
     # Note: Save order for later use in thank you page. The order will be
@@ -131,4 +130,40 @@ def add_order(request):
     
     return order
 
-                               
\ No newline at end of file
+def _save_order(order, summary, products, cart):
+    """Saves the given order, inserts its items (copies of the items of the
+    given cart summary), adds the sales and decreases the stock amounts of the
+    products. The reservations of the given cart are consumed.
+    """
+    order.save()
+
+    # Copy cart items
+    items = []
+    sales = {}
+    amounts = {}
+    for item in summary.items:
+        product = products[item.product_id]
+        items.append(OrderItem(
+            order=order,
+
+            price_net = item.price_net,
+            price_gross = item.price_gross,
+            tax = item.tax,
+
+            product = product,
+            product_sku = product.sku,
+            product_name = product.get_name(),
+            product_amount = item.amount,
+            product_price_net = item.product_price_net,
+            product_price_gross = item.product_price_gross,
+            product_tax = item.product_tax,
+        ))
+
+        sales[product.id] = sales.get(product.id, 0) + item.amount
+        if product.manage_stock_amount:
+            amounts[product.id] = amounts.get(product.id, 0) + item.amount
+
+    insert_rows(OrderItem, items)
+    add_product_sales(sales, order.created.date())
+    decrease_stock_amounts(amounts, cart)
+_save_order = transaction.commit_on_success(_save_order)
@@ -115,7 +115,7 @@ class PaymentMethodPrice(models.Model):
         the attached criteria.
         """
         from lfs.criteria import utils as criteria_utils
-        return criteria_utils.is_valid(self, request)
+        return criteria_utils.is_valid(request, self)
     
 from lfs.order.models import Order
     
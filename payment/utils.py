@@ -5,6 +5,8 @@ from django.core.urlresolvers import reverse
 
 # lfs imports
 import lfs.core.utils
+from lfs.caching.utils import delete_request_cache
+from lfs.caching.utils import get_request_cache
 from lfs.caching.utils import lfs_get_object_or_404
 from lfs.core.models import Shop
 from lfs.criteria import utils as criteria_utils
@@ -20,6 +22,7 @@ def update_to_valid_payment_method(request, customer, save=False):
     """After this method has been called the given customer has a valid
     payment method.
     """
+    delete_request_cache(request, "default-payment-method")
     valid_sms = get_valid_payment_methods(request)
 
     if customer.selected_payment_method not in valid_sms:
@@ -31,11 +34,8 @@ def get_valid_payment_methods(request):
     """Returns all valid payment methods (aka. selectable) for given request as
     list.
     """
-    result = []
-    for pm in PaymentMethod.objects.filter(active=True):
-        if criteria_utils.is_valid(request, pm):
-            result.append(pm)
-    return result
+    return criteria_utils.get_valid(request,
+        PaymentMethod.objects.filter(active=True))
 
 def get_default_payment_method(request):
     """Returns the default payment method for given request.
@@ -46,13 +46,14 @@ def get_default_payment_method(request):
 def get_selected_payment_method(request):
     """Returns the selected payment method for given request. This could either
     be an explicitly selected payment method of the current user or the default
-    payment method.
+    payment method. The latter is calculated once per request.
     """
     customer = customer_utils.get_customer(request)
     if customer and customer.selected_payment_method:
         return customer.selected_payment_method
     else:
-        return get_default_payment_method(request)
+        return get_request_cache(request, "default-payment-method",
+            lambda: get_default_payment_method(request))
 
 def get_payment_costs(request, payment_method):
     """Returns the payment price and tax for the given request.
@@ -93,7 +94,7 @@ def process_payment(request):
     message.
     """
     payment_method = get_selected_payment_method(request)
-    shop = lfs.core.utils.get_default_shop()
+    shop = lfs.core.utils.get_default_shop(request)
 
     if payment_method.id == PAYPAL and settings.LFS_PAYPAL_REDIRECT:
         return {
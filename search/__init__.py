@@ -0,0 +1 @@
+from listeners import *
\ No newline at end of file
@@ -0,0 +1,156 @@
+"""Provides the autocomplete index which is used by the livesearch.
+
+The index is a sorted list of keys: the lower cased name of every displayed
+product, every word of the name to the end of the name (hence "Red Shirt"
+is found by "shi") and the SKU. The completions of a prefix are found via
+bisection. The most popular completions of all short prefixes (see
+lfs.search.settings) are calculated in advance, as these match most of the
+keys.
+
+The popularity of a product is based on its sales and views (see
+lfs.marketing.utils).
+
+The index is calculated once per process and shared by all requests. It must
+not be changed, instead a new index is created as soon as the version of the
+search namespace (see lfs.caching.settings) changes, i.e. after any product
+has been changed, or the index is older than AUTOCOMPLETE_MAX_AGE. Changed
+products are taken over when the index is at least AUTOCOMPLETE_MIN_AGE old,
+hence a lot of changes (e.g. an import) cause just one calculation per
+AUTOCOMPLETE_MIN_AGE.
+"""
+# python imports
+import bisect
+import time
+
+# lfs imports
+import lfs.marketing.utils
+from lfs.caching.settings import SEARCH_NAMESPACE
+from lfs.caching.utils import get_generations
+from lfs.catalog.models import Product
+from lfs.catalog.settings import PRODUCT_WITH_VARIANTS
+from lfs.catalog.settings import STANDARD_PRODUCT
+from lfs.search.settings import AUTOCOMPLETE_LIMIT
+from lfs.search.settings import AUTOCOMPLETE_MAX_AGE
+from lfs.search.settings import AUTOCOMPLETE_MIN_AGE
+from lfs.search.settings import AUTOCOMPLETE_PREFIX_LENGTH
+from lfs.search.settings import AUTOCOMPLETE_SALES_WEIGHT
+
+# The current index of this process. This is replaced as a whole, hence no
+# lock is needed to read it.
+_index = None
+
+class AutocompleteIndex(object):
+    """An immutable prefix index of the product names and SKUs.
+    """
+    def __init__(self, version, rows, popularity):
+        """rows is a sequence of (id, name, sku) of the displayed products,
+        popularity a dictionary product id -> popularity.
+        """
+        self.version = version
+        self.created = time.time()
+        self.popularity = popularity
+
+        entries = []
+        for id, name, sku in rows:
+            for key in _get_keys(name, sku):
+                entries.append((key, id))
+        entries.sort()
+
+        self.keys = [key for key, id in entries]
+        self.product_ids = [id for key, id in entries]
+
+        # The completions of the short prefixes
+        prefixes = {}
+        for key, id in entries:
+            for i in range(1, min(len(key), AUTOCOMPLETE_PREFIX_LENGTH) + 1):
+                prefixes.setdefault(key[:i], set()).add(id)
+
+        self.completions = {}
+        for prefix, product_ids in prefixes.items():
+            self.completions[prefix] = (
+                self._sort(product_ids)[:AUTOCOMPLETE_LIMIT], len(product_ids))
+
+    def complete(self, phrase, limit=AUTOCOMPLETE_LIMIT):
+        """Returns the ids of the most popular products which start with the
+        given phrase plus the total amount of them as tuple: (ids, total).
+        """
+        prefix = _normalize(phrase)
+        if not prefix:
+            return [], 0
+
+        if len(prefix) <= AUTOCOMPLETE_PREFIX_LENGTH and limit <= AUTOCOMPLETE_LIMIT:
+            product_ids, total = self.completions.get(prefix, ((), 0))
+            return list(product_ids[:limit]), total
+
+        product_ids = set()
+        for i in xrange(bisect.bisect_left(self.keys, prefix), len(self.keys)):
+            if not self.keys[i].startswith(prefix):
+                break
+            product_ids.add(self.product_ids[i])
+
+        return self._sort(product_ids)[:limit], len(product_ids)
+
+    def _sort(self, product_ids):
+        """Returns the given product ids sorted by popularity.
+        """
+        popularity = self.popularity
+        product_ids = list(product_ids)
+        product_ids.sort(key=lambda id: (-popularity.get(id, 0), id))
+        return product_ids
+
+def complete(phrase, limit=AUTOCOMPLETE_LIMIT):
+    """Returns the ids of the most popular products which start with the given
+    phrase plus the total amount of them as tuple: (ids, total).
+    """
+    return get_autocomplete_index().complete(phrase, limit)
+
+def get_autocomplete_index():
+    """Returns the current autocomplete index. Creates a new one if a product
+    has been changed (at most every AUTOCOMPLETE_MIN_AGE seconds) or the index
+    is too old.
+    """
+    global _index
+
+    version = get_generations([SEARCH_NAMESPACE])[SEARCH_NAMESPACE]
+    index = _index
+    if index is not None:
+        age = time.time() - index.created
+        if age < AUTOCOMPLETE_MAX_AGE and \
+           (index.version == version or age < AUTOCOMPLETE_MIN_AGE):
+            return index
+
+    rows = Product.objects.filter(
+        active=True,
+        sub_type__in=(STANDARD_PRODUCT, PRODUCT_WITH_VARIANTS),
+    ).values_list("id", "name", "sku")
+    rows = list(rows)
+
+    popularity = {}
+    for id, amount in lfs.marketing.utils.get_product_sales().items():
+        popularity[id] = amount * AUTOCOMPLETE_SALES_WEIGHT
+    for id, views in lfs.marketing.utils.get_product_views([row[0] for row in rows]).items():
+        popularity[id] = popularity.get(id, 0) + views
+
+    index = AutocompleteIndex(version, rows, popularity)
+    _index = index
+    return index
+
+def _normalize(text):
+    """Returns the lower cased text with single spaces between the words.
+    """
+    return " ".join(text.lower().split())
+
+def _get_keys(name, sku):
+    """Returns the keys of a product with given name and SKU.
+    """
+    keys = set()
+    words = _normalize(name or "").split(" ")
+    for i in range(len(words)):
+        key = " ".join(words[i:])
+        if key:
+            keys.add(key)
+
+    sku = _normalize(sku or "")
+    if sku:
+        keys.add(sku)
+    return keys
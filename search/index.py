@@ -0,0 +1,203 @@
+"""Provides the search index of the products.
+
+The search index is an inverted index: it maps every term to the products
+which contain it, together with a weight (see lfs.search.settings). It is
+stored within the SearchTerm table and updated incrementally when a product
+or one of its property values is changed.
+
+The terms are taken out of name, SKU, short description, description and
+property values of all displayed products (standard products and products
+with variants). They are lower cased, words which consist of stop words only
+(see lfs.tagging.settings) are omitted and the rest is stemmed.
+"""
+# python imports
+import re
+
+# django imports
+from django.db import connection
+from django.db import transaction
+
+# lfs imports
+import lfs.catalog.models
+from lfs.catalog.settings import PRODUCT_WITH_VARIANTS
+from lfs.catalog.settings import PROPERTY_SELECT_FIELD
+from lfs.catalog.settings import STANDARD_PRODUCT
+from lfs.search.models import SearchTerm
+from lfs.search.settings import FIELD_WEIGHTS
+from lfs.search.settings import MIN_STEM_LENGTH
+from lfs.search.settings import PROPERTY_VALUE_WEIGHT
+from lfs.search.settings import STEM_SUFFIXES
+from lfs.tagging.settings import RE_STOP_WORDS
+
+# The amount of products which are indexed at once by rebuild_search_index.
+CHUNK_SIZE = 500
+
+RE_WORDS = re.compile(r"\w+", re.UNICODE)
+RE_TAGS = re.compile(r"<[^>]*>")
+
+def search(phrase, start=0, amount=None):
+    """Returns the ids of the products which match the given phrase, ordered
+    by relevance, plus the total amount of matching products as tuple: (ids,
+    total).
+
+    A product matches if it contains all terms of the phrase. The last term
+    is taken as prefix, as it could not have been typed completely yet.
+    """
+    terms = []
+    for term in get_terms(phrase):
+        if term not in terms:
+            terms.append(term)
+
+    if not terms:
+        return [], 0
+
+    scores = None
+    for i, term in enumerate(terms):
+        if i == len(terms) - 1:
+            rows = SearchTerm.objects.filter(term__startswith=term)
+        else:
+            rows = SearchTerm.objects.filter(term=term)
+
+        term_scores = {}
+        for product_id, weight in rows.values_list("product", "weight"):
+            term_scores[product_id] = term_scores.get(product_id, 0) + weight
+
+        if scores is None:
+            scores = term_scores
+        else:
+            for product_id in scores.keys():
+                if product_id in term_scores:
+                    scores[product_id] += term_scores[product_id]
+                else:
+                    del scores[product_id]
+
+        if not scores:
+            return [], 0
+
+    product_ids = scores.keys()
+    product_ids.sort(key=lambda id: (-scores[id], id))
+
+    if amount is None:
+        return product_ids[start:], len(product_ids)
+    else:
+        return product_ids[start:start+amount], len(product_ids)
+
+def get_terms(text):
+    """Returns the stemmed terms of the given text.
+    """
+    terms = []
+    for word in RE_WORDS.findall(text.lower()):
+        # Like the tagging, we omit everything which consists of stop words.
+        if not RE_STOP_WORDS.sub("", word):
+            continue
+        terms.append(stem(word)[:50])
+    return terms
+
+def stem(word):
+    """Returns the stem of the given (lower cased) word by stripping common
+    suffixes.
+    """
+    for suffix in STEM_SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM_LENGTH:
+            return word[:-len(suffix)]
+    return word
+
+def update_search_index(product):
+    """Updates the search index of the given product.
+    """
+    if product.is_variant():
+        return
+
+    _delete_terms([product.id])
+    if _is_searchable(product):
+        values = _get_property_values([product.id])
+        _insert_terms(product, values.get(product.id, []))
+
+    transaction.commit_unless_managed()
+
+def delete_search_index(product):
+    """Deletes the given product from the search index.
+    """
+    _delete_terms([product.id])
+    transaction.commit_unless_managed()
+
+def rebuild_search_index():
+    """Creates the search index of all products.
+    """
+    cursor = connection.cursor()
+    cursor.execute("DELETE FROM %s" % SearchTerm._meta.db_table)
+
+    products = lfs.catalog.models.Product.objects.filter(
+        active=True, sub_type__in=(STANDARD_PRODUCT, PRODUCT_WITH_VARIANTS))
+    product_ids = list(products.values_list("id", flat=True))
+
+    for i in range(0, len(product_ids), CHUNK_SIZE):
+        chunk = product_ids[i:i+CHUNK_SIZE]
+        values = _get_property_values(chunk)
+        products = lfs.catalog.models.Product.objects.in_bulk(chunk)
+        for product in products.values():
+            _insert_terms(product, values.get(product.id, []))
+
+    transaction.commit_unless_managed()
+
+def _is_searchable(product):
+    """Returns True if the given product is displayed within the search
+    results.
+    """
+    return product.active and product.sub_type in (STANDARD_PRODUCT, PRODUCT_WITH_VARIANTS)
+
+def _get_property_values(product_ids):
+    """Returns the displayed property values of the products with given ids
+    as dictionary: product id -> list of values. For select fields this is
+    the name of the selected option.
+    """
+    select_fields = set(lfs.catalog.models.Property.objects.filter(
+        type=PROPERTY_SELECT_FIELD).values_list("id", flat=True))
+
+    values = lfs.catalog.models.ProductPropertyValue.objects.filter(
+        product__in=product_ids).values_list("product", "property", "value")
+
+    option_ids = []
+    for product_id, property_id, value in values:
+        if property_id in select_fields:
+            option_ids.append(value)
+
+    options = {}
+    if option_ids:
+        for id, name in lfs.catalog.models.PropertyOption.objects.filter(
+            pk__in=option_ids).values_list("id", "name"):
+            options[str(id)] = name
+
+    result = {}
+    for product_id, property_id, value in values:
+        if property_id in select_fields:
+            value = options.get(value)
+        if value:
+            result.setdefault(product_id, []).append(value)
+    return result
+
+def _insert_terms(product, property_values):
+    """Inserts the terms of the given product and its given property values.
+    """
+    weights = {}
+    for field, weight in FIELD_WEIGHTS:
+        text = RE_TAGS.sub(" ", getattr(product, field) or "")
+        for term in get_terms(text):
+            weights[term] = weights.get(term, 0) + weight
+
+    for value in property_values:
+        for term in get_terms(value):
+            weights[term] = weights.get(term, 0) + PROPERTY_VALUE_WEIGHT
+
+    if weights:
+        cursor = connection.cursor()
+        cursor.executemany(
+            "INSERT INTO %s (term, product_id, weight) VALUES (%%s, %%s, %%s)" % SearchTerm._meta.db_table,
+            [(term, product.id, weight) for term, weight in weights.items()])
+
+def _delete_terms(product_ids):
+    """Deletes the terms of the products with given ids.
+    """
+    cursor = connection.cursor()
+    cursor.execute("DELETE FROM %s WHERE product_id IN (%s)" % (
+        SearchTerm._meta.db_table, ", ".join([str(int(id)) for id in product_ids])))
@@ -0,0 +1,39 @@
+# django imports
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_delete
+
+# lfs imports
+from lfs.caching.settings import SEARCH_NAMESPACE
+from lfs.caching.utils import invalidate_namespaces
+from lfs.catalog.models import Product
+from lfs.catalog.models import ProductPropertyValue
+from lfs.search.index import delete_search_index
+from lfs.search.index import update_search_index
+
+def product_saved_listener(sender, instance, **kwargs):
+    """Updates the search index of the saved product.
+    """
+    update_search_index(instance)
+    invalidate_namespaces(SEARCH_NAMESPACE)
+post_save.connect(product_saved_listener, sender=Product)
+
+def product_deleted_listener(sender, instance, **kwargs):
+    """Deletes the product from the search index.
+    """
+    delete_search_index(instance)
+    invalidate_namespaces(SEARCH_NAMESPACE)
+pre_delete.connect(product_deleted_listener, sender=Product)
+
+def property_value_changed_listener(sender, instance, **kwargs):
+    """Updates the search index of the product the changed
+    ProductPropertyValue (instance) belongs to.
+    """
+    try:
+        product = instance.product
+    except ObjectDoesNotExist:
+        return
+    update_search_index(product)
+post_save.connect(property_value_changed_listener, sender=ProductPropertyValue)
+post_delete.connect(property_value_changed_listener, sender=ProductPropertyValue)
@@ -1 +1,31 @@
-# just for manage.py test
\ No newline at end of file
+# django imports
+from django.db import models
+from django.utils.translation import ugettext_lazy as _
+
+# lfs imports
+from lfs.catalog.models import Product
+
+class SearchTerm(models.Model):
+    """A term of the search index (see lfs.search.index).
+
+    Parameters:
+
+        - term
+            The stemmed term.
+
+        - product
+            The product which contains the term.
+
+        - weight
+            The weight of the term for the product. This depends on how often
+            and in which fields the term is contained.
+    """
+    term = models.CharField(_(u"Term"), max_length=50, db_index=True)
+    product = models.ForeignKey(Product, verbose_name=_(u"Product"), related_name="search_terms")
+    weight = models.IntegerField(_(u"Weight"), default=0)
+
+    class Meta:
+        unique_together = ("term", "product")
+
+    def __unicode__(self):
+        return "%s (%s)" % (self.term, self.product_id)
@@ -0,0 +1,39 @@
+# The weights of the product fields within the search index.
+FIELD_WEIGHTS = (
+    ("name", 10),
+    ("sku", 8),
+    ("short_description", 3),
+    ("description", 1),
+)
+
+# The weight of the property values of a product within the search index.
+PROPERTY_VALUE_WEIGHT = 2
+
+# Suffixes which are stripped from the terms, longest first.
+STEM_SUFFIXES = ("ern", "em", "en", "er", "es", "e", "s", "n")
+
+# The minimal length of a stemmed term.
+MIN_STEM_LENGTH = 3
+
+# The length up to which the completions of all prefixes are calculated in
+# advance by the autocomplete index.
+AUTOCOMPLETE_PREFIX_LENGTH = 2
+
+# The amount of completions which are calculated in advance per prefix.
+AUTOCOMPLETE_LIMIT = 10
+
+# The amount of seconds after which the autocomplete index is calculated again
+# (to take the current popularity of the products into account).
+AUTOCOMPLETE_MAX_AGE = 3600
+
+# The minimal amount of seconds between two calculations of the autocomplete
+# index after products have been changed. Changes (e.g. of an import) are
+# taken over at most this late, but they don't cause a calculation each.
+AUTOCOMPLETE_MIN_AGE = 60
+
+# The amount of seconds the livesearch results are cached.
+LIVESEARCH_CACHE_TIMEOUT = 60
+
+# The weight of a sale compared to a view of a product for the popularity of
+# the completions.
+AUTOCOMPLETE_SALES_WEIGHT = 10
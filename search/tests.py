@@ -1,9 +1,16 @@
 # django imports
 from django.core.urlresolvers import reverse
 from django.test import TestCase
+from django.utils import simplejson
 
 # test imports
+import lfs.search.autocomplete
+import lfs.search.index
 from lfs.catalog.models import Product
+from lfs.catalog.models import ProductPropertyValue
+from lfs.catalog.models import Property
+from lfs.catalog.models import PropertyOption
+from lfs.catalog.settings import PROPERTY_SELECT_FIELD
 
 class SearchTestCase(TestCase):
     """Unit tests for lfs.search
@@ -27,4 +34,131 @@ class SearchTestCase(TestCase):
 
         # Must not be found
         response = self.client.get(url, {"phrase" : "Hurz"})
-        self.failIf(response.content.find("Product 1") != -1)
\ No newline at end of file
+        self.failIf(response.content.find("Product 1") != -1)
+
+    def test_livesearch(self):
+        """
+        """
+        url = reverse("lfs_livesearch")
+
+        # The found products are cached, but the result is rendered for
+        # every phrase.
+        for phrase in ("product", "PRODUCT"):
+            response = self.client.get(url, {"phrase" : phrase})
+            result = simplejson.loads(response.content)
+            self.assertEqual(result["state"], "success")
+            self.failIf(result["products"].find("Product 1") == -1)
+
+class SearchIndexTestCase(TestCase):
+    """Unit tests for lfs.search.index
+    """
+    def setUp(self):
+        """
+        """
+        self.p1 = Product.objects.create(name=u"Red Shirt", slug="p1", sku="4711", active=True)
+        self.p2 = Product.objects.create(name=u"Blue Shirts", slug="p2", active=True,
+            description=u"<p>A shirt and a red hat</p>")
+        self.p3 = Product.objects.create(name=u"Hat", slug="p3", active=False)
+
+    def test_get_terms(self):
+        """
+        """
+        self.assertEqual(lfs.search.index.get_terms(u"Blue Shirts"), [u"blu", u"shirt"])
+
+        # Stop words are omitted
+        self.assertEqual(lfs.search.index.get_terms(u"Hemd und Hose"), [u"hemd", u"hos"])
+
+    def test_search(self):
+        """
+        """
+        # The name is weighted higher than the description
+        ids, total = lfs.search.index.search(u"red shirt")
+        self.assertEqual(ids, [self.p1.id, self.p2.id])
+        self.assertEqual(total, 2)
+
+        # The last term is a prefix
+        ids, total = lfs.search.index.search(u"shi")
+        self.assertEqual(total, 2)
+
+        # SKU
+        ids, total = lfs.search.index.search(u"4711")
+        self.assertEqual(ids, [self.p1.id])
+
+        # Pagination
+        ids, total = lfs.search.index.search(u"shirt", start=1, amount=1)
+        self.assertEqual(len(ids), 1)
+        self.assertEqual(total, 2)
+
+        # Inactive products are not found
+        ids, total = lfs.search.index.search(u"hat")
+        self.assertEqual(ids, [self.p2.id])
+
+        ids, total = lfs.search.index.search(u"hurz")
+        self.assertEqual(ids, [])
+        self.assertEqual(total, 0)
+
+    def test_update(self):
+        """
+        """
+        self.p3.active = True
+        self.p3.save()
+        ids, total = lfs.search.index.search(u"hat")
+        self.assertEqual(ids, [self.p3.id, self.p2.id])
+
+        self.p1.name = u"Green Shirt"
+        self.p1.save()
+        ids, total = lfs.search.index.search(u"green")
+        self.assertEqual(ids, [self.p1.id])
+
+        self.p1.delete()
+        ids, total = lfs.search.index.search(u"green")
+        self.assertEqual(ids, [])
+
+    def test_property_values(self):
+        """
+        """
+        color = Property.objects.create(name="Color", type=PROPERTY_SELECT_FIELD)
+        yellow = PropertyOption.objects.create(name="Yellow", property=color)
+        ProductPropertyValue.objects.create(product=self.p2, property=color, value=str(yellow.id))
+
+        ids, total = lfs.search.index.search(u"yellow")
+        self.assertEqual(ids, [self.p2.id])
+
+class AutocompleteTestCase(TestCase):
+    """Unit tests for lfs.search.autocomplete
+    """
+    def test_complete(self):
+        """
+        """
+        rows = ((1, u"Red Shirt", u"4711"), (2, u"Blue Shirt", u""), (3, u"Scarf", u""))
+        index = lfs.search.autocomplete.AutocompleteIndex(1, rows, {2 : 5})
+
+        # Short prefixes are calculated in advance
+        self.assertEqual(index.complete(u"s"), ([2, 1, 3], 3))
+        self.assertEqual(index.complete(u"S", 1), ([2], 3))
+
+        # The words of a name and SKUs are found
+        self.assertEqual(index.complete(u"shirt"), ([2, 1], 2))
+        self.assertEqual(index.complete(u"red  sh"), ([1], 1))
+        self.assertEqual(index.complete(u"471"), ([1], 1))
+        self.assertEqual(index.complete(u"hurz"), ([], 0))
+
+    def test_get_autocomplete_index(self):
+        """
+        """
+        lfs.search.autocomplete._index = None
+        p1 = Product.objects.create(name=u"Red Shirt", slug="p1", active=True)
+        self.assertEqual(lfs.search.autocomplete.complete(u"red"), ([p1.id], 1))
+
+        # The changed product is taken over when the index is old enough
+        p1.name = u"Green Shirt"
+        p1.save()
+        self.assertEqual(lfs.search.autocomplete.complete(u"red"), ([p1.id], 1))
+
+        old_min_age = lfs.search.autocomplete.AUTOCOMPLETE_MIN_AGE
+        lfs.search.autocomplete.AUTOCOMPLETE_MIN_AGE = 0
+        try:
+            self.assertEqual(lfs.search.autocomplete.complete(u"red"), ([], 0))
+            self.assertEqual(lfs.search.autocomplete.complete(u"green"), ([p1.id], 1))
+        finally:
+            lfs.search.autocomplete.AUTOCOMPLETE_MIN_AGE = old_min_age
@@ -1,18 +1,27 @@
 # django imports
-from django.db.models import Q
 from django.http import HttpResponse
 from django.shortcuts import render_to_response
 from django.template import RequestContext
 from django.template.loader import render_to_string
 from django.utils import simplejson
+from django.utils.encoding import smart_str
+from django.utils.hashcompat import md5_constructor
 
 # lfs imports
-from lfs.catalog.models import Category
+import lfs.search.autocomplete
+import lfs.search.index
+from lfs.caching.settings import SEARCH_NAMESPACE
+from lfs.caching.utils import get_cache
+from lfs.caching.utils import set_cache
 from lfs.catalog.models import Product
-from lfs.catalog.settings import STANDARD_PRODUCT, PRODUCT_WITH_VARIANTS, VARIANT
+from lfs.catalog.utils import get_order_by
+from lfs.search.settings import LIVESEARCH_CACHE_TIMEOUT
 
 def livesearch(request, template_name="lfs/search/livesearch_results.html"):
-    """
+    """Returns the most popular products which start with the given phrase
+    (via get request). The found products are cached shortly, as the same
+    phrases are typed again and again. The result is rendered for every
+    request, as it contains the phrase and depends on the request.
     """
     phrase = request.GET.get("phrase", "")
 
@@ -21,50 +30,53 @@ def livesearch(request, template_name="lfs/search/livesearch_results.html"):
             "state" : "failure",
         })
     else:
-        # Products
-        query = Q(active=True) & \
-                Q(name__icontains=phrase) & \
-                Q(sub_type__in = (STANDARD_PRODUCT, PRODUCT_WITH_VARIANTS))
-        
-        temp = Product.objects.filter(query)
-        total = len(temp)
-        products = temp[0:5]
-        
+        cache_key = "livesearch-%s" % md5_constructor(
+            smart_str(phrase.lower())).hexdigest()
+        found = get_cache(cache_key, [SEARCH_NAMESPACE])
+        if found is None:
+            product_ids, total = lfs.search.autocomplete.complete(phrase, 5)
+            found = (_get_products(product_ids), total)
+            set_cache(cache_key, found, [SEARCH_NAMESPACE], LIVESEARCH_CACHE_TIMEOUT)
+        products, total = found
+
         products = render_to_string(template_name, RequestContext(request, {
             "products" : products,
             "phrase" : phrase,
             "total" : total,
         }))
-        
+
         result = simplejson.dumps({
             "state" : "success",
             "products" : products,
         })
+
     return HttpResponse(result)
     
 def search(request, template_name="lfs/search/search_results.html"):
     """Returns the search result according to given phrase (via get request) 
-    ordered by the globally set sorting.
+    ordered by the globally set sorting resp. by relevance.
     """
     phrase = request.GET.get("phrase", "")
     
     # Products
-    query = Q(active=True) & \
-            Q(name__icontains=phrase) & \
-            Q(sub_type__in = (STANDARD_PRODUCT, PRODUCT_WITH_VARIANTS))
-    products = Product.objects.filter(query)
+    product_ids, total = lfs.search.index.search(phrase)
 
     # Sorting
     sorting = request.session.get("sorting")    
-    if sorting: 
-        products = products.order_by(sorting)
-        
-    total = 0
-    if products:
-        total += len(products)
+    if sorting and product_ids:
+        products = Product.objects.filter(pk__in=product_ids).order_by(
+            get_order_by(sorting))
+    else:
+        products = _get_products(product_ids)
         
     return render_to_response(template_name, RequestContext(request, {
         "products" : products,
         "phrase" : phrase,
         "total" : total,
-    }))
\ No newline at end of file
+    }))
+
+def _get_products(product_ids):
+    """Returns the products with given ids in the same order.
+    """
+    products = Product.objects.in_bulk(product_ids)
+    return [products[id] for id in product_ids if id in products]
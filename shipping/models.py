@@ -78,7 +78,7 @@ class ShippingMethod(models.Model):
         If product is given the product is tested otherwise the whole cart.
         """
         from lfs.criteria import utils as criteria_utils
-        return criteria_utils.is_valid(self, request, product)
+        return criteria_utils.is_valid(request, self, product)
                 
 class ShippingMethodPrice(models.Model):
     """An additional price for a shipping method.
@@ -125,4 +125,5 @@ class ShippingMethodPrice(models.Model):
         
         If product is given the product is tested otherwise the whole cart.        
         """
-        return criteria_utils.is_valid(self, request, product)
\ No newline at end of file
+        from lfs.criteria import utils as criteria_utils
+        return criteria_utils.is_valid(request, self, product)
\ No newline at end of file
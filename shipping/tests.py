@@ -19,6 +19,8 @@ from lfs.criteria.models import UserCriterion
 from lfs.criteria.models import CriteriaObjects
 from lfs.criteria.models import CartPriceCriterion
 from lfs.criteria.models import WeightCriterion
+from lfs.criteria.rules import CriteriaContext
+from lfs.criteria.rules import get_rule_set
 from lfs.criteria.settings import GREATER_THAN, LESS_THAN
 from lfs.cart import utils as cart_utils
 from lfs.cart.models import CartItem
@@ -154,6 +156,30 @@ class ShippingMethodTestCase(TestCase):
         self.assertEqual(dt.max, self.dt2.max)
         self.assertEqual(dt.unit, self.dt2.unit)
         
+    def test_get_product_delivery_time_3(self):
+        """Tests that the cached delivery time is renewed after changes.
+        """
+        request = create_request()
+        request.user = AnonymousUser()
+
+        dt = utils.get_product_delivery_time(request, self.p1.slug)
+        self.assertEqual(dt.max, self.dt1.max)
+
+        # Change of the delivery time of the shipping method
+        self.dt1.max = 5
+        self.dt1.save()
+
+        dt = utils.get_product_delivery_time(request, self.p1.slug)
+        self.assertEqual(dt.max, 5)
+
+        # Change of the product
+        self.p1.manual_delivery_time = True
+        self.p1.delivery_time = self.dt3
+        self.p1.save()
+
+        dt = utils.get_product_delivery_time(request, self.p1.slug)
+        self.assertEqual(dt.max, self.dt3.max)
+
     def test_active_shipping_methods_1(self):
         """Tests active shipping methods.
         """
@@ -280,7 +306,26 @@ class ShippingMethodTestCase(TestCase):
         # For product 1 (weight: 12.0) the sm1 is the first valid (weigth: > 10.0)        
         result = utils.get_first_valid_shipping_method(request, product=self.p2)
         self.assertEqual(result, self.sm2)
-        
+
+    def test_rule_set(self):
+        """Tests that the compiled criteria are renewed after a change.
+        """
+        rule_set = get_rule_set()
+        self.failUnless(rule_set is get_rule_set())
+
+        c = WeightCriterion.objects.create(weight=10.0, operator=GREATER_THAN)
+        co = CriteriaObjects.objects.create(criterion=c, content=self.sm1)
+        self.failIf(rule_set is get_rule_set())
+
+        context = CriteriaContext(self.request, product=self.p1)
+        self.assertEqual(get_rule_set().is_valid(context, self.sm1), False)
+        self.assertEqual(get_rule_set().is_valid(context, self.sm2), True)
+
+        c.weight = 5.0
+        c.save()
+        context = CriteriaContext(self.request, product=self.p1)
+        self.assertEqual(get_rule_set().is_valid(context, self.sm1), True)
+
     def test_shipping_price_1(self):
         """Tests the default shipping price of the shipping method.
         """        
@@ -1,11 +1,18 @@
 # python imports
+from datetime import date
 from datetime import datetime
 
-# django imports
-from django.core.cache import cache
-
 # lfs imports
+import lfs.payment.utils
+from lfs.caching.settings import CART_NAMESPACE
+from lfs.caching.settings import CRITERIA_NAMESPACE
+from lfs.caching.settings import PRODUCT_NAMESPACE
+from lfs.caching.settings import SHIPPING_NAMESPACE
+from lfs.caching.utils import delete_request_cache
+from lfs.caching.utils import get_cache
+from lfs.caching.utils import get_request_cache
 from lfs.caching.utils import lfs_get_object_or_404
+from lfs.caching.utils import set_cache
 from lfs.catalog.models import DeliveryTime
 from lfs.catalog.models import Product
 from lfs.catalog.settings import DELIVERY_TIME_UNIT_DAYS
@@ -28,23 +35,29 @@ def get_product_delivery_time(request, product_slug, for_cart=False):
     shipping method is valid for the given product this one is taken, if not
     the default one - the default one is the first valid shipping method.
     """
-    # TODO: Need a reasonable chaching here
-    if for_cart:
-        cache_key = "shipping-delivery-time-cart-%s" % (request.user.id)
-    else:
-        cache_key = "shipping-delivery-time"
+    product = lfs_get_object_or_404(Product, slug=product_slug)
 
-    shippings = None # cache.get(cache_key)
-    if shippings is None:
-        shippings = {}
+    cache_key = _get_delivery_time_key(request, product, for_cart)
+    namespaces = [PRODUCT_NAMESPACE % (product.parent_id or product.id),
+                  SHIPPING_NAMESPACE, CRITERIA_NAMESPACE]
 
-    product_key = "product-%s" % product_slug
-    shipping = shippings.get(product_key)
-    if shipping is not None:
-        return shipping
+    # The cart is taken into account by the criteria of the shipping methods.
+    from lfs.cart import utils as cart_utils
+    cart = cart_utils.get_cart(request)
+    if cart is not None:
+        namespaces.append(CART_NAMESPACE % cart.id)
 
-    product = lfs_get_object_or_404(Product, slug=product_slug)
+    delivery_time = get_cache(cache_key, namespaces)
+    if delivery_time is None:
+        delivery_time = calculate_product_delivery_time(request, product, for_cart)
+        set_cache(cache_key, delivery_time, namespaces)
 
+    return delivery_time
+
+def calculate_product_delivery_time(request, product, for_cart=False):
+    """Calculates the delivery time object for the given product. See
+    get_product_delivery_time for the meaning of ``for_cart``.
+    """
     # if the product is a product with variants we switch to the default
     # variant to calculate the delivery time. Please note that in this case
     # the default variant is also displayed.
@@ -60,14 +73,14 @@ def get_product_delivery_time(request, product_slug, for_cart=False):
             sm = get_selected_shipping_method(request)
             # Within the cart we have to take care of the selected shipping
             # method.
-            sms = get_valid_shipping_methods(request, product)
-            if sm in sms:
+            if sm is not None and sm.active and criteria_utils.is_valid(request, sm, product):
                 try:
                     delivery_time  = sm.delivery_time
                 except AttributeError:
                     delivery_time = None
             else:
-                sm = get_default_shipping_method(request)
+                sm = get_request_cache(request, "default-shipping-method",
+                    lambda: get_default_shipping_method(request))
                 try:
                     delivery_time = sm.delivery_time
                 except AttributeError:
@@ -103,16 +116,29 @@ def get_product_delivery_time(request, product_slug, for_cart=False):
     if delivery_time is None:
         delivery_time = DeliveryTime(min=1, max=2, unit=DELIVERY_TIME_UNIT_DAYS)
 
-    delivery_time = delivery_time.round()
-    shippings[product_key] = delivery_time
-    cache.set(cache_key, shippings)
+    return delivery_time.round()
 
-    return delivery_time
+def _get_delivery_time_key(request, product, for_cart):
+    """Returns the cache key of the delivery time of the given product. This
+    contains everything the delivery time depends on besides the product, the
+    shipping methods and the criteria: the inputs of the criteria and the
+    current date (see calculate_product_delivery_time).
+    """
+    shipping_method = get_selected_shipping_method(request)
+    payment_method = lfs.payment.utils.get_selected_payment_method(request)
+    country = get_selected_shipping_country(request)
+    user = request.user
+
+    return "delivery-time-%s-%s-%s-%s-%s-%s-%s" % (
+        product.id, for_cart, getattr(shipping_method, "id", None),
+        getattr(payment_method, "id", None), getattr(country, "id", None),
+        getattr(user, "id", None), date.today().strftime("%Y%m%d"))
 
 def update_to_valid_shipping_method(request, customer, save=False):
     """After this has been called the given customer has a valid shipping
     method in any case.
     """
+    delete_request_cache(request, "default-shipping-method")
     valid_sms = get_valid_shipping_methods(request)
 
     if customer.selected_shipping_method not in valid_sms:
@@ -123,11 +149,8 @@ def update_to_valid_shipping_method(request, customer, save=False):
 def get_valid_shipping_methods(request, product=None):
     """Returns a list of all valid shipping methods for the passed request.
     """
-    result = []
-    for sm in ShippingMethod.objects.filter(active=True):
-        if criteria_utils.is_valid(request, sm, product):
-            result.append(sm)
-    return result
+    return criteria_utils.get_valid(request,
+        ShippingMethod.objects.filter(active=True), product)
 
 def get_first_valid_shipping_method(request, product=None):
     """Returns the valid shipping method with the highest priority.
@@ -148,13 +171,15 @@ def get_selected_shipping_method(request):
     """Returns the selected shipping method for the passed request.
 
     This could either be an explicitely selected shipping method of the current
-    user or the default shipping method.
+    user or the default shipping method. The latter is calculated once per
+    request.
     """
     customer = customer_utils.get_customer(request)
     if customer and customer.selected_shipping_method:
         return customer.selected_shipping_method
     else:
-        return get_default_shipping_method(request)
+        return get_request_cache(request, "default-shipping-method",
+            lambda: get_default_shipping_method(request))
 
 def get_selected_shipping_country(request):
     """Returns the selected shipping country for the passed request.
@@ -169,7 +194,7 @@ def get_selected_shipping_country(request):
         elif customer.selected_country:
             return customer.selected_country
 
-    return get_default_shop().default_country
+    return get_default_shop(request).default_country
 
 def get_shipping_costs(request, shipping_method):
     """Returns a dictionary with the shipping price and tax for the passed
@@ -32,6 +32,20 @@ function mark_selected() {
 }
 
 
+function update_variants_progress(url) {
+    $.get(url, function(data) {
+        data = JSON.parse(data);
+        var progress = data["progress"];
+        if (progress && progress["done"] < progress["total"]) {
+            $("#variants-progress").html(progress["done"] + " / " + progress["total"]);
+            setTimeout(function() { update_variants_progress(url); }, 2000);
+        }
+        else {
+            $("#variants").html(data["properties"]);
+        }
+    });
+}
+
 function update_positions() {
     var position = 0;
     $(".position").each(function() {
@@ -521,6 +535,10 @@ $(function() {
                 data = JSON.parse(data);
                 $("#variants").html(data["properties"]);
                 $("#selectable-products").html(data["selectable_products"]);
+                if (data["progress_url"]) {
+                    $.jGrowl(data["message"]);
+                    update_variants_progress(data["progress_url"]);
+                }
             }
         });
         return false;